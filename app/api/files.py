@@ -1,211 +1,284 @@
 """API routes for file operations."""
 
-import os
-import tempfile
-from typing import Optional
+import itertools
+from typing import Any, AsyncIterator, Dict, Optional
 from datetime import datetime
-from fastapi import APIRouter, UploadFile, File, HTTPException, Response
-from fastapi.responses import FileResponse
+from email.utils import formatdate, parsedate_to_datetime
+from urllib.parse import quote
 
-from ..models.requests import FileUploadMetadata, ExportRequest
-from ..models.responses import FileInfo, ExportResult
-from ..core.config import get_settings
+import aiofiles.os
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Request, Response, Query, Header
+from fastapi.responses import FileResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+
+from ..models.requests import FileUploadMetadata, ExportRequest, ParserType, EXPORT_FORMAT_PATTERN
+from ..models.responses import FileInfo, ParseResult, ParseStatus
+from ..core.config import get_settings, get_logger
+from ..core.file_store import BinaryContent, UploadTooLarge, get_file_store
+from ..core.parser import GrammarCompileError, get_parser
 
 router = APIRouter()
 settings = get_settings()
+logger = get_logger("api.files")
+
+
+def _validate_filename(filename: Optional[str]):
+    """Reject names without an allowed extension."""
+    if not filename or not any(filename.lower().endswith(ext) for ext in settings.allowed_extensions):
+        raise HTTPException(
+            status_code=400, 
+            detail=f"Invalid file type. Allowed: {settings.allowed_extensions}"
+        )
+
+
+async def _store_upload(
+    chunks: AsyncIterator[bytes], filename: str, content_type: Optional[str], file_type: str
+) -> FileInfo:
+    """Stream an upload into the file store and describe the stored file."""
+    # Grammars keep their own limit; texts may use the full upload size
+    max_size = settings.max_grammar_size if file_type == "grammar" else settings.max_upload_size
+    try:
+        stored = await get_file_store().put_stream(
+            chunks, filename, content_type or "text/plain", file_type, max_size
+        )
+    except UploadTooLarge:
+        raise HTTPException(status_code=413, detail="File content too large")
+    except BinaryContent:
+        raise HTTPException(status_code=400, detail="Binary files not supported")
+    except OSError as e:
+        raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
+    
+    return FileInfo(
+        id=stored.id,
+        digest=stored.digest,
+        filename=stored.filename,
+        size=stored.size,
+        content_type=stored.content_type,
+        file_type=stored.file_type,
+        upload_time=datetime.fromtimestamp(stored.created_at)
+    )
 
 
 @router.post("/upload", response_model=FileInfo)
 async def upload_file(
     file: UploadFile = File(...),
-    file_type: Optional[str] = "grammar"
+    file_type: Optional[str] = Form("grammar")
 ) -> FileInfo:
-    """Upload a grammar or text file."""
+    """Upload a grammar or text file as multipart form data."""
     
     # Validate file size
     if file.size and file.size > settings.max_upload_size:
         raise HTTPException(status_code=413, detail="File too large")
     
-    # Validate file extension
-    if not any(file.filename.lower().endswith(ext) for ext in settings.allowed_extensions):
-        raise HTTPException(
-            status_code=400, 
-            detail=f"Invalid file type. Allowed: {settings.allowed_extensions}"
-        )
+    _validate_filename(file.filename)
     
-    try:
-        # Read file content
-        content = await file.read()
-        
-        # Basic content validation
-        if b'\x00' in content:
-            raise HTTPException(status_code=400, detail="Binary files not supported")
-        
-        # Validate content size
-        if len(content) > settings.max_grammar_size:
-            raise HTTPException(status_code=413, detail="File content too large")
-        
-        # Store file temporarily (in a real app, you'd use proper storage)
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(file.filename)[1])
-        temp_file.write(content)
-        temp_file.close()
-        
-        file_info = FileInfo(
-            filename=file.filename,
-            size=len(content),
-            content_type=file.content_type or "text/plain",
-            upload_time=datetime.now()
-        )
-        
-        return file_info
-        
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
+    async def chunks() -> AsyncIterator[bytes]:
+        while chunk := await file.read(settings.upload_chunk_size):
+            yield chunk
+    
+    return await _store_upload(chunks(), file.filename, file.content_type, file_type)
 
 
-@router.get("/download/{filename}")
-async def download_file(filename: str) -> FileResponse:
-    """Download a previously uploaded file."""
-    # In a real app, you'd track uploaded files properly
-    # This is a simplified implementation
+@router.put("/upload/{filename}", response_model=FileInfo)
+async def upload_raw(request: Request, filename: str, file_type: str = "grammar") -> FileInfo:
+    """Upload a file sent as the raw request body.
+    
+    The body is hashed and written as it arrives, so oversized or binary
+    uploads are refused without reading the rest.
+    """
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > settings.max_upload_size:
+        raise HTTPException(status_code=413, detail="File too large")
     
-    # Validate filename to prevent directory traversal
-    if ".." in filename or "/" in filename or "\\" in filename:
-        raise HTTPException(status_code=400, detail="Invalid filename")
+    _validate_filename(filename)
+    return await _store_upload(request.stream(), filename, request.headers.get("content-type"), file_type)
+
+
+# Content ids name immutable content, so clients may cache downloads forever
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def _not_modified_since(request: Request, etag: str, last_modified: float) -> bool:
+    """Evaluate If-None-Match, falling back to If-Modified-Since."""
+    from ..core.export import etag_matches
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag_matches(if_none_match, etag)
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return parsedate_to_datetime(if_modified_since).timestamp() >= int(last_modified)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+@router.get("/download/{file_id}")
+async def download_file(file_id: str, request: Request) -> Response:
+    """Download a previously uploaded file by upload id.
     
-    file_path = os.path.join(tempfile.gettempdir(), filename)
+    Supports byte ranges and conditional requests. The body is sent by
+    the ASGI server's pathsend extension when it has one, or by a proxy
+    via X-Accel-Redirect when ``download_accel_redirect`` is set.
+    """
+    store = get_file_store()
+    stored = await store.lookup(file_id)
+    if stored is None:
+        raise HTTPException(status_code=404, detail="File not found")
     
-    if not os.path.exists(file_path):
+    path = store.path_for(stored.digest)
+    try:
+        stat_result = await aiofiles.os.stat(path)
+    except FileNotFoundError:
+        stat_result = None
+    if stat_result is None or stat_result.st_size != stored.size:
+        logger.error(f"Stored file {file_id} is missing or does not match its index entry")
         raise HTTPException(status_code=404, detail="File not found")
     
-    return FileResponse(
-        path=file_path,
-        filename=filename,
-        media_type="application/octet-stream"
+    etag = f'"{stored.digest}"'
+    headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(stored.created_at, usegmt=True),
+        "Cache-Control": IMMUTABLE_CACHE_CONTROL
+    }
+    if _not_modified_since(request, etag, stored.created_at):
+        return Response(status_code=304, headers=headers)
+    
+    if settings.download_accel_redirect:
+        headers["X-Accel-Redirect"] = f"{settings.download_accel_redirect}/{stored.digest[:2]}/{stored.digest[2:]}"
+        headers["Content-Disposition"] = f"attachment; filename*=utf-8''{quote(stored.filename)}"
+        return Response(media_type=stored.content_type, headers=headers)
+    
+    response = FileResponse(
+        path=path,
+        filename=stored.filename,
+        media_type=stored.content_type,
+        headers=headers,
+        stat_result=stat_result
     )
+    response.chunk_size = settings.download_chunk_size
+    return response
+
 
+def _export_metadata(result: ParseResult) -> Dict[str, Any]:
+    # Exports are cached and shared between sessions with the same grammar
+    # and text, so the metadata describes the parse and nothing session or
+    # request specific, such as the time of the export
+    return {
+        "parse_time": result.parse_time,
+        "grammar_hash": result.grammar_hash,
+        "text_hash": result.text_hash,
+        "parser_status": ParseStatus(result.status).value
+    }
 
-@router.post("/export", response_model=ExportResult)
-async def export_results(request: ExportRequest) -> ExportResult:
-    """Export parsing results in various formats."""
+
+async def _export_response(request: ExportRequest, if_none_match: Optional[str] = None) -> Response:
+    """Render an export, serving it from the export cache when possible."""
+    # Export code is loaded on the first export rather than at startup
+    from ..core.export import (
+        EXPORTERS, EXPORT_CONTENT_TYPES, EXPORT_EXTENSIONS, CachedExport,
+        buffer_export, etag_matches, get_export_cache, iter_export
+    )
     from ..core.state import get_session_manager
     
-    if request.format not in ["json", "xml", "dot", "text"]:
+    if request.format not in EXPORTERS:
         raise HTTPException(status_code=400, detail="Unsupported export format")
     
     # Get session and parse result
     session_manager = get_session_manager()
-    if request.session_id not in session_manager.sessions:
+    session = await session_manager.get_session(request.session_id)
+    if session is None:
         raise HTTPException(status_code=404, detail="Session not found")
     
-    session = session_manager.sessions[request.session_id]
-    if not session.last_parse_result or not session.last_parse_result.tree:
+    result = await session_manager.load_parse_result(session)
+    if not result or not result.tree:
         raise HTTPException(status_code=400, detail="No parse results to export")
     
-    result = session.last_parse_result
+    filename = f"parse_result_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{EXPORT_EXTENSIONS[request.format]}"
+    media_type = EXPORT_CONTENT_TYPES[request.format]
+    headers = {
+        "Content-Disposition": f'attachment; filename="{filename}"',
+        "Cache-Control": "private, no-cache"
+    }
     
+    cache = get_export_cache()
+    key = None
+    cached = None
+    if result.text_hash:
+        key = (result.grammar_hash, result.text_hash, request.format, request.include_metadata)
+        cached = cache.get(key)
+    
+    if cached is None:
+        metadata = _export_metadata(result) if request.include_metadata else None
+        chunks = iter_export(result.tree, request.format, metadata)
+        buffered, complete = await run_in_threadpool(buffer_export, chunks, cache.max_entry)
+        if not complete:
+            # Too large to cache; stream the rest without a validator
+            cache.uncacheable += 1
+            return StreamingResponse(itertools.chain(buffered, chunks), media_type=media_type, headers=headers)
+        body = b"".join(buffered)
+        cached = cache.put(key, body) if key else CachedExport(body)
+    
+    headers["ETag"] = cached.etag
+    if etag_matches(if_none_match, cached.etag):
+        cache.not_modified += 1
+        return Response(status_code=304, headers=headers)
+    return Response(content=cached.body, media_type=media_type, headers=headers)
+
+
+@router.post("/export")
+async def export_results(request: ExportRequest) -> Response:
+    """Export parsing results in various formats as a file download."""
+    return await _export_response(request)
+
+
+@router.get("/export/{session_id}")
+async def download_export(
+    session_id: str,
+    format: str = Query("json", pattern=EXPORT_FORMAT_PATTERN),
+    include_metadata: bool = False,
+    if_none_match: Optional[str] = Header(None)
+) -> Response:
+    """Download an export; repeat requests are revalidated by ETag."""
+    request = ExportRequest(format=format, session_id=session_id, include_metadata=include_metadata)
+    return await _export_response(request, if_none_match)
+
+
+@router.get("/standalone/{session_id}")
+async def download_standalone(session_id: str, if_none_match: Optional[str] = Header(None)) -> Response:
+    """Download a standalone LALR parser module for a session's grammar."""
+    from ..core.export import etag_matches
+    from ..core.standalone import generate_standalone, get_standalone_cache
+    from ..core.state import get_session_manager
+    
+    session = await get_session_manager().get_session(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    grammar = session.grammar_content
+    if not grammar:
+        raise HTTPException(status_code=400, detail="Session has no grammar")
+    
+    # Standalone modules are always LALR, whatever parser the session edits with
+    lalr_settings = session.parse_settings.model_copy(
+        update={"parser": ParserType.LALR, "record_separator": None, "record_rule": None}
+    )
     try:
-        if request.format == "json":
-            content = result.tree.json() if hasattr(result.tree, 'json') else str(result.tree)
-            content_type = "application/json"
-        elif request.format == "xml":
-            # Convert AST to XML format
-            content = f'<?xml version="1.0" encoding="UTF-8"?>\\n<ast>\\n{_ast_to_xml(result.tree, 1)}\\n</ast>'
-            content_type = "application/xml"
-        elif request.format == "dot":
-            # Convert AST to Graphviz DOT format
-            content = _ast_to_dot(result.tree)
-            content_type = "text/vnd.graphviz"
-        elif request.format == "text":
-            # Convert AST to plain text
-            content = _ast_to_text(result.tree, 0)
-            content_type = "text/plain"
-        
-        if request.include_metadata:
-            metadata = {
-                "export_time": datetime.now().isoformat(),
-                "session_id": request.session_id,
-                "parse_time": result.parse_time,
-                "grammar_hash": result.grammar_hash,
-                "parser_status": result.status
-            }
-            
-            if request.format == "json":
-                import json
-                data = json.loads(content) if content.startswith('{') else {"tree": content}
-                data["metadata"] = metadata
-                content = json.dumps(data, indent=2)
-        
-        return ExportResult(
-            format=request.format,
-            content=content,
-            filename=f"parse_result_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{request.format}",
-            content_type=content_type,
-            size=len(content)
-        )
-        
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Export failed: {str(e)}")
-
-
-def _ast_to_xml(node, depth=0):
-    """Convert AST node to XML format."""
-    indent = "  " * depth
-    if hasattr(node, 'type') and node.type == 'tree':
-        xml = f'{indent}<tree data="{_escape_xml(node.data)}">'
-        if hasattr(node, 'children'):
-            for child in node.children:
-                xml += f'\\n{_ast_to_xml(child, depth + 1)}'
-        xml += f'\\n{indent}</tree>'
-        return xml
-    else:
-        data = getattr(node, 'data', str(node))
-        return f'{indent}<token data="{_escape_xml(data)}" />'
-
-
-def _ast_to_dot(node):
-    """Convert AST node to Graphviz DOT format."""
-    dot = 'digraph AST {\\n'
-    counter = [0]  # Use list for mutable counter
-    
-    def _add_node(n, node_id):
-        if hasattr(n, 'type') and n.type == 'tree':
-            dot_content = f'  {node_id} [label="{_escape_dot(n.data)}" shape=ellipse];\\n'
-            if hasattr(n, 'children'):
-                for child in n.children:
-                    counter[0] += 1
-                    child_id = counter[0]
-                    dot_content += f'  {node_id} -> {child_id};\\n'
-                    dot_content += _add_node(child, child_id)
-            return dot_content
-        else:
-            data = getattr(n, 'data', str(n))
-            return f'  {node_id} [label="{_escape_dot(data)}" shape=box];\\n'
-    
-    dot += _add_node(node, 0)
-    dot += '}\\n'
-    return dot
-
-
-def _ast_to_text(node, depth=0):
-    """Convert AST node to plain text format."""
-    indent = "  " * depth
-    if hasattr(node, 'type') and node.type == 'tree':
-        text = f'{indent}{node.data}\\n'
-        if hasattr(node, 'children'):
-            for child in node.children:
-                text += _ast_to_text(child, depth + 1)
-        return text
-    else:
-        data = getattr(node, 'data', str(node))
-        return f'{indent}"{data}"\\n'
-
-
-def _escape_xml(text):
-    """Escape XML special characters."""
-    return str(text).replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;').replace('"', '&quot;')
-
-
-def _escape_dot(text):
-    """Escape DOT special characters."""
-    return str(text).replace('\\\\', '\\\\\\\\').replace('"', '\\\\"').replace('\\n', '\\\\n')
\ No newline at end of file
+        grammar_hash, compiled = await get_parser().compile_grammar(grammar, lalr_settings)
+    except GrammarCompileError as e:
+        raise HTTPException(status_code=400, detail=f"Grammar does not compile as LALR: {e.error.message}")
+    
+    cache = get_standalone_cache()
+    cached = cache.get(grammar_hash)
+    if cached is None:
+        module = await run_in_threadpool(generate_standalone, compiled)
+        cached = cache.put(grammar_hash, module)
+        logger.info(f"Generated standalone parser for session {session_id[:8]}... ({len(module)} bytes)")
+    
+    headers = {
+        "Content-Disposition": f'attachment; filename="lark_parser_{grammar_hash[:8]}.py"',
+        "Cache-Control": "private, no-cache",
+        "ETag": cached.etag
+    }
+    if etag_matches(if_none_match, cached.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=cached.body, media_type="text/x-python; charset=utf-8", headers=headers)
@@ -3,9 +3,11 @@
 import time
 from datetime import datetime
 from fastapi import APIRouter
+from fastapi.responses import JSONResponse
 
 from ..models.responses import HealthStatus
 from ..core.parser import get_parser
+from ..core.warmup import get_warmup_progress
 
 router = APIRouter()
 
@@ -29,6 +31,13 @@ async def health_check() -> HealthStatus:
     )
 
 
+@router.get("/ready")
+async def readiness_check() -> JSONResponse:
+    """Report startup warm-up progress; 503 until the hot grammars are compiled."""
+    progress = get_warmup_progress()
+    return JSONResponse(progress.to_dict(), status_code=200 if progress.ready else 503)
+
+
 @router.get("/version")
 async def get_version() -> dict:
     """Get application version information."""
@@ -1,35 +1,67 @@
 """API routes for grammar parsing operations."""
 
-from fastapi import APIRouter, HTTPException, BackgroundTasks
+from fastapi import APIRouter, HTTPException, BackgroundTasks, Response
 from typing import Dict, Any
 
 from ..models.requests import ParseRequest, GrammarValidationRequest
 from ..models.responses import ParseResult, GrammarValidationResult
 from ..core.parser import get_parser
-from ..core.config import get_logger
+from ..core.config import get_logger, get_settings
+from ..core.state import get_session_manager
+from ..core.serialization import json_response
+from ..core.file_store import get_file_store
+from ..core.logs import get_log_stats
+from ..core.symbols import get_symbol_indexer
+from ..websockets.connection import compression_stats, queue_stats
+from ..websockets.parsing_ws import session_info_notifier
 
 router = APIRouter()
 logger = get_logger("api.parsing")
+settings = get_settings()
+
+
+async def _load_referenced(file_id: str, kind: str) -> str:
+    """Read an uploaded file named by a parse request."""
+    try:
+        content = await get_file_store().load_text(file_id)
+    except (OSError, UnicodeDecodeError) as e:
+        logger.error(f"Failed to read stored {kind} {file_id}: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to read stored {kind}")
+    if content is None:
+        raise HTTPException(status_code=404, detail=f"Unknown {kind} id: {file_id}")
+    return content
 
 
 @router.post("/parse", response_model=ParseResult)
-async def parse_grammar(request: ParseRequest) -> ParseResult:
+async def parse_grammar(request: ParseRequest) -> Response:
     """Parse text using provided grammar."""
-    logger.info(f"Parse request: grammar({len(request.grammar)} chars), text({len(request.text)} chars)")
+    grammar = request.grammar
+    if request.grammar_id is not None:
+        grammar = await _load_referenced(request.grammar_id, "grammar")
+    
+    text = request.text
+    max_text_length = settings.max_text_length
+    if request.text_id is not None:
+        # Referenced text never passes through the JSON body, so it gets the larger limit
+        text = await _load_referenced(request.text_id, "text")
+        max_text_length = settings.max_referenced_text_length
+    
+    logger.info(f"Parse request: grammar({len(grammar)} chars), text({len(text)} chars)")
     logger.debug(f"Parse settings: {request.settings}")
     
     parser = get_parser()
     
     try:
         result = await parser.parse_async(
-            grammar=request.grammar,
-            text=request.text,
+            grammar=grammar,
+            text=text,
             parse_settings=request.settings,
-            use_cache=True
+            use_cache=True,
+            max_text_length=max_text_length
         )
         
         logger.info(f"Parse completed successfully: status={result.status}, time={result.parse_time:.3f}s")
-        return result
+        return json_response(result)
         
     except Exception as e:
         logger.error(f"Parse failed: {type(e).__name__}: {str(e)}")
@@ -64,9 +96,22 @@ async def validate_grammar(request: GrammarValidationRequest) -> GrammarValidati
 @router.get("/stats")
 async def get_parser_stats() -> Dict[str, Any]:
     """Get parser statistics and performance metrics."""
+    from ..core.export import get_export_cache
+    from ..core.standalone import get_standalone_cache
     logger.debug("Parser stats requested")
     parser = get_parser()
     stats = parser.get_stats()
+    stats["websocket_compression"] = compression_stats.to_dict()
+    stats["websocket_queues"] = queue_stats.to_dict()
+    stats["session_info"] = session_info_notifier.get_stats()
+    session_manager = get_session_manager()
+    stats["sessions"] = session_manager.get_session_stats()
+    stats["result_spill"] = session_manager.spill.get_stats()
+    stats["export_cache"] = get_export_cache().get_stats()
+    stats["file_store"] = get_file_store().get_stats()
+    stats["symbols"] = get_symbol_indexer().get_stats()
+    stats["standalone"] = get_standalone_cache().get_stats()
+    stats["logging"] = get_log_stats()
     logger.debug(f"Returning parser stats: {stats}")
     return stats
 
@@ -74,9 +119,11 @@ async def get_parser_stats() -> Dict[str, Any]:
 @router.post("/clear-cache")
 async def clear_parse_cache(background_tasks: BackgroundTasks):
     """Clear the parser cache."""
+    from ..core.export import get_export_cache
     logger.info("Cache clear requested")
     parser = get_parser()
     background_tasks.add_task(parser.clear_cache)
+    background_tasks.add_task(get_export_cache().clear)
     return {"message": "Cache clear scheduled"}
 
 
@@ -3,9 +3,11 @@
 import logging
 import sys
 from functools import lru_cache
-from typing import List
+from typing import Dict, List, Optional
 from pydantic_settings import BaseSettings
 
+from .logs import JsonFormatter, LogPipeline, install_pipeline
+
 
 class Settings(BaseSettings):
     """Application settings."""
@@ -16,29 +18,77 @@ class Settings(BaseSettings):
     debug: bool = True
     
     # Logging settings
-    log_level: str = "DEBUG"
+    log_level: str = "INFO"
     log_format: str = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+    log_json: bool = False  # one JSON object per record instead of log_format
     log_file: str = "larkeditor.log"
     log_to_console: bool = True
     log_to_file: bool = True
+    log_queue: bool = True  # format and write records in a background thread
+    log_sample_rates: Dict[str, float] = {}  # logger -> share of DEBUG records kept, e.g. {"app.websocket": 0.1}
+    log_rate_limit: float = 200.0  # DEBUG records per second and logger; 0 disables
     
     # Security settings
     max_upload_size: int = 50 * 1024 * 1024  # 50MB
     max_grammar_size: int = 10 * 1024 * 1024  # 10MB
     allowed_extensions: List[str] = [".lark", ".txt", ".ebnf"]
+    upload_store_dir: str = "data/uploads"  # content-addressed store for uploaded files
+    upload_chunk_size: int = 64 * 1024
+    download_chunk_size: int = 1024 * 1024  # read size when the server has no pathsend support
+    download_accel_redirect: Optional[str] = None  # internal proxy location of the store's objects/ dir
     
     # Parsing settings
     max_parse_time: float = 30.0  # seconds
     max_grammar_complexity: int = 1000  # rules
     max_text_length: int = 1024 * 1024  # 1MB
-    debounce_delay: float = 1.0  # seconds
+    max_referenced_text_length: int = 50 * 1024 * 1024  # texts parsed by file id skip the JSON body limit
+    record_split_workers: int = 0  # processes for record-split parsing; 0 uses one per CPU
+    debounce_delay: float = 1.0  # seconds, used until a session's latency is measured
+    debounce_min_delay: float = 0.05  # seconds
+    debounce_max_delay: float = 3.0  # seconds
+    debounce_latency_factor: float = 2.0  # delay as a multiple of expected parse latency
+    debounce_smoothing: float = 0.3  # weight of the newest latency sample
     
     # Session settings
     session_timeout: int = 3600  # 1 hour
     max_sessions: int = 1000
+    session_memory_budget: int = 512 * 1024 * 1024  # bytes across all sessions; 0 disables
+    result_spill_after: float = 600.0  # seconds idle before a parse result moves to disk; 0 disables
+    result_spill_dir: str = "data/spill"
+    
+    # Multi-worker settings
+    workers: int = 1  # uvicorn worker processes; more than one requires a shared session backend
+    session_backend: str = "memory"  # "memory" (single worker) or "sqlite" (shared by local workers)
+    session_db_path: str = "data/sessions.db"
+    session_save_delay: float = 0.25  # seconds edits wait before one write to a shared store
+    broadcast_dir: str = "data/workers"  # sockets for cross-worker broadcasts
+    session_snapshot_path: str = "data/session-snapshot.db"  # empty disables snapshots
+    session_snapshot_interval: float = 30.0  # seconds between incremental snapshots
+    
+    # WebSocket settings
+    ws_compression: bool = True  # offer zlib-compressed frames to capable clients
+    ws_compression_threshold: int = 1024  # bytes; smaller messages are sent as text
+    ws_compression_level: int = 6
+    ws_compression_thread_threshold: int = 256 * 1024  # bytes; larger messages are compressed in a worker thread
+    ws_send_queue_size: int = 64  # unsent messages before a client is dropped as too slow
+    ws_send_timeout: float = 10.0  # seconds a single send may take
+    session_info_window: float = 0.1  # seconds over which session_info updates are coalesced
+    symbol_index_window: float = 0.05  # seconds over which grammar edits are coalesced before re-indexing
+    
+    # Warm-up settings
+    warmup_grammar_dir: str = "."  # *.lark files compiled in the background at startup; empty disables
+    warmup_state_path: str = "data/warmup.json"  # most used grammars, saved at shutdown for the next start
+    warmup_top_k: int = 10
     
     # Cache settings
     parse_cache_size: int = 100
+    validation_cache_size: int = 256  # grammar validation results, valid and invalid
+    compile_error_cache_size: int = 256  # grammars known not to compile
+    compile_error_ttl: float = 300.0  # seconds before a failed grammar is compiled again
+    symbol_index_cache_size: int = 64  # grammar symbol indexes, by grammar digest
+    standalone_cache_size: int = 32  # generated standalone parser modules, by grammar hash
+    export_cache_size: int = 64 * 1024 * 1024  # bytes of rendered exports kept for repeat downloads
+    export_cache_max_entry: int = 8 * 1024 * 1024  # larger exports are streamed without caching
     
     class Config:
         env_file = ".env"
@@ -47,26 +97,27 @@ class Settings(BaseSettings):
 def setup_logging(settings: Settings):
     """Setup application logging."""
     # Create formatters and handlers
-    formatter = logging.Formatter(settings.log_format)
+    formatter = JsonFormatter() if settings.log_json else logging.Formatter(settings.log_format)
+    handlers = []
     
     # Root logger
     root_logger = logging.getLogger()
     root_logger.setLevel(getattr(logging, settings.log_level.upper()))
     
-    # Clear existing handlers
-    root_logger.handlers.clear()
-    
     # Console handler
     if settings.log_to_console:
         console_handler = logging.StreamHandler(sys.stdout)
         console_handler.setFormatter(formatter)
-        root_logger.addHandler(console_handler)
+        handlers.append(console_handler)
     
     # File handler
     if settings.log_to_file:
         file_handler = logging.FileHandler(settings.log_file)
         file_handler.setFormatter(formatter)
-        root_logger.addHandler(file_handler)
+        handlers.append(file_handler)
+    
+    # Replaces the handlers of any earlier call, after writing out their queue
+    install_pipeline(LogPipeline(handlers, settings.log_queue, settings.log_sample_rates, settings.log_rate_limit))
     
     # Set specific logger levels to avoid noise
     logging.getLogger("uvicorn").setLevel(logging.INFO)
@@ -0,0 +1,245 @@
+"""Rope-backed text buffers for incrementally edited session documents."""
+
+import math
+import sys
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
+
+from .config import get_logger
+
+logger = get_logger("document")
+
+# Target size of rope leaves; adjacent leaves smaller than this are merged
+LEAF_SIZE = 1024
+
+
+class VersionMismatchError(Exception):
+    """Raised when an edit does not apply to the buffer's current version."""
+
+
+class _Leaf:
+    """Rope leaf holding a chunk of text."""
+    __slots__ = ("text", "length", "depth", "nbytes")
+
+    def __init__(self, text: str):
+        self.text = text
+        self.length = len(text)
+        self.depth = 0
+        self.nbytes = sys.getsizeof(text) + sys.getsizeof(self)
+
+
+class _Node:
+    """Rope interior node joining two subtrees."""
+    __slots__ = ("left", "right", "length", "depth", "nbytes")
+
+    def __init__(self, left: "_RopeTree", right: "_RopeTree"):
+        self.left = left
+        self.right = right
+        self.length = left.length + right.length
+        self.depth = max(left.depth, right.depth) + 1
+        # Nodes are immutable, so sizes are summed once, when a node is built
+        self.nbytes = left.nbytes + right.nbytes + sys.getsizeof(self)
+
+
+_RopeTree = Union[_Leaf, _Node]
+
+
+def _concat(left: Optional[_RopeTree], right: Optional[_RopeTree]) -> Optional[_RopeTree]:
+    """Join two subtrees, merging small adjacent leaves."""
+    if left is None or left.length == 0:
+        return right
+    if right is None or right.length == 0:
+        return left
+    if isinstance(right, _Leaf):
+        if isinstance(left, _Leaf) and left.length + right.length <= LEAF_SIZE:
+            return _Leaf(left.text + right.text)
+        # Typing at the end of a node keeps extending its last leaf
+        if isinstance(left, _Node) and isinstance(left.right, _Leaf) \
+                and left.right.length + right.length <= LEAF_SIZE:
+            return _Node(left.left, _Leaf(left.right.text + right.text))
+    return _Node(left, right)
+
+
+def _split(node: Optional[_RopeTree], index: int) -> Tuple[Optional[_RopeTree], Optional[_RopeTree]]:
+    """Split a subtree into [0, index) and [index, len)."""
+    if node is None:
+        return None, None
+    if isinstance(node, _Leaf):
+        if index <= 0:
+            return None, node
+        if index >= node.length:
+            return node, None
+        return _Leaf(node.text[:index]), _Leaf(node.text[index:])
+    if index < node.left.length:
+        left, right = _split(node.left, index)
+        return left, _concat(right, node.right)
+    left, right = _split(node.right, index - node.left.length)
+    return _concat(node.left, left), right
+
+
+def _build(leaves: List[_Leaf], start: int, end: int) -> Optional[_RopeTree]:
+    """Build a balanced subtree from leaves[start:end]."""
+    if start >= end:
+        return None
+    if end - start == 1:
+        return leaves[start]
+    middle = (start + end) // 2
+    return _Node(_build(leaves, start, middle), _build(leaves, middle, end))
+
+
+def _iter_leaves(node: Optional[_RopeTree]) -> Iterator[_Leaf]:
+    """Iterate over leaves left to right without recursion."""
+    stack = [node] if node is not None else []
+    while stack:
+        current = stack.pop()
+        if isinstance(current, _Leaf):
+            yield current
+        else:
+            stack.append(current.right)
+            stack.append(current.left)
+
+
+class Rope:
+    """Balanced rope of text chunks.
+
+    Replacing a range splits and rejoins O(log n) nodes; the tree is
+    rebuilt only when repeated edits leave it badly unbalanced. Each node
+    carries its subtree's length and byte size, so both are O(1) to read.
+    """
+
+    def __init__(self, text: str = ""):
+        self.root = self._from_chunks(
+            text[i:i + LEAF_SIZE] for i in range(0, len(text), LEAF_SIZE)
+        )
+
+    @staticmethod
+    def _from_chunks(chunks: Iterable[str]) -> Optional[_RopeTree]:
+        leaves = [_Leaf(chunk) for chunk in chunks if chunk]
+        return _build(leaves, 0, len(leaves))
+
+    def __len__(self) -> int:
+        return self.root.length if self.root is not None else 0
+
+    def __str__(self) -> str:
+        return "".join(leaf.text for leaf in _iter_leaves(self.root))
+
+    @property
+    def depth(self) -> int:
+        return self.root.depth if self.root is not None else 0
+
+    def nbytes(self) -> int:
+        """Approximate bytes held by the tree's nodes and text."""
+        return self.root.nbytes if self.root is not None else 0
+
+    def replace(self, start: int, end: int, text: str):
+        """Replace characters [start, end) with text."""
+        if not 0 <= start <= end <= len(self):
+            raise IndexError(f"Edit range [{start}, {end}) outside document of length {len(self)}")
+
+        left, rest = _split(self.root, start)
+        _, right = _split(rest, end - start)
+        middle = Rope(text).root
+        self.root = _concat(_concat(left, middle), right)
+
+        if self.depth > self._max_depth():
+            self.rebalance()
+
+    def _max_depth(self) -> int:
+        leaf_estimate = len(self) // (LEAF_SIZE // 2) + 2
+        return 2 * math.ceil(math.log2(leaf_estimate)) + 8
+
+    def rebalance(self):
+        """Rebuild the tree from its leaves, merging undersized ones."""
+        chunks: List[str] = []
+        pending = ""
+        for leaf in _iter_leaves(self.root):
+            pending += leaf.text
+            if len(pending) >= LEAF_SIZE // 2:
+                chunks.append(pending)
+                pending = ""
+        chunks.append(pending)
+        self.root = self._from_chunks(chunks)
+        logger.debug(f"Rebalanced rope ({len(self)} chars, depth {self.depth})")
+
+
+class DocumentBuffer:
+    """Versioned session document that accepts range edits.
+
+    The document is held as a plain string, a rope, or both: the rope is
+    built on the first edit and the string materialized on the first
+    read after one. ``compact`` drops the rope again.
+    """
+
+    __slots__ = ("_rope", "_text", "version")
+
+    def __init__(self, text: str = "", version: int = 0):
+        self._rope: Optional[Rope] = None
+        self._text: Optional[str] = text
+        self.version = version
+
+    @property
+    def rope(self) -> Rope:
+        """Rope for editing, built from the text on first use."""
+        if self._rope is None:
+            self._rope = Rope(self._text)
+        return self._rope
+
+    @property
+    def text(self) -> str:
+        """Full document text, materialized lazily after edits."""
+        if self._text is None:
+            self._text = str(self._rope)
+        return self._text
+
+    def __len__(self) -> int:
+        if self._text is not None:
+            return len(self._text)
+        return len(self._rope)
+
+    def compact(self) -> int:
+        """Keep only the text representation; returns the bytes released."""
+        if self._rope is None:
+            return 0
+        self.text  # Materialize before dropping the rope
+        released = self._rope_nbytes()
+        self._rope = None
+        return released
+
+    def _rope_nbytes(self) -> int:
+        return self._rope.nbytes() if self._rope is not None else 0
+
+    def nbytes(self) -> int:
+        """Approximate bytes held by the document."""
+        total = sys.getsizeof(self._text) if self._text is not None else 0
+        return total + self._rope_nbytes()
+
+    def set_text(self, text: str, version: Optional[int] = None):
+        """Replace the whole document with a snapshot."""
+        self._rope = None
+        self._text = text
+        self.version = version if version is not None else self.version + 1
+
+    def apply_edits(self, edits: Iterable[Tuple[int, int, str]], base_version: int, version: int):
+        """Apply (offset, length, text) edits made against base_version.
+
+        Edits are applied in order, each against the result of the
+        previous one. Raises VersionMismatchError if the buffer is not at
+        base_version or an edit falls outside the document; the buffer is
+        left unchanged and the caller must resync with a full snapshot.
+        """
+        if base_version != self.version:
+            raise VersionMismatchError(
+                f"Edit based on version {base_version}, buffer is at version {self.version}"
+            )
+
+        # Rope nodes are never mutated, so the old root is a free snapshot
+        rope = self.rope
+        original_root = rope.root
+        try:
+            for offset, length, text in edits:
+                rope.replace(offset, offset + length, text)
+        except IndexError as e:
+            rope.root = original_root
+            raise VersionMismatchError(str(e))
+
+        self._text = None
+        self.version = version
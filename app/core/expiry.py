@@ -0,0 +1,92 @@
+"""Activity-ordered index for expiring and evicting idle sessions."""
+
+import heapq
+import itertools
+from typing import Dict, Iterator, List, Optional, Tuple
+
+
+class ExpiryIndex:
+    """Min-heap of keys ordered by last activity.
+
+    Touching a key pushes a new heap entry and supersedes the old one,
+    which is skipped when it reaches the top, so touch and discard are
+    O(log n) and O(1). The heap is rebuilt once superseded entries
+    outnumber live ones.
+    """
+
+    def __init__(self):
+        self._heap: List[Tuple[float, int, str]] = []
+        self._entries: Dict[str, Tuple[float, int]] = {}
+        self._counter = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries
+
+    def touch(self, key: str, last_activity: float):
+        """Insert a key or move it to its new activity time."""
+        entry = (last_activity, next(self._counter))
+        self._entries[key] = entry
+        heapq.heappush(self._heap, (entry[0], entry[1], key))
+        if len(self._heap) > 2 * len(self._entries) + 64:
+            self._compact()
+
+    def discard(self, key: str):
+        """Remove a key if present."""
+        self._entries.pop(key, None)
+
+    def get(self, key: str) -> Optional[float]:
+        """Get a key's last activity time."""
+        entry = self._entries.get(key)
+        return entry[0] if entry else None
+
+    def iter_oldest(self) -> Iterator[Tuple[str, float]]:
+        """Yield (key, last_activity) pairs, least recently active first.
+
+        The heap is walked lazily, so taking the first k pairs costs
+        O(k log k) rather than a sort of every key. Keys discarded while
+        iterating are skipped; keys must not be touched meanwhile.
+        """
+        heap = self._heap
+        frontier = [(heap[0], 0)] if heap else []
+        while frontier:
+            (last_activity, sequence, key), index = heapq.heappop(frontier)
+            for child in (2 * index + 1, 2 * index + 2):
+                if child < len(heap):
+                    heapq.heappush(frontier, (heap[child], child))
+            if self._entries.get(key) == (last_activity, sequence):
+                yield key, last_activity
+
+    def peek(self) -> Optional[Tuple[str, float]]:
+        """Get the least recently active key and its activity time."""
+        heap = self._heap
+        while heap:
+            last_activity, sequence, key = heap[0]
+            if self._entries.get(key) == (last_activity, sequence):
+                return key, last_activity
+            heapq.heappop(heap)
+        return None
+
+    def pop(self) -> Optional[str]:
+        """Remove and return the least recently active key."""
+        oldest = self.peek()
+        if oldest is None:
+            return None
+        heapq.heappop(self._heap)
+        del self._entries[oldest[0]]
+        return oldest[0]
+
+    def pop_expired(self, cutoff: float) -> List[str]:
+        """Remove and return every key last active before cutoff."""
+        expired = []
+        while True:
+            oldest = self.peek()
+            if oldest is None or oldest[1] >= cutoff:
+                return expired
+            expired.append(self.pop())
+
+    def _compact(self):
+        self._heap = [(entry[0], entry[1], key) for key, entry in self._entries.items()]
+        heapq.heapify(self._heap)
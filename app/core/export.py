@@ -0,0 +1,290 @@
+"""Streaming exporters that render an AST as JSON, XML, DOT or plain text.
+
+Each exporter walks the tree with an explicit stack and yields the
+document in chunks, so memory use beyond the tree itself stays constant
+and arbitrarily deep trees cannot hit the recursion limit.
+"""
+
+import hashlib
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from ..models.responses import ASTNode
+from .config import get_logger, get_settings
+from .serialization import dump_json_text, iter_ast_json
+
+logger = get_logger("export")
+
+# Text fragments buffered before a chunk is handed to the response
+FLUSH_AT = 1024
+
+CHUNK_SIZE = 64 * 1024
+
+EXPORT_CONTENT_TYPES = {
+    "json": "application/json",
+    "xml": "application/xml",
+    "dot": "text/vnd.graphviz; charset=utf-8",
+    "text": "text/plain; charset=utf-8",
+}
+
+EXPORT_EXTENSIONS = {
+    "json": "json",
+    "xml": "xml",
+    "dot": "dot",
+    "text": "txt",
+}
+
+
+def _escape_xml(text: Any) -> str:
+    """Escape XML special characters, keeping newlines in attribute values."""
+    return (
+        str(text).replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+        .replace('"', '&quot;').replace('\n', '&#10;')
+    )
+
+
+def _escape_dot(text: Any) -> str:
+    """Escape DOT special characters."""
+    return str(text).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _is_tree(node: Any) -> bool:
+    return isinstance(node, ASTNode) and node.type == "tree"
+
+
+def _node_data(node: Any) -> str:
+    return node.data if isinstance(node, ASTNode) else str(node)
+
+
+def iter_json(root: ASTNode, metadata: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+    """Yield the tree as JSON, with a ``metadata`` member appended if given."""
+    if metadata is None:
+        yield from iter_ast_json(root, FLUSH_AT)
+        return
+
+    # The root object always ends with "}"; hold back the last piece so
+    # the metadata can be spliced in before it closes
+    pending = None
+    for piece in iter_ast_json(root, FLUSH_AT):
+        if pending:
+            yield pending
+        pending = piece
+    yield f'{pending[:-1]},"metadata":{dump_json_text(metadata)}}}'
+
+
+def iter_xml(root: ASTNode, metadata: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+    """Yield the tree as an XML document."""
+    out: List[str] = ['<?xml version="1.0" encoding="UTF-8"?>\n<ast>\n']
+    if metadata is not None:
+        attributes = "".join(f' {key}="{_escape_xml(value)}"' for key, value in metadata.items())
+        out.append(f'  <metadata{attributes} />\n')
+
+    # Closing tags are queued on the stack as plain strings
+    stack: List[Any] = [(root, 1)]
+    while stack:
+        if len(out) >= FLUSH_AT:
+            yield "".join(out)
+            out.clear()
+        item = stack.pop()
+        if isinstance(item, str):
+            out.append(item)
+            continue
+        node, depth = item
+        indent = "  " * depth
+        if _is_tree(node):
+            out.append(f'{indent}<tree data="{_escape_xml(node.data)}">\n')
+            stack.append(f'{indent}</tree>\n')
+            stack.extend((child, depth + 1) for child in reversed(node.children))
+        else:
+            out.append(f'{indent}<token data="{_escape_xml(_node_data(node))}" />\n')
+
+    out.append('</ast>\n')
+    yield "".join(out)
+
+
+def iter_dot(root: ASTNode, metadata: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+    """Yield the tree as a Graphviz digraph with nodes numbered in preorder."""
+    out: List[str] = []
+    if metadata is not None:
+        out.extend(f'// {key}: {value}\n' for key, value in metadata.items())
+    out.append('digraph AST {\n')
+
+    next_id = 0
+    stack: List[Any] = [(root, None)]
+    while stack:
+        if len(out) >= FLUSH_AT:
+            yield "".join(out)
+            out.clear()
+        node, parent_id = stack.pop()
+        node_id = next_id
+        next_id += 1
+        if parent_id is not None:
+            out.append(f'  {parent_id} -> {node_id};\n')
+        if _is_tree(node):
+            out.append(f'  {node_id} [label="{_escape_dot(node.data)}" shape=ellipse];\n')
+            stack.extend((child, node_id) for child in reversed(node.children))
+        else:
+            out.append(f'  {node_id} [label="{_escape_dot(_node_data(node))}" shape=box];\n')
+
+    out.append('}\n')
+    yield "".join(out)
+
+
+def iter_text(root: ASTNode, metadata: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+    """Yield the tree as an indented outline with quoted tokens."""
+    out: List[str] = []
+    if metadata is not None:
+        out.extend(f'# {key}: {value}\n' for key, value in metadata.items())
+
+    stack: List[Any] = [(root, 0)]
+    while stack:
+        if len(out) >= FLUSH_AT:
+            yield "".join(out)
+            out.clear()
+        node, depth = stack.pop()
+        indent = "  " * depth
+        if _is_tree(node):
+            out.append(f'{indent}{node.data}\n')
+            stack.extend((child, depth + 1) for child in reversed(node.children))
+        else:
+            out.append(f'{indent}"{_node_data(node)}"\n')
+
+    yield "".join(out)
+
+
+EXPORTERS: Dict[str, Callable[..., Iterator[str]]] = {
+    "json": iter_json,
+    "xml": iter_xml,
+    "dot": iter_dot,
+    "text": iter_text,
+}
+
+
+def iter_export(
+    root: ASTNode,
+    format: str,
+    metadata: Optional[Dict[str, Any]] = None,
+    chunk_size: int = CHUNK_SIZE
+) -> Iterator[bytes]:
+    """Yield an export as UTF-8 chunks of roughly ``chunk_size`` bytes."""
+    buffer: List[str] = []
+    buffered = 0
+    for piece in EXPORTERS[format](root, metadata):
+        buffer.append(piece)
+        buffered += len(piece)
+        if buffered >= chunk_size:
+            yield "".join(buffer).encode("utf-8")
+            buffer.clear()
+            buffered = 0
+    if buffer:
+        yield "".join(buffer).encode("utf-8")
+
+
+# (grammar hash, text hash, format, include_metadata)
+ExportKey = Tuple[str, str, str, bool]
+
+
+class CachedExport:
+    """A rendered export and its strong validator."""
+
+    __slots__ = ("body", "etag")
+
+    def __init__(self, body: bytes):
+        self.body = body
+        self.etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Check an If-None-Match header against an ETag (weak comparison)."""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+class ExportCache:
+    """LRU cache of rendered exports bounded by total size in bytes."""
+
+    def __init__(self, max_bytes: int, max_entry: int):
+        self.entries: "OrderedDict[ExportKey, CachedExport]" = OrderedDict()
+        self.max_bytes = max_bytes
+        self.max_entry = max_entry
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.uncacheable = 0
+
+    def get(self, key: ExportKey) -> Optional[CachedExport]:
+        """Get a cached export and mark it recently used."""
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key: ExportKey, body: bytes) -> CachedExport:
+        """Store an export, evicting the least recently used ones to fit."""
+        entry = CachedExport(body)
+        previous = self.entries.pop(key, None)
+        if previous is not None:
+            self.size -= len(previous.body)
+        self.entries[key] = entry
+        self.size += len(body)
+        while self.size > self.max_bytes and len(self.entries) > 1:
+            _, evicted = self.entries.popitem(last=False)
+            self.size -= len(evicted.body)
+        logger.debug(f"Cached {key[2]} export of {len(body)} bytes (cache size: {self.size} bytes)")
+        return entry
+
+    def clear(self):
+        """Drop every cached export."""
+        self.entries.clear()
+        self.size = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache occupancy and hit counts."""
+        return {
+            "entries": len(self.entries),
+            "bytes": self.size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified,
+            "uncacheable": self.uncacheable,
+        }
+
+
+def buffer_export(chunks: Iterator[bytes], limit: int) -> Tuple[List[bytes], bool]:
+    """Read chunks until the export ends or exceeds ``limit`` bytes.
+
+    Returns the chunks read and whether the export is complete; an
+    incomplete export can still be streamed by sending the buffered
+    chunks followed by the rest of the iterator.
+    """
+    buffered: List[bytes] = []
+    size = 0
+    for chunk in chunks:
+        buffered.append(chunk)
+        size += len(chunk)
+        if size > limit:
+            return buffered, False
+    return buffered, True
+
+
+# Global export cache instance
+_export_cache: Optional[ExportCache] = None
+
+
+def get_export_cache() -> ExportCache:
+    """Get global export cache instance."""
+    global _export_cache
+    if _export_cache is None:
+        settings = get_settings()
+        _export_cache = ExportCache(settings.export_cache_size, settings.export_cache_max_entry)
+    return _export_cache
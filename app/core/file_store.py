@@ -0,0 +1,240 @@
+"""Content-addressed local store for uploaded grammar and text files.
+
+Uploads are written chunk by chunk to a temporary file while their
+SHA-256 is computed, then renamed to a path derived from the digest, so
+identical uploads share one blob. A SQLite index maps upload ids to the
+blob's digest and size and to the name and type the file was uploaded
+with; uploads of the same content under different names get their own
+entries.
+"""
+
+import asyncio
+import codecs
+import hashlib
+import mmap
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, Optional
+
+import aiofiles
+import aiofiles.os
+
+from .config import get_logger, get_settings
+
+logger = get_logger("file_store")
+
+# Hex digits of the SHA-256 used as the public upload id
+CONTENT_ID_LENGTH = 32
+
+# Files at least this large are decoded straight from a memory map
+MMAP_THRESHOLD = 1024 * 1024
+
+
+class UploadTooLarge(ValueError):
+    """The upload exceeded its size limit."""
+
+
+class BinaryContent(ValueError):
+    """The upload is not UTF-8 text."""
+
+
+@dataclass
+class StoredFile:
+    """Index entry for an upload and the blob holding its content."""
+    id: str
+    digest: str
+    size: int
+    content_type: str
+    filename: str
+    file_type: str
+    created_at: float
+
+
+class FileStore:
+    """Blobs under ``objects/`` named by digest, indexed in ``index.db``."""
+
+    _COLUMNS = ("id", "digest", "size", "content_type", "filename", "file_type", "created_at")
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.objects_dir = os.path.join(directory, "objects")
+        self.temp_dir = os.path.join(directory, "tmp")
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.temp_dir, exist_ok=True)
+        self.stored = 0
+        self.deduplicated = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(
+            os.path.join(directory, "index.db"), check_same_thread=False, isolation_level=None
+        )
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA busy_timeout=5000")
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS files (
+                id TEXT PRIMARY KEY,
+                digest TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                content_type TEXT NOT NULL,
+                filename TEXT NOT NULL,
+                file_type TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+            """
+        )
+        logger.info(f"Opened file store at {directory}")
+
+    @staticmethod
+    def upload_id(digest: str, filename: str, content_type: str, file_type: str) -> str:
+        """Id of an upload: its content plus the metadata it was uploaded with."""
+        key = "\0".join((digest, filename, content_type, file_type))
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()[:CONTENT_ID_LENGTH]
+
+    def path_for(self, digest: str) -> str:
+        """Path of the blob with this digest."""
+        return os.path.join(self.objects_dir, digest[:2], digest[2:])
+
+    def get(self, file_id: str) -> Optional[StoredFile]:
+        """Look up a stored file by upload id."""
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT {', '.join(self._COLUMNS)} FROM files WHERE id = ?", (file_id,)
+            ).fetchone()
+        return StoredFile(*row) if row else None
+
+    async def lookup(self, file_id: str) -> Optional[StoredFile]:
+        """Look up a stored file in a worker thread."""
+        return await asyncio.get_running_loop().run_in_executor(None, self.get, file_id)
+
+    def _index(self, stored: StoredFile) -> StoredFile:
+        """Add an upload to the index, keeping the first entry for a repeated one."""
+        with self._lock:
+            self._db.execute(
+                f"INSERT OR IGNORE INTO files ({', '.join(self._COLUMNS)}) "
+                f"VALUES ({', '.join('?' * len(self._COLUMNS))})",
+                tuple(getattr(stored, column) for column in self._COLUMNS)
+            )
+        return self.get(stored.id)
+
+    async def put_stream(
+        self,
+        chunks: AsyncIterator[bytes],
+        filename: str,
+        content_type: str,
+        file_type: str,
+        max_size: int
+    ) -> StoredFile:
+        """Store an upload read from ``chunks``.
+
+        Raises UploadTooLarge once more than ``max_size`` bytes arrive and
+        BinaryContent for NUL bytes or invalid UTF-8, before the whole
+        upload has been read.
+        """
+        digest = hashlib.sha256()
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        size = 0
+        temp_path = os.path.join(self.temp_dir, uuid.uuid4().hex)
+        try:
+            async with aiofiles.open(temp_path, "wb") as temp_file:
+                async for chunk in chunks:
+                    size += len(chunk)
+                    if size > max_size:
+                        raise UploadTooLarge(f"Upload exceeds {max_size} bytes")
+                    if b"\x00" in chunk:
+                        raise BinaryContent("Binary files not supported")
+                    try:
+                        decoder.decode(chunk)
+                    except UnicodeDecodeError:
+                        raise BinaryContent("Binary files not supported")
+                    digest.update(chunk)
+                    await temp_file.write(chunk)
+            try:
+                decoder.decode(b"", final=True)
+            except UnicodeDecodeError:
+                raise BinaryContent("Binary files not supported")
+
+            hex_digest = digest.hexdigest()
+            path = self.path_for(hex_digest)
+            if await aiofiles.os.path.exists(path):
+                self.deduplicated += 1
+                await aiofiles.os.remove(temp_path)
+            else:
+                await aiofiles.os.makedirs(os.path.dirname(path), exist_ok=True)
+                await aiofiles.os.replace(temp_path, path)
+                self.stored += 1
+        except BaseException as e:
+            if isinstance(e, ValueError):
+                self.rejected += 1
+            try:
+                await aiofiles.os.remove(temp_path)
+            except FileNotFoundError:
+                pass
+            raise
+
+        stored = await asyncio.get_running_loop().run_in_executor(None, self._index, StoredFile(
+            id=self.upload_id(hex_digest, filename, content_type, file_type),
+            digest=hex_digest,
+            size=size,
+            content_type=content_type,
+            filename=filename,
+            file_type=file_type,
+            created_at=time.time()
+        ))
+        logger.info(f"Stored {filename} as {stored.id} ({size} bytes)")
+        return stored
+
+    def read_text(self, file_id: str) -> Optional[str]:
+        """Read a stored file as text, or None if the id is unknown.
+        
+        Large files are decoded from a read-only memory map, so the only
+        copy made is the decoded string itself.
+        """
+        stored = self.get(file_id)
+        if stored is None:
+            return None
+        with open(self.path_for(stored.digest), "rb") as stored_file:
+            if stored.size < MMAP_THRESHOLD:
+                return stored_file.read().decode("utf-8")
+            with mmap.mmap(stored_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                return str(mapped, "utf-8")
+
+    async def load_text(self, file_id: str) -> Optional[str]:
+        """Read a stored file as text in a worker thread."""
+        return await asyncio.get_running_loop().run_in_executor(None, self.read_text, file_id)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get blob counts for the stats endpoint."""
+        with self._lock:
+            files, blobs, total = self._db.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT digest), "
+                "(SELECT COALESCE(SUM(size), 0) FROM (SELECT DISTINCT digest, size FROM files)) FROM files"
+            ).fetchone()
+        return {
+            "files": files,
+            "blobs": blobs,
+            "bytes": total,
+            "stored": self.stored,
+            "deduplicated": self.deduplicated,
+            "rejected": self.rejected,
+        }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+# Global file store instance
+_file_store: Optional[FileStore] = None
+
+
+def get_file_store() -> FileStore:
+    """Get global file store instance."""
+    global _file_store
+    if _file_store is None:
+        _file_store = FileStore(get_settings().upload_store_dir)
+    return _file_store
@@ -0,0 +1,201 @@
+"""Logging pipeline: background writing, sampling and JSON records.
+
+Log calls put records on a queue, and a listener thread formats and
+writes them, so file and console I/O stays off the event loop. Before a
+record is queued, DEBUG records can be thinned per logger by a sampling
+rate and a rate limit, as the per-keystroke debug paths would otherwise
+flood the log. Records at INFO and above are never dropped.
+"""
+
+import json
+import logging
+import logging.handlers
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+# Attributes every LogRecord has; anything else came from ``extra=``
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+
+def _setting_for(name: str, values: Dict[str, Any], resolved: Dict[str, Any]) -> Any:
+    """Find the value of a logger or of its nearest configured parent."""
+    if name not in resolved:
+        prefix = name
+        while prefix and prefix not in values:
+            prefix = prefix.rpartition(".")[0]
+        resolved[name] = values.get(prefix)
+    return resolved[name]
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps a configured share of each logger's DEBUG records.
+
+    Rates apply to a logger and its children, e.g. ``{"app.websocket":
+    0.1}`` keeps every tenth debug record of the WebSocket loggers.
+    Records are kept at evenly spaced counts rather than at random.
+    """
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+        self.resolved: Dict[str, Optional[float]] = {}
+        self.credit: Dict[str, float] = {}
+        self.dropped = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.INFO:
+            return True
+        rate = _setting_for(record.name, self.rates, self.resolved)
+        if rate is None or rate >= 1:
+            return True
+        credit = self.credit.get(record.name, 0.0) + rate
+        if credit >= 1:
+            self.credit[record.name] = credit - 1
+            return True
+        self.credit[record.name] = credit
+        self.dropped += 1
+        return False
+
+
+class RateLimitFilter(logging.Filter):
+    """Caps each logger's DEBUG records per second, allowing a one-second burst."""
+
+    def __init__(self, per_second: float):
+        super().__init__()
+        self.per_second = per_second
+        # logger name -> (tokens, last refill)
+        self.buckets: Dict[str, List[float]] = {}
+        self.dropped = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.INFO or self.per_second <= 0:
+            return True
+        now = time.monotonic()
+        bucket = self.buckets.get(record.name)
+        if bucket is None:
+            bucket = self.buckets[record.name] = [self.per_second, now]
+        else:
+            bucket[0] = min(self.per_second, bucket[0] + (now - bucket[1]) * self.per_second)
+            bucket[1] = now
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            return True
+        self.dropped += 1
+        return False
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as one JSON object per line.
+
+    Fields passed with ``extra=`` are included, so records can carry
+    structured data such as session ids and timings.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        if record.stack_info:
+            entry["stack"] = self.formatStack(record.stack_info)
+        return json.dumps(entry, default=str)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Queues records with their message merged but otherwise unformatted."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Arguments may change once the log call returns, so the message
+        # is merged now; timestamps and tracebacks are formatted by the
+        # listener thread. The queue handler is the root logger's only
+        # handler, so the record is not copied.
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+class LogPipeline:
+    """The root logger's handlers, filters and optional listener thread."""
+
+    def __init__(self, handlers: List[logging.Handler], use_queue: bool,
+                 sample_rates: Dict[str, float], rate_limit: float):
+        self.sampling = SamplingFilter(sample_rates)
+        self.rate_limit = RateLimitFilter(rate_limit)
+        self.queue: Optional[queue.SimpleQueue] = None
+        self.listener: Optional[logging.handlers.QueueListener] = None
+        if use_queue:
+            self.queue = queue.SimpleQueue()
+            self.listener = logging.handlers.QueueListener(self.queue, *handlers, respect_handler_level=True)
+            self.handlers: List[logging.Handler] = [_QueueHandler(self.queue)]
+        else:
+            self.handlers = handlers
+        for handler in self.handlers:
+            handler.addFilter(self.sampling)
+            handler.addFilter(self.rate_limit)
+
+    def start(self, root_logger: logging.Logger):
+        for handler in self.handlers:
+            root_logger.addHandler(handler)
+        if self.listener is not None:
+            self.listener.start()
+
+    def stop(self, root_logger: logging.Logger):
+        """Detach from the root logger, writing out any queued records."""
+        for handler in self.handlers:
+            root_logger.removeHandler(handler)
+        if self.listener is not None:
+            self.listener.stop()
+            for handler in self.listener.handlers:
+                handler.close()
+        else:
+            for handler in self.handlers:
+                handler.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get dropped and queued record counts for the stats endpoint."""
+        return {
+            "queued": self.queue.qsize() if self.queue is not None else None,
+            "sampled_out": self.sampling.dropped,
+            "rate_limited": self.rate_limit.dropped,
+        }
+
+
+# Active logging pipeline
+_pipeline: Optional[LogPipeline] = None
+_pipeline_lock = threading.Lock()
+
+
+def install_pipeline(pipeline: LogPipeline):
+    """Replace the root logger's pipeline, flushing the previous one."""
+    global _pipeline
+    root_logger = logging.getLogger()
+    with _pipeline_lock:
+        if _pipeline is not None:
+            _pipeline.stop(root_logger)
+        root_logger.handlers.clear()
+        pipeline.start(root_logger)
+        _pipeline = pipeline
+
+
+def stop_logging():
+    """Write out queued records and stop the listener thread."""
+    global _pipeline
+    with _pipeline_lock:
+        if _pipeline is not None:
+            _pipeline.stop(logging.getLogger())
+            _pipeline = None
+
+
+def get_log_stats() -> Optional[Dict[str, Any]]:
+    """Get the active pipeline's stats."""
+    return _pipeline.get_stats() if _pipeline is not None else None
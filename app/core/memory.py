@@ -0,0 +1,50 @@
+"""Approximate memory accounting for session contents and parse results."""
+
+import sys
+from typing import Any, List
+
+from ..models.responses import ASTNode, ParseResult
+
+# Model instance, its field dict and five small ints/None per AST node
+_NODE_OVERHEAD = (
+    sys.getsizeof(ASTNode(type="", data=""))
+    + sys.getsizeof(ASTNode(type="", data="").__dict__)
+    + 4 * sys.getsizeof(0)
+)
+_LIST_OVERHEAD = sys.getsizeof([])
+_POINTER_SIZE = 8
+
+# Status, timestamps, settings and other small fields of a ParseResult
+_RESULT_OVERHEAD = 1024
+
+
+def estimate_ast_bytes(root: ASTNode) -> int:
+    """Estimate the bytes held by an AST without recursion.
+
+    Rule and token type names are shared between nodes and are not
+    counted; node data and string children are.
+    """
+    total = 0
+    stack: List[Any] = [root]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, ASTNode):
+            children = node.children
+            total += (
+                _NODE_OVERHEAD + sys.getsizeof(node.data)
+                + _LIST_OVERHEAD + _POINTER_SIZE * len(children)
+            )
+            stack.extend(children)
+        else:
+            total += sys.getsizeof(node)
+    return total
+
+
+def estimate_result_bytes(result: ParseResult) -> int:
+    """Estimate the bytes held by a parse result."""
+    total = _RESULT_OVERHEAD
+    if result.error is not None:
+        total += sys.getsizeof(result.error.message)
+    if result.tree is not None:
+        total += estimate_ast_bytes(result.tree)
+    return total
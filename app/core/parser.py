@@ -3,12 +3,9 @@
 import asyncio
 import hashlib
 import time
-from typing import Optional, Dict, Any, Union, List
+from typing import Optional, Dict, Any, Union, List, Callable, Tuple, TYPE_CHECKING
 from datetime import datetime
 
-import lark
-from lark.exceptions import GrammarError, ParseError, VisitError
-
 from ..models.requests import ParseSettings, ParserType
 from ..models.responses import (
     ParseResult, ParseStatus, ParseError as APIParseError, 
@@ -16,9 +13,35 @@ from ..models.responses import (
 )
 from .config import get_settings, get_logger
 
+if TYPE_CHECKING:
+    # lark is imported when the first grammar is compiled, not at startup
+    import lark
+
 settings = get_settings()
 logger = get_logger("parser")
 
+# Number of tokens fed to an LALR parser between cooperative abort checks
+ABORT_CHECK_INTERVAL = 256
+
+
+class ParseCancelledError(Exception):
+    """Raised when a parse is superseded before it completes."""
+
+
+class GrammarCompileError(Exception):
+    """Raised when a grammar cannot be compiled, with the error to report."""
+    
+    def __init__(self, error: APIParseError):
+        super().__init__(error.message)
+        self.error = error
+
+
+def _record_split_key(parse_settings: ParseSettings) -> str:
+    # Record-split results differ from whole-input ones; plain settings keep their old keys
+    if not parse_settings.record_separator:
+        return ""
+    return f"|{parse_settings.record_separator}|{parse_settings.record_rule}"
+
 
 class ParseCache:
     """Simple LRU cache for parse results."""
@@ -31,9 +54,9 @@ class ParseCache:
     
     def get_cache_key(self, grammar: str, text: str, parse_settings: ParseSettings) -> str:
         """Generate cache key from inputs."""
-        content = f"{grammar}|{text}|{parse_settings.start_rule}|{parse_settings.parser}"
+        content = f"{grammar}|{text}|{parse_settings.start_rule}|{parse_settings.parser}{_record_split_key(parse_settings)}"
         cache_key = hashlib.md5(content.encode()).hexdigest()
-        logger.debug(f"Generated cache key: {cache_key[:8]}... for grammar({len(grammar)} chars), text({len(text)} chars)")
+        logger.debug("Generated cache key: %.8s... for grammar(%d chars), text(%d chars)", cache_key, len(grammar), len(text))
         return cache_key
     
     def get(self, key: str) -> Optional[ParseResult]:
@@ -41,25 +64,87 @@ class ParseCache:
         if key in self.cache:
             self.access_order.remove(key)
             self.access_order.append(key)
-            logger.debug(f"Cache hit for key: {key[:8]}...")
+            logger.debug("Cache hit for key: %.8s...", key)
             return self.cache[key]
-        logger.debug(f"Cache miss for key: {key[:8]}...")
+        logger.debug("Cache miss for key: %.8s...", key)
         return None
     
     def put(self, key: str, result: ParseResult):
         """Store result in cache with LRU eviction."""
         if key in self.cache:
             self.access_order.remove(key)
-            logger.debug(f"Updated existing cache entry: {key[:8]}...")
+            logger.debug("Updated existing cache entry: %.8s...", key)
         elif len(self.cache) >= self.max_size:
             # Evict least recently used
             oldest_key = self.access_order.pop(0)
             del self.cache[oldest_key]
-            logger.debug(f"Evicted LRU cache entry: {oldest_key[:8]}...")
+            logger.debug("Evicted LRU cache entry: %.8s...", oldest_key)
         
         self.cache[key] = result
         self.access_order.append(key)
-        logger.debug(f"Cached result for key: {key[:8]}... (cache size: {len(self.cache)})")
+        logger.debug("Cached result for key: %.8s... (cache size: %d)", key, len(self.cache))
+    
+    def holds(self, result: ParseResult) -> bool:
+        """Check whether this exact result object is cached."""
+        return any(cached is result for cached in self.cache.values())
+
+
+class CompileErrorCache:
+    """Bounded cache of grammar compilation failures, expiring after a TTL."""
+    
+    def __init__(self, max_size: int, ttl: float):
+        self.errors: Dict[str, Tuple[float, ParseStatus, APIParseError]] = {}
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+    
+    def get(self, grammar_hash: str) -> Optional[Tuple[ParseStatus, APIParseError]]:
+        """Get the cached failure for a grammar hash, if it has not expired."""
+        entry = self.errors.get(grammar_hash)
+        if entry is None:
+            return None
+        failed_at, status, error = entry
+        if time.monotonic() - failed_at >= self.ttl:
+            del self.errors[grammar_hash]
+            return None
+        self.hits += 1
+        return status, error
+    
+    def put(self, grammar_hash: str, status: ParseStatus, error: APIParseError):
+        """Record a failure, dropping the oldest entries beyond the limit."""
+        self.errors.pop(grammar_hash, None)
+        self.errors[grammar_hash] = (time.monotonic(), status, error)
+        while len(self.errors) > self.max_size:
+            del self.errors[next(iter(self.errors))]
+        logger.debug("Cached compile failure for grammar hash: %.8s...", grammar_hash)
+    
+    def clear(self):
+        self.errors.clear()
+
+
+class GrammarUsage:
+    """Counts parses per grammar hash, keeping the sources of the most used."""
+    
+    def __init__(self, keep: int):
+        self.counts: Dict[str, int] = {}
+        self.sources: Dict[str, Tuple[str, ParseSettings]] = {}
+        self.keep = keep
+    
+    def record(self, grammar_hash: str, grammar: str, parse_settings: ParseSettings):
+        """Count a parse; sessions mutate their settings, so a copy is kept."""
+        self.counts[grammar_hash] = self.counts.get(grammar_hash, 0) + 1
+        if grammar_hash in self.sources:
+            return
+        self.sources[grammar_hash] = (grammar, parse_settings.model_copy())
+        if len(self.sources) > self.keep * 4:
+            for dropped in sorted(self.sources, key=self.counts.__getitem__)[:len(self.sources) - self.keep * 2]:
+                del self.sources[dropped]
+                del self.counts[dropped]
+    
+    def top(self, count: int) -> List[Tuple[str, ParseSettings, int]]:
+        """Get (grammar, settings, uses) of the most used grammars."""
+        hashes = sorted(self.sources, key=self.counts.__getitem__, reverse=True)[:count]
+        return [(*self.sources[grammar_hash], self.counts[grammar_hash]) for grammar_hash in hashes]
 
 
 class AsyncLarkParser:
@@ -67,39 +152,51 @@ class AsyncLarkParser:
     
     def __init__(self):
         self.cache = ParseCache(settings.parse_cache_size)
-        self.active_parsers: Dict[str, lark.Lark] = {}
+        self.active_parsers: Dict[str, "lark.Lark"] = {}
+        # Compilations in progress, shared by every caller needing the same grammar
+        self.compiling: Dict[str, asyncio.Future] = {}
+        self.validations: Dict[str, GrammarValidationResult] = {}
+        self.compile_errors = CompileErrorCache(settings.compile_error_cache_size, settings.compile_error_ttl)
+        self.usage = GrammarUsage(settings.warmup_top_k)
         self.parse_count = 0
+        self.validation_hits = 0
         logger.info("Initialized AsyncLarkParser")
     
     def _grammar_hash(self, grammar: str, parse_settings: ParseSettings) -> str:
         """Generate hash for grammar with settings."""
-        content = f"{grammar}|{parse_settings.start_rule}|{parse_settings.parser}"
+        content = f"{grammar}|{parse_settings.start_rule}|{parse_settings.parser}{_record_split_key(parse_settings)}"
         grammar_hash = hashlib.md5(content.encode()).hexdigest()
-        logger.debug(f"Generated grammar hash: {grammar_hash[:8]}... for {len(grammar)} char grammar")
+        logger.debug("Generated grammar hash: %.8s... for %d char grammar", grammar_hash, len(grammar))
         return grammar_hash
     
-    def _lark_tree_to_ast_node(self, node: Union[lark.Tree, lark.Token]) -> Union[ASTNode, str]:
+    def _lark_tree_to_ast_node(self, node: Union["lark.Tree", "lark.Token"]) -> Union[ASTNode, str]:
         """Convert Lark tree to API ASTNode structure."""
-        if isinstance(node, lark.Tree):
-            children = [self._lark_tree_to_ast_node(child) for child in node.children]
-            return ASTNode(
-                type="tree",
-                data=node.data,
-                children=children
-            )
-        else:  # Token
-            return ASTNode(
-                type="token",
-                data=str(node),
-                children=[],
-                start_pos=getattr(node, 'start_pos', None),
-                end_pos=getattr(node, 'end_pos', None),
-                line=getattr(node, 'line', None),
-                column=getattr(node, 'column', None)
-            )
+        from lark import Tree
+        
+        def convert(node: Union["lark.Tree", "lark.Token"]) -> Union[ASTNode, str]:
+            if isinstance(node, Tree):
+                children = [convert(child) for child in node.children]
+                return ASTNode(
+                    type="tree",
+                    data=node.data,
+                    children=children
+                )
+            else:  # Token
+                return ASTNode(
+                    type="token",
+                    data=str(node),
+                    children=[],
+                    start_pos=getattr(node, 'start_pos', None),
+                    end_pos=getattr(node, 'end_pos', None),
+                    line=getattr(node, 'line', None),
+                    column=getattr(node, 'column', None)
+                )
+        
+        return convert(node)
     
     def _create_parse_error(self, error: Exception) -> APIParseError:
         """Convert Lark exception to API error structure."""
+        from lark.exceptions import GrammarError, ParseError
         logger.error(f"Creating parse error from exception: {type(error).__name__}: {str(error)}")
         
         if isinstance(error, GrammarError):
@@ -132,15 +229,62 @@ class AsyncLarkParser:
                 message=f"Internal error: {str(error)}"
             )
     
-    async def validate_grammar(self, grammar: str, parse_settings: ParseSettings) -> GrammarValidationResult:
-        """Validate grammar syntax without parsing text."""
-        logger.info(f"Validating grammar ({len(grammar)} chars) with settings: {parse_settings}")
-        start_time = time.time()
+    def _parse_text(
+        self,
+        parser: "lark.Lark",
+        text: str,
+        parse_settings: ParseSettings,
+        aborted: Callable[[], bool]
+    ) -> "lark.Tree":
+        """Parse text in a worker thread, stopping early once aborted.
         
-        try:
-            # Run in thread pool to avoid blocking
-            logger.debug("Creating Lark parser for validation...")
-            parser = await asyncio.get_event_loop().run_in_executor(
+        LALR input is fed token by token so the abort flag can be checked
+        mid-parse; other parser types are only checked before starting.
+        """
+        if aborted():
+            raise ParseCancelledError("Parse superseded while queued")
+        
+        if parse_settings.parser != ParserType.LALR:
+            return parser.parse(text)
+        
+        interactive = parser.parse_interactive(text)
+        last_token = None
+        for count, token in enumerate(interactive.lexer_state.lex(interactive.parser_state), 1):
+            if count % ABORT_CHECK_INTERVAL == 0 and aborted():
+                raise ParseCancelledError(f"Parse superseded after {count} tokens")
+            interactive.parser_state.feed_token(token)
+            last_token = token
+        return interactive.feed_eof(last_token)
+    
+    def _compiled(self, grammar_hash: str, future: asyncio.Future):
+        """Record a finished compilation: the parser, or why it failed."""
+        from lark.exceptions import GrammarError
+        self.compiling.pop(grammar_hash, None)
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is None:
+            self.active_parsers[grammar_hash] = future.result()
+        else:
+            status = ParseStatus.INVALID_GRAMMAR if isinstance(error, GrammarError) else ParseStatus.ERROR
+            self.compile_errors.put(grammar_hash, status, self._create_parse_error(error))
+    
+    async def _get_compiled_parser(self, grammar: str, grammar_hash: str, parse_settings: ParseSettings) -> "lark.Lark":
+        """Get the parser for a grammar, compiling it at most once at a time.
+        
+        Concurrent callers for the same grammar hash await one compilation;
+        a caller that times out or is cancelled leaves it running for the others.
+        """
+        parser = self.active_parsers.get(grammar_hash)
+        if parser is not None:
+            logger.debug("Reusing existing parser for grammar hash: %.8s...", grammar_hash)
+            return parser
+        
+        compilation = self.compiling.get(grammar_hash)
+        if compilation is None:
+            import lark
+            logger.debug("Creating new Lark parser for grammar hash: %.8s...", grammar_hash)
+            compilation = asyncio.get_running_loop().run_in_executor(
                 None,
                 lambda: lark.Lark(
                     grammar,
@@ -150,6 +294,56 @@ class AsyncLarkParser:
                     debug=parse_settings.debug
                 )
             )
+            self.compiling[grammar_hash] = compilation
+            compilation.add_done_callback(lambda future: self._compiled(grammar_hash, future))
+        else:
+            logger.debug("Joining compilation in progress for grammar hash: %.8s...", grammar_hash)
+        return await asyncio.shield(compilation)
+    
+    async def compile_grammar(self, grammar: str, parse_settings: ParseSettings) -> Tuple[str, "lark.Lark"]:
+        """Get a grammar's hash and compiled parser from the shared cache.
+        
+        Raises GrammarCompileError if the grammar does not compile, or is
+        known not to.
+        """
+        grammar_hash = self._grammar_hash(grammar, parse_settings)
+        compile_error = self.compile_errors.get(grammar_hash)
+        if compile_error is not None:
+            raise GrammarCompileError(compile_error[1])
+        try:
+            parser = await asyncio.wait_for(
+                self._get_compiled_parser(grammar, grammar_hash, parse_settings),
+                timeout=settings.max_parse_time
+            )
+        except Exception as e:
+            raise GrammarCompileError(self._create_parse_error(e))
+        return grammar_hash, parser
+    
+    def _remember_validation(self, grammar_hash: str, result: GrammarValidationResult):
+        """Memoize a validation result, dropping the oldest beyond the limit."""
+        self.validations.pop(grammar_hash, None)
+        self.validations[grammar_hash] = result
+        while len(self.validations) > settings.validation_cache_size:
+            del self.validations[next(iter(self.validations))]
+    
+    async def validate_grammar(self, grammar: str, parse_settings: ParseSettings) -> GrammarValidationResult:
+        """Validate grammar syntax without parsing text.
+        
+        Validation compiles through the shared parser cache, so a later
+        parse reuses the parser, and results are memoized per grammar hash.
+        """
+        logger.info(f"Validating grammar ({len(grammar)} chars) with settings: {parse_settings}")
+        start_time = time.time()
+        grammar_hash = self._grammar_hash(grammar, parse_settings)
+        
+        cached_result = self.validations.get(grammar_hash)
+        if cached_result is not None:
+            self.validation_hits += 1
+            logger.debug("Returning memoized validation for grammar hash: %.8s...", grammar_hash)
+            return cached_result
+        
+        try:
+            parser = await self._get_compiled_parser(grammar, grammar_hash, parse_settings)
             
             # Count rules and terminals
             rule_count = len([rule for rule in parser.rules])
@@ -158,7 +352,7 @@ class AsyncLarkParser:
             
             logger.info(f"Grammar validation successful in {validation_time:.3f}s: {rule_count} rules, {terminal_count} terminals")
             
-            return GrammarValidationResult(
+            result = GrammarValidationResult(
                 is_valid=True,
                 errors=[],
                 warnings=[],
@@ -169,95 +363,133 @@ class AsyncLarkParser:
         except Exception as e:
             validation_time = time.time() - start_time
             logger.error(f"Grammar validation failed in {validation_time:.3f}s: {str(e)}")
-            return GrammarValidationResult(
+            result = GrammarValidationResult(
                 is_valid=False,
                 errors=[self._create_parse_error(e)],
                 warnings=[],
                 rule_count=0,
                 terminal_count=0
             )
+        
+        self._remember_validation(grammar_hash, result)
+        return result
     
     async def parse_async(
         self, 
         grammar: str, 
         text: str, 
         parse_settings: ParseSettings,
-        use_cache: bool = True
+        use_cache: bool = True,
+        should_abort: Optional[Callable[[], bool]] = None,
+        max_text_length: Optional[int] = None
     ) -> ParseResult:
-        """Parse text with grammar asynchronously."""
-        logger.info(f"Starting parse operation: grammar({len(grammar)} chars), text({len(text)} chars), cache={use_cache}")
+        """Parse text with grammar asynchronously.
+        
+        ``should_abort`` is polled from the worker thread; once it returns
+        True the parse is abandoned and ParseCancelledError is raised.
+        ``max_text_length`` overrides the configured limit, for text read
+        from the upload store rather than sent inline.
+        """
+        logger.debug("Starting parse operation: grammar(%d chars), text(%d chars), cache=%s", len(grammar), len(text), use_cache)
         start_time = time.time()
         grammar_hash = self._grammar_hash(grammar, parse_settings)
+        self.usage.record(grammar_hash, grammar, parse_settings)
+        timed_out = False
+        
+        def aborted() -> bool:
+            return timed_out or (should_abort is not None and should_abort())
         
         # Check cache first
         if use_cache:
             cache_key = self.cache.get_cache_key(grammar, text, parse_settings)
             cached_result = self.cache.get(cache_key)
             if cached_result:
-                logger.info(f"Returning cached result for parse (cache hit)")
+                logger.debug("Returning cached result for parse (cache hit)")
                 return cached_result
         
         try:
             # Validate input lengths
             if len(grammar) > settings.max_grammar_size:
                 raise ValueError(f"Grammar too large: {len(grammar)} > {settings.max_grammar_size}")
-            if len(text) > settings.max_text_length:
-                raise ValueError(f"Text too large: {len(text)} > {settings.max_text_length}")
+            text_limit = max_text_length or settings.max_text_length
+            if len(text) > text_limit:
+                raise ValueError(f"Text too large: {len(text)} > {text_limit}")
+            
+            logger.debug("Input validation passed")
             
-            logger.debug(f"Input validation passed")
+            # Text edits against a grammar known not to compile fail fast
+            compile_error = self.compile_errors.get(grammar_hash)
+            if compile_error is not None:
+                logger.debug("Returning cached compile failure for grammar hash: %.8s...", grammar_hash)
+                return ParseResult(
+                    status=compile_error[0],
+                    tree=None,
+                    error=compile_error[1],
+                    parse_time=time.time() - start_time,
+                    grammar_hash=grammar_hash,
+                    timestamp=datetime.now()
+                )
             
             # Create or reuse parser
-            if grammar_hash not in self.active_parsers:
-                logger.debug(f"Creating new Lark parser for grammar hash: {grammar_hash[:8]}...")
-                parser_start = time.time()
-                parser = await asyncio.wait_for(
+            parser_start = time.time()
+            parser = await asyncio.wait_for(
+                self._get_compiled_parser(grammar, grammar_hash, parse_settings),
+                timeout=settings.max_parse_time / 2  # Allow time for parsing too
+            )
+            logger.debug("Got Lark parser in %.3fs", time.time() - parser_start)
+            
+            if aborted():
+                raise ParseCancelledError("Parse superseded before parsing started")
+            
+            record_errors = []
+            if parse_settings.record_separator:
+                # Records are parsed and converted in worker processes
+                from .record_split import RecordSplitAborted, parse_record_split
+                logger.debug("Starting record-split parsing on separator %s...", parse_settings.record_separator)
+                try:
+                    ast_tree, record_errors = await asyncio.wait_for(
+                        parse_record_split(parser, grammar, text, parse_settings, aborted),
+                        timeout=settings.max_parse_time
+                    )
+                except RecordSplitAborted as e:
+                    raise ParseCancelledError(str(e))
+                if aborted():
+                    raise ParseCancelledError("Parse superseded during record-split parsing")
+            else:
+                # Parse the text
+                logger.debug("Starting text parsing...")
+                parse_start = time.time()
+                lark_tree = await asyncio.wait_for(
                     asyncio.get_event_loop().run_in_executor(
                         None,
-                        lambda: lark.Lark(
-                            grammar,
-                            propagate_positions=True,
-                            start=parse_settings.start_rule,
-                            parser=parse_settings.parser.value,
-                            debug=parse_settings.debug
-                        )
+                        lambda: self._parse_text(parser, text, parse_settings, aborted)
                     ),
-                    timeout=settings.max_parse_time / 2  # Allow time for parsing too
+                    timeout=settings.max_parse_time
                 )
-                parser_time = time.time() - parser_start
-                logger.debug(f"Created Lark parser in {parser_time:.3f}s")
-                self.active_parsers[grammar_hash] = parser
-            else:
-                logger.debug(f"Reusing existing parser for grammar hash: {grammar_hash[:8]}...")
-                parser = self.active_parsers[grammar_hash]
-            
-            # Parse the text
-            logger.debug("Starting text parsing...")
-            parse_start = time.time()
-            lark_tree = await asyncio.wait_for(
-                asyncio.get_event_loop().run_in_executor(
-                    None,
-                    lambda: parser.parse(text)
-                ),
-                timeout=settings.max_parse_time
-            )
-            parse_time_internal = time.time() - parse_start
-            logger.debug(f"Text parsing completed in {parse_time_internal:.3f}s")
-            
-            # Convert to API format
-            logger.debug("Converting Lark tree to API format...")
-            convert_start = time.time()
-            ast_tree = self._lark_tree_to_ast_node(lark_tree)
-            convert_time = time.time() - convert_start
-            logger.debug(f"Tree conversion completed in {convert_time:.3f}s")
+                parse_time_internal = time.time() - parse_start
+                logger.debug("Text parsing completed in %.3fs", parse_time_internal)
+                
+                if aborted():
+                    raise ParseCancelledError("Parse superseded before tree conversion")
+                
+                # Convert to API format
+                logger.debug("Converting Lark tree to API format...")
+                convert_start = time.time()
+                ast_tree = self._lark_tree_to_ast_node(lark_tree)
+                convert_time = time.time() - convert_start
+                logger.debug("Tree conversion completed in %.3fs", convert_time)
             
             total_parse_time = time.time() - start_time
             
+            # Failed records leave a partial tree; the first failure is the headline error
             result = ParseResult(
-                status=ParseStatus.SUCCESS,
+                status=ParseStatus.ERROR if record_errors else ParseStatus.SUCCESS,
                 tree=ast_tree,
-                error=None,
+                error=record_errors[0] if record_errors else None,
+                record_errors=record_errors or None,
                 parse_time=total_parse_time,
                 grammar_hash=grammar_hash,
+                text_hash=hashlib.md5(text.encode()).hexdigest(),
                 timestamp=datetime.now()
             )
             
@@ -267,10 +499,16 @@ class AsyncLarkParser:
                 self.cache.put(cache_key, result)
             
             self.parse_count += 1
-            logger.info(f"Parse completed successfully in {total_parse_time:.3f}s (parse #{self.parse_count})")
+            logger.debug("Parse completed successfully in %.3fs (parse #%d)", total_parse_time, self.parse_count)
             return result
             
+        except ParseCancelledError:
+            logger.debug("Parse cancelled after %.3fs", time.time() - start_time)
+            raise
+            
         except asyncio.TimeoutError:
+            # Stop the worker thread at its next abort check
+            timed_out = True
             parse_time = time.time() - start_time
             logger.error(f"Parse operation timed out after {parse_time:.3f}s")
             return ParseResult(
@@ -283,6 +521,7 @@ class AsyncLarkParser:
             )
             
         except Exception as e:
+            from lark.exceptions import GrammarError
             parse_time = time.time() - start_time
             error_type = ParseStatus.INVALID_GRAMMAR if isinstance(e, GrammarError) else ParseStatus.ERROR
             logger.error(f"Parse operation failed after {parse_time:.3f}s: {type(e).__name__}: {str(e)}")
@@ -301,9 +540,13 @@ class AsyncLarkParser:
         stats = {
             "parse_count": self.parse_count,
             "cache_size": len(self.cache.cache),
-            "active_parsers": len(self.active_parsers)
+            "active_parsers": len(self.active_parsers),
+            "validation_cache_size": len(self.validations),
+            "validation_hits": self.validation_hits,
+            "compile_errors": len(self.compile_errors.errors),
+            "compile_error_hits": self.compile_errors.hits
         }
-        logger.debug(f"Parser stats: {stats}")
+        logger.debug("Parser stats: %s", stats)
         return stats
     
     def clear_cache(self):
@@ -311,6 +554,7 @@ class AsyncLarkParser:
         cache_size = len(self.cache.cache)
         self.cache.cache.clear()
         self.cache.access_order.clear()
+        self.compile_errors.clear()
         logger.info(f"Cleared parse cache ({cache_size} entries)")
     
     def cleanup_parsers(self):
@@ -0,0 +1,242 @@
+"""Cross-worker broadcast of WebSocket messages.
+
+A session's connections may be spread over several worker processes.
+Each worker delivers a broadcast to its own connections and publishes it
+to its peers, which deliver it to theirs.
+"""
+
+import asyncio
+import json
+import os
+import struct
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Set
+
+from .config import get_logger
+
+logger = get_logger("pubsub")
+
+# Receives (session_id, message JSON text, replace_key)
+BroadcastHandler = Callable[[str, str, Optional[str]], Awaitable[None]]
+
+# Frame header: metadata length, payload length
+_HEADER = struct.Struct("!II")
+
+# Seconds between rescans of the socket directory for new workers
+PEER_SCAN_INTERVAL = 1.0
+
+# Frames queued for one peer before it is dropped as unresponsive
+PEER_QUEUE_SIZE = 256
+
+# Seconds a connect or send to a peer may take before it is dropped
+PEER_SEND_TIMEOUT = 5.0
+
+
+async def _within(awaitable: Awaitable, timeout: float):
+    """Await with a timeout, raising asyncio.TimeoutError when it passes.
+
+    asyncio.wait_for can swallow a cancellation that arrives as the
+    awaitable completes, which would leave stop() waiting forever.
+    """
+    task = asyncio.ensure_future(awaitable)
+    try:
+        done, _ = await asyncio.wait({task}, timeout=timeout)
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
+    if not done:
+        task.cancel()
+        raise asyncio.TimeoutError()
+    return task.result()
+
+
+class _Peer:
+    """Connection to one peer worker, fed by a bounded queue.
+
+    Each peer has its own writer task, so a slow or stuck worker delays
+    only the frames addressed to it. The writer task is also the only
+    place the connection is opened.
+    """
+
+    def __init__(self, name: str, path: str):
+        self.name = name
+        self.path = path
+        self.queue: Deque[bytes] = deque()
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self.task: Optional[asyncio.Task] = None
+
+    def send(self, frame: bytes) -> bool:
+        """Queue a frame; returns False if the queue is full."""
+        if len(self.queue) >= PEER_QUEUE_SIZE:
+            return False
+        self.queue.append(frame)
+        return True
+
+    async def flush(self):
+        """Send queued frames in order, connecting first if needed."""
+        while self.queue:
+            if self.writer is None or self.writer.is_closing():
+                _, self.writer = await _within(asyncio.open_unix_connection(self.path), PEER_SEND_TIMEOUT)
+            self.writer.write(self.queue.popleft())
+            await _within(self.writer.drain(), PEER_SEND_TIMEOUT)
+
+    def close(self):
+        self.queue.clear()
+        if self.task is not None and not self.task.done() and self.task is not asyncio.current_task():
+            self.task.cancel()
+        if self.writer is not None:
+            self.writer.close()
+
+
+class Broadcaster:
+    """In-process broadcaster for a single worker, which has no peers."""
+
+    async def start(self, handler: BroadcastHandler):
+        """Start receiving broadcasts from peers."""
+
+    async def publish(self, session_id: str, text: str, replace_key: Optional[str] = None):
+        """Send a broadcast to every peer worker."""
+
+    async def stop(self):
+        """Stop receiving and disconnect from peers."""
+
+
+class UnixSocketBroadcaster(Broadcaster):
+    """Local pub/sub over Unix domain sockets.
+
+    Every worker listens on ``worker-<pid>.sock`` in a shared directory and
+    discovers its peers by listing it. Messages are sent as length-prefixed
+    frames over persistent connections, so payload size is unbounded.
+    """
+
+    def __init__(self, directory: str, name: Optional[str] = None):
+        self.directory = directory
+        self.name = name or f"worker-{os.getpid()}.sock"
+        self.path = os.path.join(directory, self.name)
+        self.handler: Optional[BroadcastHandler] = None
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.peers: Dict[str, _Peer] = {}
+        self.subscribers: Set[asyncio.StreamWriter] = set()
+        self.peer_names: List[str] = []
+        self.scanned_at = 0.0
+        self.published = 0
+        self.received = 0
+        self.dropped_peers = 0
+
+    async def start(self, handler: BroadcastHandler):
+        self.handler = handler
+        os.makedirs(self.directory, exist_ok=True)
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self.server = await asyncio.start_unix_server(self._serve, path=self.path)
+        logger.info(f"Listening for cross-worker broadcasts on {self.path}")
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Deliver frames sent by one peer."""
+        self.subscribers.add(writer)
+        try:
+            while True:
+                meta_length, payload_length = _HEADER.unpack(await reader.readexactly(_HEADER.size))
+                meta = json.loads(await reader.readexactly(meta_length))
+                payload = await reader.readexactly(payload_length)
+                self.received += 1
+                try:
+                    await self.handler(meta["session_id"], payload.decode("utf-8"), meta.get("replace_key"))
+                except Exception as e:
+                    logger.error(f"Failed to deliver cross-worker broadcast: {e}")
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.subscribers.discard(writer)
+            writer.close()
+
+    def _list_peers(self) -> List[str]:
+        try:
+            return [
+                name for name in os.listdir(self.directory)
+                if name.endswith(".sock") and name != self.name
+            ]
+        except FileNotFoundError:
+            return []
+
+    async def _scan_peers(self) -> List[str]:
+        """List peer sockets, rescanning the directory at most once per interval."""
+        now = time.monotonic()
+        if now - self.scanned_at >= PEER_SCAN_INTERVAL:
+            self.scanned_at = now
+            self.peer_names = await asyncio.to_thread(self._list_peers)
+        return self.peer_names
+
+    async def publish(self, session_id: str, text: str, replace_key: Optional[str] = None):
+        """Queue a broadcast for every peer; sending happens in per-peer tasks."""
+        peer_names = await self._scan_peers()
+        if not peer_names:
+            return
+
+        meta = json.dumps({"session_id": session_id, "replace_key": replace_key}).encode("utf-8")
+        payload = text.encode("utf-8")
+        frame = _HEADER.pack(len(meta), len(payload)) + meta + payload
+        self.published += 1
+
+        for name in list(peer_names):
+            peer = self.peers.get(name)
+            if peer is None:
+                peer = self.peers[name] = _Peer(name, os.path.join(self.directory, name))
+            if not peer.send(frame):
+                logger.warning(f"Dropping unresponsive worker {name} ({len(peer.queue)} frames queued)")
+                self.dropped_peers += 1
+                self._forget_peer(name)
+                continue
+            if peer.task is None or peer.task.done():
+                peer.task = asyncio.create_task(self._flush_peer(peer))
+
+    async def _flush_peer(self, peer: _Peer):
+        """Writer task for one peer."""
+        try:
+            await peer.flush()
+        except (ConnectionRefusedError, FileNotFoundError):
+            # The worker exited without removing its socket
+            logger.info(f"Removing stale worker socket {peer.name}")
+            self._forget_peer(peer.name, unlink=True)
+        except asyncio.TimeoutError:
+            logger.warning(f"Cross-worker broadcast to {peer.name} stalled for {PEER_SEND_TIMEOUT}s")
+            self.dropped_peers += 1
+            self._forget_peer(peer.name)
+        except (OSError, ConnectionError) as e:
+            logger.warning(f"Cross-worker broadcast to {peer.name} failed: {e}")
+            self._forget_peer(peer.name)
+
+    def _forget_peer(self, name: str, unlink: bool = False):
+        peer = self.peers.pop(name, None)
+        if peer is not None:
+            peer.close()
+        if name in self.peer_names:
+            self.peer_names.remove(name)
+        if unlink:
+            try:
+                os.unlink(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+
+    async def stop(self):
+        tasks = [peer.task for peer in self.peers.values() if peer.task is not None]
+        for name in list(self.peers):
+            self._forget_peer(name)
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for writer in list(self.subscribers):
+            writer.close()
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        logger.info("Stopped cross-worker broadcaster")
+
+
+def create_broadcaster(backend: str, directory: str) -> Broadcaster:
+    """Create the broadcaster matching the session backend."""
+    if backend == "sqlite":
+        return UnixSocketBroadcaster(directory)
+    return Broadcaster()
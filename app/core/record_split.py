@@ -0,0 +1,224 @@
+"""Record-split parsing of inputs made of independent top-level records.
+
+The input is cut at every match of a separator terminal, and the records
+are parsed with a record rule in a pool of worker processes. The records'
+trees are then assembled under the start rule, with positions corrected
+to offsets in the original input. A record that fails to parse is
+reported on its own and does not stop the others.
+"""
+
+import asyncio
+import multiprocessing
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+import lark
+from lark.exceptions import LarkError
+
+from ..models.requests import ParseSettings
+from ..models.responses import ASTNode, ErrorType, ParseError as APIParseError
+from .config import get_logger, get_settings
+
+logger = get_logger("record_split")
+
+# (offset, line, column, text) of a record in the original input
+Record = Tuple[int, int, int, str]
+
+# Batches submitted per worker, so uneven records still balance out
+BATCHES_PER_WORKER = 4
+
+# Seconds between abort checks while batches are in flight
+ABORT_POLL_INTERVAL = 0.05
+
+
+class RecordSplitAborted(Exception):
+    """Raised when a record-split parse is abandoned before its batches finish."""
+
+# Record parsers compiled in this worker process, by (grammar, rule, parser type)
+_worker_parsers: Dict[Tuple[str, str, str], lark.Lark] = {}
+
+
+def split_records(text: str, separator: str) -> List[Record]:
+    """Cut text at each match of the separator regex, skipping blank records."""
+    records: List[Record] = []
+    line = 1
+    column = 1
+    start = 0
+
+    def advance(begin: int, end: int):
+        nonlocal line, column
+        newlines = text.count("\n", begin, end)
+        if newlines:
+            line += newlines
+            column = end - text.rfind("\n", begin, end)
+        else:
+            column += end - begin
+
+    for match in re.finditer(separator, text):
+        if match.end() == match.start():
+            continue
+        if text[start:match.start()].strip():
+            records.append((start, line, column, text[start:match.start()]))
+        advance(start, match.end())
+        start = match.end()
+    if text[start:].strip():
+        records.append((start, line, column, text[start:]))
+    return records
+
+
+def _to_ast(node: Union[lark.Tree, lark.Token], record: Record) -> Union[ASTNode, str]:
+    """Convert a record's tree, shifting token positions into the full input."""
+    offset, line, column = record[0], record[1], record[2]
+    if isinstance(node, lark.Tree):
+        return ASTNode(type="tree", data=node.data, children=[_to_ast(child, record) for child in node.children])
+    token_line = getattr(node, 'line', None)
+    token_column = getattr(node, 'column', None)
+    start_pos = getattr(node, 'start_pos', None)
+    end_pos = getattr(node, 'end_pos', None)
+    return ASTNode(
+        type="token",
+        data=str(node),
+        children=[],
+        start_pos=start_pos + offset if start_pos is not None else None,
+        end_pos=end_pos + offset if end_pos is not None else None,
+        line=token_line + line - 1 if token_line is not None else None,
+        # Only the record's first line starts mid-line in the input
+        column=token_column + column - 1 if token_column is not None and token_line == 1 else token_column
+    )
+
+
+def _record_error(error: Exception, record: Record) -> APIParseError:
+    """Describe a record's parse failure with positions in the full input."""
+    if not isinstance(error, LarkError):
+        return APIParseError(type=ErrorType.INTERNAL_ERROR, message=f"Internal error: {str(error)}")
+
+    error_line = getattr(error, 'line', None)
+    error_column = getattr(error, 'column', None)
+    if not isinstance(error_line, int) or error_line < 1:
+        error_line = error_column = None
+    context = None
+    if hasattr(error, 'get_context'):
+        try:
+            context = error.get_context(record[3])
+        except Exception:
+            context = None
+    return APIParseError(
+        type=ErrorType.PARSE_ERROR,
+        message=str(error),
+        line=error_line + record[1] - 1 if error_line else None,
+        column=error_column + record[2] - 1 if error_column and error_line == 1 else error_column,
+        context=context
+    )
+
+
+def parse_records(
+    grammar: str, record_rule: str, parser_type: str, records: List[Record]
+) -> List[Union[ASTNode, APIParseError]]:
+    """Parse a batch of records; runs in a worker process."""
+    key = (grammar, record_rule, parser_type)
+    parser = _worker_parsers.get(key)
+    if parser is None:
+        parser = lark.Lark(grammar, propagate_positions=True, start=record_rule, parser=parser_type)
+        # Keep one grammar per worker; a new one means the user edited it
+        _worker_parsers.clear()
+        _worker_parsers[key] = parser
+
+    results: List[Union[ASTNode, APIParseError]] = []
+    for record in records:
+        try:
+            results.append(_to_ast(parser.parse(record[3]), record))
+        except Exception as e:
+            results.append(_record_error(e, record))
+    return results
+
+
+def separator_pattern(parser: lark.Lark, name: str) -> str:
+    """Get the regex of a separator terminal from a compiled grammar."""
+    try:
+        terminal = parser.get_terminal(name)
+    except KeyError:
+        raise ValueError(f"Unknown separator terminal: {name}")
+    return terminal.pattern.to_regexp()
+
+
+async def parse_record_split(
+    parser: lark.Lark,
+    grammar: str,
+    text: str,
+    parse_settings: ParseSettings,
+    aborted: Optional[Callable[[], bool]] = None
+) -> Tuple[ASTNode, List[APIParseError]]:
+    """Parse text as separated records across the worker pool.
+
+    Returns the assembled tree, holding every record that parsed, and the
+    errors of those that did not. ``aborted`` is polled while batches are
+    in flight; once it returns True, or the caller is cancelled, batches
+    that have not started are cancelled and RecordSplitAborted is raised.
+    """
+    if not parse_settings.record_rule:
+        raise ValueError("record_rule is required when record_separator is set")
+    separator = separator_pattern(parser, parse_settings.record_separator)
+    loop = asyncio.get_running_loop()
+    records = await loop.run_in_executor(None, split_records, text, separator)
+
+    pool = get_record_pool()
+    batch_size = max(1, -(-len(records) // (_record_workers * BATCHES_PER_WORKER)))
+    batches = [records[i:i + batch_size] for i in range(0, len(records), batch_size)]
+    logger.debug(f"Parsing {len(records)} records in {len(batches)} batches")
+
+    futures = [
+        loop.run_in_executor(
+            pool, parse_records, grammar, parse_settings.record_rule, parse_settings.parser.value, batch
+        )
+        for batch in batches
+    ]
+    pending = set(futures)
+    try:
+        while pending:
+            _, pending = await asyncio.wait(
+                pending, timeout=ABORT_POLL_INTERVAL, return_when=asyncio.FIRST_COMPLETED
+            )
+            if pending and aborted is not None and aborted():
+                raise RecordSplitAborted(f"Abandoned with {len(pending)} of {len(futures)} batches pending")
+    finally:
+        # Covers aborts, failed batches and cancellation by wait_for timeouts
+        for future in pending:
+            future.cancel()
+
+    children: List[Union[ASTNode, str]] = []
+    errors: List[APIParseError] = []
+    for future in futures:
+        for result in future.result():
+            if isinstance(result, APIParseError):
+                errors.append(result)
+            else:
+                children.append(result)
+    return ASTNode(type="tree", data=parse_settings.start_rule, children=children), errors
+
+
+# Global worker pool
+_record_pool: Optional[ProcessPoolExecutor] = None
+_record_workers = 1
+
+
+def get_record_pool() -> ProcessPoolExecutor:
+    """Get the process pool for record-split parsing, starting it on first use."""
+    global _record_pool, _record_workers
+    if _record_pool is None:
+        _record_workers = get_settings().record_split_workers or os.cpu_count() or 1
+        # Forking a process that runs an event loop and threads is unsafe
+        _record_pool = ProcessPoolExecutor(
+            max_workers=_record_workers, mp_context=multiprocessing.get_context("spawn")
+        )
+        logger.info(f"Started record-split worker pool with {_record_workers} processes")
+    return _record_pool
+
+
+def shutdown_record_pool():
+    """Stop the worker pool if it was started."""
+    global _record_pool
+    if _record_pool is not None:
+        _record_pool.shutdown(cancel_futures=True)
+        _record_pool = None
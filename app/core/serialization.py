@@ -0,0 +1,199 @@
+"""Fast JSON serialization for parse results and outgoing messages."""
+
+import asyncio
+import sys
+import zlib
+from json.encoder import encode_basestring
+from typing import Any, Iterator, List, Optional
+
+import pydantic_core
+from fastapi import Response
+
+from ..models.responses import ASTNode, ParseResult
+
+
+# pydantic's serializer rejects models nested much deeper than this, and
+# with union-typed children can take minutes to do so
+PYDANTIC_MAX_DEPTH = 100
+
+
+class _Fragment(str):
+    """Pre-encoded JSON text queued on the AST writer's stack."""
+
+
+def _optional_int(value) -> str:
+    return "null" if value is None else str(int(value))
+
+
+def _encode_ast(root: ASTNode, out: List[str], flush_at: int) -> Iterator[None]:
+    """Append the JSON encoding of an AST to ``out`` without recursion.
+
+    Walking the tree directly avoids both the intermediate dicts of
+    ``model_dump()`` and pydantic's per-node union dispatch for
+    ``children``, which dominate serialization time on large trees.
+    Yields whenever ``out`` holds ``flush_at`` fragments so the caller
+    can drain it.
+    """
+    stack: List[Any] = [root]
+    while stack:
+        if len(out) >= flush_at:
+            yield
+        node = stack.pop()
+        if isinstance(node, _Fragment):
+            out.append(node)
+        elif isinstance(node, ASTNode):
+            out.append('{"type":')
+            out.append(encode_basestring(node.type))
+            out.append(',"data":')
+            out.append(encode_basestring(node.data))
+            tail = (
+                f',"start_pos":{_optional_int(node.start_pos)},"end_pos":{_optional_int(node.end_pos)}'
+                f',"line":{_optional_int(node.line)},"column":{_optional_int(node.column)}}}'
+            )
+            children = node.children
+            if not children:
+                out.append(',"children":[]')
+                out.append(tail)
+                continue
+            out.append(',"children":[')
+            stack.append(_Fragment("]" + tail))
+            for index in range(len(children) - 1, -1, -1):
+                stack.append(children[index])
+                if index:
+                    stack.append(_Fragment(","))
+        else:
+            out.append(encode_basestring(str(node)))
+
+
+def _write_ast(root: ASTNode, out: List[str]):
+    """Append the JSON encoding of an AST to ``out``."""
+    for _ in _encode_ast(root, out, sys.maxsize):
+        pass
+
+
+def iter_ast_json(root: ASTNode, flush_at: int = 8192) -> Iterator[str]:
+    """Yield the JSON encoding of an AST in pieces of ``flush_at`` fragments."""
+    out: List[str] = []
+    for _ in _encode_ast(root, out, flush_at):
+        yield "".join(out)
+        out.clear()
+    yield "".join(out)
+
+
+def _write(value: Any, out: List[str]):
+    if isinstance(value, ParseResult):
+        # Everything but the tree is small; let pydantic encode it and splice the tree in
+        head = value.model_dump_json(exclude={"tree"})
+        out.append(head[:-1])
+        out.append(',"tree":')
+        if value.tree is None:
+            out.append("null")
+        else:
+            _write_ast(value.tree, out)
+        out.append("}")
+    elif isinstance(value, ASTNode):
+        _write_ast(value, out)
+    elif isinstance(value, dict):
+        out.append("{")
+        for index, (key, item) in enumerate(value.items()):
+            if index:
+                out.append(",")
+            out.append(encode_basestring(str(key)))
+            out.append(":")
+            _write(item, out)
+        out.append("}")
+    else:
+        out.append(pydantic_core.to_json(value).decode("utf-8"))
+
+
+def _tree_too_deep(root: ASTNode) -> bool:
+    """Check whether a tree nests deeper than pydantic can serialize."""
+    stack = [(root, 1)]
+    while stack:
+        node, depth = stack.pop()
+        if depth > PYDANTIC_MAX_DEPTH:
+            return True
+        for child in node.children:
+            if isinstance(child, ASTNode) and child.children:
+                stack.append((child, depth + 1))
+    return False
+
+
+def _has_deep_tree(value: Any) -> bool:
+    if isinstance(value, ParseResult):
+        return value.tree is not None and _tree_too_deep(value.tree)
+    if isinstance(value, ASTNode):
+        return _tree_too_deep(value)
+    if isinstance(value, dict):
+        return any(_has_deep_tree(item) for item in value.values())
+    return False
+
+
+def dump_json(value: Any) -> bytes:
+    """Serialize a value to UTF-8 JSON bytes.
+
+    Pydantic models may appear anywhere inside ``value`` and are encoded
+    by pydantic directly, without intermediate dicts or re-validation.
+    Trees too deep for pydantic are written by the iterative AST writer.
+    """
+    if _has_deep_tree(value):
+        out: List[str] = []
+        _write(value, out)
+        return "".join(out).encode("utf-8")
+    return pydantic_core.to_json(value)
+
+
+def dump_json_text(value: Any) -> str:
+    """Serialize a value to JSON text."""
+    return dump_json(value).decode("utf-8")
+
+
+class EncodedMessage:
+    """A message serialized once and shared by every connection it is sent to."""
+    
+    __slots__ = ("text", "payload", "_deflated", "_deflating")
+    
+    def __init__(self, message: Any):
+        self.payload = dump_json(message)
+        self.text = self.payload.decode("utf-8")
+        self._deflated: Optional[bytes] = None
+        self._deflating: Optional[asyncio.Future] = None
+    
+    @classmethod
+    def from_text(cls, text: str) -> "EncodedMessage":
+        """Wrap JSON text that was serialized elsewhere, e.g. by another worker."""
+        encoded = cls.__new__(cls)
+        encoded.text = text
+        encoded.payload = text.encode("utf-8")
+        encoded._deflated = None
+        encoded._deflating = None
+        return encoded
+    
+    @property
+    def is_deflated(self) -> bool:
+        """Whether the payload is compressed or being compressed."""
+        return self._deflated is not None or self._deflating is not None
+    
+    def deflate(self, level: int) -> bytes:
+        """Return the zlib-compressed payload, compressing at most once."""
+        if self._deflated is None:
+            self._deflated = zlib.compress(self.payload, level)
+        return self._deflated
+    
+    async def deflate_in_thread(self, level: int) -> bytes:
+        """Like deflate, but compress in a worker thread, once for all concurrent callers."""
+        if self._deflated is None:
+            if self._deflating is None:
+                self._deflating = asyncio.ensure_future(asyncio.to_thread(zlib.compress, self.payload, level))
+            # One caller timing out must not cancel the others' compression
+            self._deflated = await asyncio.shield(self._deflating)
+        return self._deflated
+
+
+def json_response(value: Any, status_code: int = 200) -> Response:
+    """Build a JSON response from pre-serialized bytes.
+
+    Returning a Response makes FastAPI skip ``response_model`` validation,
+    which the route keeps only for documentation.
+    """
+    return Response(content=dump_json(value), status_code=status_code, media_type="application/json")
@@ -0,0 +1,238 @@
+"""Pluggable storage backends for editor session state.
+
+The default backend keeps sessions in the worker's own memory, which is
+all a single-worker deployment needs. The SQLite backend stores sessions
+in a local database file shared by every worker on the host, so a
+session edited through one worker can be exported or parsed by another.
+"""
+
+import os
+import sqlite3
+import threading
+from dataclasses import dataclass
+from typing import Iterable, List, Optional, Tuple
+
+from .config import get_logger
+
+logger = get_logger("session_store")
+
+
+class RevisionConflictError(Exception):
+    """Raised when a session was saved elsewhere since the revision being written."""
+
+
+@dataclass
+class SessionRecord:
+    """Serializable snapshot of an editor session."""
+    session_id: str
+    created_at: float
+    last_activity: float
+    grammar: str = ""
+    grammar_version: int = 0
+    text: str = ""
+    text_version: int = 0
+    parse_settings: str = "{}"  # ParseSettings as JSON
+    tree_expand_state: str = "[]"  # JSON list
+    last_parse_result: Optional[bytes] = None  # ParseResult as JSON
+    revision: int = 0
+
+
+class SessionStore:
+    """In-process session storage (single worker).
+
+    Sessions already live in ``SessionManager.sessions``, so this backend
+    stores nothing; it defines the interface for shared backends.
+    """
+
+    # Whether other workers can see what this store holds
+    shared = False
+
+    def load(self, session_id: str) -> Optional[SessionRecord]:
+        """Load a session, or None if it is not stored."""
+        return None
+
+    def get_revision(self, session_id: str) -> Optional[int]:
+        """Get the stored revision of a session without loading it."""
+        return None
+
+    def save(self, record: SessionRecord) -> int:
+        """Store a session and return its new revision.
+        
+        Raises RevisionConflictError if the stored revision is no longer
+        ``record.revision``, i.e. another worker saved the session since
+        it was loaded; revision 0 stores a session that must not exist yet.
+        """
+        return record.revision
+
+    def delete(self, session_id: str):
+        """Remove a stored session."""
+
+    def delete_expired(self, cutoff: float) -> List[str]:
+        """Remove sessions inactive since before cutoff and return their ids."""
+        return []
+
+    def write_batch(self, records: Iterable[SessionRecord], deleted: Iterable[str]):
+        """Save and delete several sessions at once."""
+
+    def list_activity(self) -> List[Tuple[str, float]]:
+        """List (session_id, last_activity) for every stored session."""
+        return []
+
+    def close(self):
+        """Release backend resources."""
+
+
+class SQLiteSessionStore(SessionStore):
+    """Session storage in a SQLite database shared by local workers.
+
+    Every save bumps the session's revision, letting a worker detect that
+    its in-memory copy is stale with a single indexed lookup. Saves only
+    apply on top of the revision they were loaded at, so two workers
+    cannot silently overwrite each other's edits.
+    """
+
+    shared = True
+
+    _COLUMNS = (
+        "session_id", "created_at", "last_activity", "grammar", "grammar_version",
+        "text", "text_version", "parse_settings", "tree_expand_state", "last_parse_result"
+    )
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        # One connection per store, serialized by a lock; calls run in worker threads
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("PRAGMA busy_timeout=5000")
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY,
+                revision INTEGER NOT NULL DEFAULT 1,
+                created_at REAL NOT NULL,
+                last_activity REAL NOT NULL,
+                grammar TEXT NOT NULL,
+                grammar_version INTEGER NOT NULL,
+                text TEXT NOT NULL,
+                text_version INTEGER NOT NULL,
+                parse_settings TEXT NOT NULL,
+                tree_expand_state TEXT NOT NULL,
+                last_parse_result BLOB
+            )
+            """
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS sessions_activity ON sessions (last_activity, session_id)")
+        logger.info(f"Opened SQLite session store at {path}")
+
+    def load(self, session_id: str) -> Optional[SessionRecord]:
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT {', '.join(self._COLUMNS)}, revision FROM sessions WHERE session_id = ?",
+                (session_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return SessionRecord(*row)
+
+    def get_revision(self, session_id: str) -> Optional[int]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT revision FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def _upsert_sql(self) -> str:
+        updates = ", ".join(f"{column} = excluded.{column}" for column in self._COLUMNS[1:])
+        return f"""
+            INSERT INTO sessions ({', '.join(self._COLUMNS)})
+            VALUES ({', '.join('?' * len(self._COLUMNS))})
+            ON CONFLICT (session_id) DO UPDATE SET {updates}, revision = sessions.revision + 1
+            RETURNING revision
+        """
+
+    def _insert_sql(self) -> str:
+        return f"""
+            INSERT INTO sessions ({', '.join(self._COLUMNS)})
+            VALUES ({', '.join('?' * len(self._COLUMNS))})
+            ON CONFLICT (session_id) DO NOTHING
+            RETURNING revision
+        """
+
+    def _update_sql(self) -> str:
+        updates = ", ".join(f"{column} = ?" for column in self._COLUMNS[1:])
+        return f"""
+            UPDATE sessions SET {updates}, revision = revision + 1
+            WHERE session_id = ? AND revision = ?
+            RETURNING revision
+        """
+
+    def _values(self, record: SessionRecord) -> tuple:
+        return tuple(getattr(record, column) for column in self._COLUMNS)
+
+    def save(self, record: SessionRecord) -> int:
+        values = self._values(record)
+        with self._lock:
+            if record.revision:
+                row = self._db.execute(
+                    self._update_sql(), values[1:] + (record.session_id, record.revision)
+                ).fetchone()
+            else:
+                row = self._db.execute(self._insert_sql(), values).fetchone()
+        if row is None:
+            raise RevisionConflictError(
+                f"Session {record.session_id} is no longer at revision {record.revision}"
+            )
+        return row[0]
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._db.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def delete_expired(self, cutoff: float) -> List[str]:
+        with self._lock:
+            rows = self._db.execute(
+                "DELETE FROM sessions WHERE last_activity < ? RETURNING session_id", (cutoff,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def write_batch(self, records: Iterable[SessionRecord], deleted: Iterable[str]):
+        # Snapshots have a single writer, so records are stored unconditionally
+        # A single transaction costs one fsync regardless of the batch size
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                for record in records:
+                    self._db.execute(self._upsert_sql(), self._values(record)).fetchall()
+                self._db.executemany(
+                    "DELETE FROM sessions WHERE session_id = ?",
+                    ((session_id,) for session_id in deleted)
+                )
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+
+    def list_activity(self) -> List[Tuple[str, float]]:
+        # Served from the activity index; session contents are not read
+        with self._lock:
+            return self._db.execute(
+                "SELECT session_id, last_activity FROM sessions INDEXED BY sessions_activity"
+            ).fetchall()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def create_session_store(backend: str, path: str) -> SessionStore:
+    """Create the configured session store backend."""
+    if backend == "sqlite":
+        return SQLiteSessionStore(path)
+    if backend != "memory":
+        raise ValueError(f"Unknown session backend: {backend}")
+    return SessionStore()
@@ -0,0 +1,130 @@
+"""On-disk spill area for parse results of idle sessions."""
+
+import hashlib
+import os
+import time
+import zlib
+from typing import Any, Dict, Optional
+
+from ..models.responses import ParseResult
+from .config import get_logger
+from .serialization import dump_json
+
+logger = get_logger("spill")
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class ResultSpill:
+    """Compressed parse results stored one file per session.
+
+    Methods block on file I/O; callers on the event loop run them in a
+    worker thread. Workers may share the directory, so file names carry
+    the ``owner`` (by default the process id) and one worker never reads,
+    overwrites or deletes another's files.
+    """
+
+    def __init__(self, directory: str, level: int = 6, owner: Optional[str] = None):
+        self.directory = directory
+        self.level = level
+        self.owner = owner or str(os.getpid())
+        self.spill_count = 0
+        self.reload_count = 0
+        self.failures = 0
+        self.bytes_written = 0
+        self.raw_bytes = 0
+        self.spill_time = 0.0
+        self.reload_time = 0.0
+
+    def _path(self, session_id: str) -> str:
+        # Session ids come from clients; never use them as file names directly
+        digest = hashlib.sha256(session_id.encode("utf-8")).hexdigest()[:32]
+        return os.path.join(self.directory, f"{digest}-{self.owner}.json.z")
+
+    def spill(self, session_id: str, result: ParseResult) -> bool:
+        """Write a result to disk; returns False if it could not be written."""
+        start_time = time.perf_counter()
+        path = self._path(session_id)
+        try:
+            raw = dump_json(result)
+            compressed = zlib.compress(raw, self.level)
+            os.makedirs(self.directory, exist_ok=True)
+            # Write then rename so a crash never leaves a truncated file
+            temp_path = f"{path}.tmp"
+            with open(temp_path, "wb") as spill_file:
+                spill_file.write(compressed)
+            os.replace(temp_path, path)
+        except OSError as e:
+            self.failures += 1
+            logger.error(f"Failed to spill parse result for session {session_id[:8]}...: {e}")
+            return False
+
+        self.spill_count += 1
+        self.raw_bytes += len(raw)
+        self.bytes_written += len(compressed)
+        self.spill_time += time.perf_counter() - start_time
+        logger.debug(f"Spilled parse result for session {session_id[:8]}... ({len(raw)} -> {len(compressed)} bytes)")
+        return True
+
+    def load(self, session_id: str) -> Optional[ParseResult]:
+        """Read a spilled result back, or None if it is missing or unreadable."""
+        start_time = time.perf_counter()
+        try:
+            with open(self._path(session_id), "rb") as spill_file:
+                result = ParseResult.model_validate_json(zlib.decompress(spill_file.read()))
+        except (OSError, zlib.error, ValueError) as e:
+            self.failures += 1
+            logger.error(f"Failed to reload parse result for session {session_id[:8]}...: {e}")
+            return None
+
+        self.reload_count += 1
+        self.reload_time += time.perf_counter() - start_time
+        logger.debug(f"Reloaded parse result for session {session_id[:8]}...")
+        return result
+
+    def discard(self, session_id: str):
+        """Delete a session's spilled result if there is one."""
+        try:
+            os.unlink(self._path(session_id))
+        except FileNotFoundError:
+            pass
+
+    def remove_stale(self) -> int:
+        """Delete files left by worker processes that are no longer running."""
+        removed = 0
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return 0
+        for name in names:
+            owner = name.split(".", 1)[0].rpartition("-")[2]
+            if owner == self.owner or (owner.isdigit() and _process_alive(int(owner))):
+                continue
+            try:
+                os.unlink(os.path.join(self.directory, name))
+                removed += 1
+            except FileNotFoundError:
+                pass
+        if removed:
+            logger.info(f"Removed {removed} spill files of exited workers")
+        return removed
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get spill and reload counts and latencies."""
+        return {
+            "spilled": self.spill_count,
+            "reloaded": self.reload_count,
+            "failures": self.failures,
+            "bytes_written": self.bytes_written,
+            "compression_ratio": self.bytes_written / self.raw_bytes if self.raw_bytes else None,
+            "avg_spill_ms": self.spill_time / self.spill_count * 1000 if self.spill_count else None,
+            "avg_reload_ms": self.reload_time / self.reload_count * 1000 if self.reload_count else None,
+        }
@@ -0,0 +1,81 @@
+"""Standalone LALR parser modules generated from compiled grammars.
+
+``lark.tools.standalone`` writes a self-contained Python module holding
+lark's runtime and the serialized parse tables, which downstream
+services can import without lark and without compiling the grammar.
+Generated modules are cached by grammar hash.
+"""
+
+import io
+from collections import OrderedDict
+from typing import Any, Dict, Optional, TYPE_CHECKING
+
+from .config import get_logger, get_settings
+from .export import CachedExport
+
+logger = get_logger("standalone")
+
+if TYPE_CHECKING:
+    import lark
+
+
+def generate_standalone(parser: "lark.Lark") -> bytes:
+    """Render the standalone module of a compiled LALR parser."""
+    from lark.tools.standalone import gen_standalone
+    out = io.StringIO()
+    gen_standalone(parser, out=out)
+    return out.getvalue().encode("utf-8")
+
+
+class StandaloneCache:
+    """LRU cache of generated modules by grammar hash."""
+
+    def __init__(self, max_entries: int):
+        self.entries: "OrderedDict[str, CachedExport]" = OrderedDict()
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.generated = 0
+
+    def get(self, grammar_hash: str) -> Optional[CachedExport]:
+        """Get a generated module and mark it recently used."""
+        entry = self.entries.get(grammar_hash)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(grammar_hash)
+        self.hits += 1
+        return entry
+
+    def put(self, grammar_hash: str, module: bytes) -> CachedExport:
+        """Store a generated module, evicting the least recently used ones."""
+        entry = CachedExport(module)
+        self.entries[grammar_hash] = entry
+        self.entries.move_to_end(grammar_hash)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        self.generated += 1
+        logger.debug(f"Cached standalone parser for grammar hash {grammar_hash[:8]}... ({len(module)} bytes)")
+        return entry
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache occupancy and hit counts."""
+        return {
+            "entries": len(self.entries),
+            "bytes": sum(len(entry.body) for entry in self.entries.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+            "generated": self.generated,
+        }
+
+
+# Global standalone module cache
+_standalone_cache: Optional[StandaloneCache] = None
+
+
+def get_standalone_cache() -> StandaloneCache:
+    """Get global standalone module cache."""
+    global _standalone_cache
+    if _standalone_cache is None:
+        _standalone_cache = StandaloneCache(get_settings().standalone_cache_size)
+    return _standalone_cache
@@ -1,139 +1,759 @@
 """Session and state management for web-based editor."""
 
 import asyncio
+import json
+import time
 from datetime import datetime, timedelta
-from typing import Dict, Set, Optional, List
-from dataclasses import dataclass, field
-
-from fastapi import WebSocket
+from typing import Any, Callable, Dict, Set, Optional, List, Tuple, TYPE_CHECKING
 
 from ..models.requests import ParseSettings
 from ..models.responses import ParseResult
 from .config import get_settings, get_logger
+from .document import DocumentBuffer
+from .expiry import ExpiryIndex
+from .memory import estimate_result_bytes
+from .parser import get_parser
+from .pubsub import Broadcaster, create_broadcaster
+from .serialization import EncodedMessage, dump_json
+from .spill import ResultSpill
+from .session_store import RevisionConflictError, SessionRecord, SessionStore, create_session_store
+
+if TYPE_CHECKING:
+    from ..websockets.connection import ClientConnection
 
 settings = get_settings()
 logger = get_logger("state")
 
+# Seconds between sweeps of expired sessions from a shared store
+STORE_SWEEP_INTERVAL = 300
+
 
-@dataclass
 class EditorSession:
-    """Editor session state."""
-    session_id: str
-    created_at: datetime = field(default_factory=datetime.now)
-    last_activity: datetime = field(default_factory=datetime.now)
-    grammar_content: str = ""
-    text_content: str = ""
-    parse_settings: ParseSettings = field(default_factory=ParseSettings)
-    last_parse_result: Optional[ParseResult] = None
-    tree_expand_state: List[List[int]] = field(default_factory=list)
-    websocket_connections: Set[WebSocket] = field(default_factory=set)
-    
-    def __post_init__(self):
-        logger.debug(f"Created session {self.session_id[:8]}...")
+    """Editor session state.
+    
+    Slotted to keep the per-session footprint small; most of a session's
+    memory is its documents and last parse result, which ``nbytes``
+    estimates.
+    """
+    
+    __slots__ = (
+        "session_id", "created_at", "last_activity", "grammar_buffer", "text_buffer",
+        "parse_settings", "_last_parse_result", "result_spilled", "tree_expand_state",
+        "websocket_connections", "revision", "accounted_bytes", "_stored_result", "_result_size"
+    )
+    
+    def __init__(
+        self,
+        session_id: str,
+        created_at: Optional[datetime] = None,
+        last_activity: Optional[datetime] = None,
+        grammar_buffer: Optional[DocumentBuffer] = None,
+        text_buffer: Optional[DocumentBuffer] = None,
+        parse_settings: Optional[ParseSettings] = None,
+        last_parse_result: Optional[ParseResult] = None,
+        tree_expand_state: Optional[List[List[int]]] = None
+    ):
+        now = datetime.now()
+        self.session_id = session_id
+        self.created_at = created_at or now
+        self.last_activity = last_activity or now
+        self.grammar_buffer = grammar_buffer or DocumentBuffer()
+        self.text_buffer = text_buffer or DocumentBuffer()
+        self.parse_settings = parse_settings or ParseSettings()
+        self._last_parse_result = last_parse_result
+        # Whether the last parse result was moved to the spill directory
+        self.result_spilled = False
+        self.tree_expand_state: List[List[int]] = tree_expand_state or []
+        self.websocket_connections: Set["ClientConnection"] = set()
+        # Revision of this session in a shared store
+        self.revision = 0
+        # Bytes counted against the session memory budget at the last measurement
+        self.accounted_bytes = 0
+        # Last parse result and its stored JSON, so unchanged results are not re-serialized
+        self._stored_result: Optional[Tuple[ParseResult, bytes]] = None
+        # Last parse result and its estimated size, so unchanged results are not re-walked
+        self._result_size: Optional[Tuple[ParseResult, int]] = None
+        logger.debug("Created session %.8s...", self.session_id)
+    
+    @property
+    def last_parse_result(self) -> Optional[ParseResult]:
+        """Last parse result held in memory; see ``SessionManager.load_parse_result``."""
+        return self._last_parse_result
+    
+    @last_parse_result.setter
+    def last_parse_result(self, result: Optional[ParseResult]):
+        # A new result supersedes any spilled one
+        self._last_parse_result = result
+        self.result_spilled = False
+    
+    @property
+    def grammar_content(self) -> str:
+        return self.grammar_buffer.text
+    
+    @grammar_content.setter
+    def grammar_content(self, content: str):
+        self.grammar_buffer.set_text(content)
+    
+    @property
+    def text_content(self) -> str:
+        return self.text_buffer.text
+    
+    @text_content.setter
+    def text_content(self, content: str):
+        self.text_buffer.set_text(content)
     
     def update_activity(self):
         """Update last activity timestamp."""
         self.last_activity = datetime.now()
-        logger.debug(f"Updated activity for session {self.session_id[:8]}...")
+        logger.debug("Updated activity for session %.8s...", self.session_id)
     
-    def add_websocket(self, websocket: WebSocket):
+    def add_websocket(self, websocket: "ClientConnection"):
         """Add WebSocket connection to session."""
         self.websocket_connections.add(websocket)
         self.update_activity()
-        logger.debug(f"Added WebSocket to session {self.session_id[:8]}... (total: {len(self.websocket_connections)})")
+        logger.debug("Added WebSocket to session %.8s... (total: %d)", self.session_id, len(self.websocket_connections))
     
-    def remove_websocket(self, websocket: WebSocket):
+    def remove_websocket(self, websocket: "ClientConnection"):
         """Remove WebSocket connection from session."""
         self.websocket_connections.discard(websocket)
         self.update_activity()
-        logger.debug(f"Removed WebSocket from session {self.session_id[:8]}... (total: {len(self.websocket_connections)})")
+        logger.debug("Removed WebSocket from session %.8s... (total: %d)", self.session_id, len(self.websocket_connections))
     
     def is_expired(self) -> bool:
         """Check if session has expired."""
         expiry_time = self.last_activity + timedelta(seconds=settings.session_timeout)
-        expired = datetime.now() > expiry_time
-        if expired:
-            logger.debug(f"Session {self.session_id[:8]}... has expired")
-        return expired
+        return datetime.now() > expiry_time
     
     def get_connection_count(self) -> int:
         """Get number of active WebSocket connections."""
         return len(self.websocket_connections)
+    
+    def content_versions(self) -> Tuple[int, int]:
+        """Get the (grammar, text) document versions."""
+        return self.grammar_buffer.version, self.text_buffer.version
+    
+    def content_bytes(self) -> int:
+        """Approximate bytes held by the grammar and text documents."""
+        return self.grammar_buffer.nbytes() + self.text_buffer.nbytes()
+    
+    def result_bytes(self) -> int:
+        """Approximate bytes held by the last parse result and its stored JSON."""
+        total = 0
+        result = self.last_parse_result
+        if result is not None:
+            if self._result_size is None or self._result_size[0] is not result:
+                self._result_size = (result, estimate_result_bytes(result))
+            total += self._result_size[1]
+        if self._stored_result is not None:
+            total += len(self._stored_result[1])
+        return total
+    
+    def nbytes(self, result_shared: bool = False) -> int:
+        """Approximate bytes owned by this session.
+        
+        A result that is also held by the parse cache is not freed with
+        the session, so callers pass ``result_shared`` to leave it out.
+        """
+        total = self.content_bytes()
+        if result_shared:
+            if self._stored_result is not None:
+                total += len(self._stored_result[1])
+        else:
+            total += self.result_bytes()
+        return total
+    
+    def drop_heavy_parts(self, keep_result: bool = False) -> bool:
+        """Release the parse result and editing structures; returns whether anything was held.
+        
+        ``keep_result`` keeps the parse result itself, e.g. one that the
+        parse cache also holds or that is about to be spilled to disk.
+        """
+        held = self._stored_result is not None
+        self._stored_result = None
+        if not keep_result:
+            held = held or self.last_parse_result is not None
+            self._last_parse_result = None
+            self._result_size = None
+        released = self.grammar_buffer.compact() + self.text_buffer.compact()
+        return held or released > 0
+    
+    def spill_result(self):
+        """Drop the in-memory parse result after it has been written to disk."""
+        self._last_parse_result = None
+        self._stored_result = None
+        self._result_size = None
+        self.result_spilled = True
+    
+    def to_record(self) -> SessionRecord:
+        """Snapshot the session for storage."""
+        result_json = None
+        if self.last_parse_result is not None:
+            if self._stored_result is None or self._stored_result[0] is not self.last_parse_result:
+                self._stored_result = (self.last_parse_result, dump_json(self.last_parse_result))
+            result_json = self._stored_result[1]
+        
+        return SessionRecord(
+            session_id=self.session_id,
+            created_at=self.created_at.timestamp(),
+            last_activity=self.last_activity.timestamp(),
+            grammar=self.grammar_buffer.text,
+            grammar_version=self.grammar_buffer.version,
+            text=self.text_buffer.text,
+            text_version=self.text_buffer.version,
+            parse_settings=self.parse_settings.model_dump_json(),
+            tree_expand_state=json.dumps(self.tree_expand_state),
+            last_parse_result=result_json,
+            revision=self.revision
+        )
+    
+    def apply_record(self, record: SessionRecord):
+        """Replace session state with a stored snapshot, keeping connections."""
+        self.created_at = datetime.fromtimestamp(record.created_at)
+        self.last_activity = datetime.fromtimestamp(record.last_activity)
+        self.grammar_buffer.set_text(record.grammar, record.grammar_version)
+        self.text_buffer.set_text(record.text, record.text_version)
+        self.parse_settings = ParseSettings.model_validate_json(record.parse_settings)
+        self.tree_expand_state = json.loads(record.tree_expand_state)
+        
+        if record.last_parse_result is None:
+            self.last_parse_result = None
+            self._stored_result = None
+        elif self._stored_result is None or self._stored_result[1] != record.last_parse_result:
+            self.last_parse_result = ParseResult.model_validate_json(record.last_parse_result)
+            self._stored_result = (self.last_parse_result, record.last_parse_result)
+        
+        self.revision = record.revision
+    
+    @classmethod
+    def from_record(cls, record: SessionRecord) -> "EditorSession":
+        """Create a session from a stored snapshot."""
+        session = cls(session_id=record.session_id)
+        session.apply_record(record)
+        return session
 
 
 class SessionManager:
     """Manages editor sessions and WebSocket connections."""
     
-    def __init__(self):
+    def __init__(self, store: Optional[SessionStore] = None, broadcaster: Optional[Broadcaster] = None):
         self.sessions: Dict[str, EditorSession] = {}
         self.cleanup_task: Optional[asyncio.Task] = None
-        logger.info("Initialized SessionManager")
+        # Shared backends let several worker processes serve the same sessions
+        self.store = store or create_session_store(settings.session_backend, settings.session_db_path)
+        self.broadcaster = broadcaster or create_broadcaster(settings.session_backend, settings.broadcast_dir)
+        # Periodic snapshots let a single-worker server restore sessions after a restart
+        self.snapshot_store: Optional[SessionStore] = None
+        self.snapshot_task: Optional[asyncio.Task] = None
+        self.restorable = ExpiryIndex()
+        self.dirty: Set[str] = set()
+        self.removed: Set[str] = set()
+        self.restored_count = 0
+        # Changed sessions waiting to be written to a shared store
+        self.pending_saves: Set[str] = set()
+        self.save_task: Optional[asyncio.Task] = None
+        self.save_conflicts = 0
+        # Sessions without connections, least recently active first
+        self.idle = ExpiryIndex()
+        self.expired_count = 0
+        self.evicted_count = 0
+        # Approximate bytes owned by sessions, kept current by _account
+        self.memory_bytes = 0
+        self.heavy_parts_released = 0
+        self.budget_evictions = 0
+        # Whether idle sessions could not free enough memory, so the warning is logged once
+        self.over_budget = False
+        # Sessions holding a parse result in memory, for spilling once idle
+        self.spill = ResultSpill(settings.result_spill_dir)
+        self.spill_candidates = ExpiryIndex()
+        self.spill_task: Optional[asyncio.Task] = None
+        # Idle sessions whose results are being spilled to fit the memory budget
+        self.budget_spill: Set[str] = set()
+        self.budget_spill_task: Optional[asyncio.Task] = None
+        # Called with the id of every session dropped from memory
+        self.discard_listeners: List[Callable[[str], None]] = []
+        self._expiry_changed = asyncio.Event()
+        logger.info(f"Initialized SessionManager (backend: {settings.session_backend})")
         self._start_cleanup_task()
     
+    async def start(self):
+        """Start receiving broadcasts from other workers and restore snapshotted sessions."""
+        await self.broadcaster.start(self._deliver_remote)
+        if settings.session_snapshot_path and not self.store.shared:
+            # A shared store already persists every change
+            self.snapshot_store = await asyncio.to_thread(
+                create_session_store, "sqlite", settings.session_snapshot_path
+            )
+            await self.restore_index()
+            self.snapshot_task = asyncio.create_task(self._snapshot_periodically())
+        if settings.result_spill_after:
+            await asyncio.to_thread(self.spill.remove_stale)
+            self.spill_task = asyncio.create_task(self._spill_periodically())
+    
+    async def restore_index(self):
+        """Index snapshotted sessions; their contents load on first access."""
+        start_time = time.perf_counter()
+        cutoff = datetime.now().timestamp() - settings.session_timeout
+        await asyncio.to_thread(self.snapshot_store.delete_expired, cutoff)
+        entries = await asyncio.to_thread(self.snapshot_store.list_activity)
+        self.restorable = ExpiryIndex()
+        for session_id, last_activity in entries:
+            if session_id not in self.sessions:
+                self.restorable.touch(session_id, last_activity)
+        self._expiry_changed.set()
+        elapsed = (time.perf_counter() - start_time) * 1000
+        logger.info(f"Indexed {len(self.restorable)} restorable sessions in {elapsed:.1f}ms")
+    
+    async def _snapshot_periodically(self):
+        """Background task writing changed sessions to the snapshot."""
+        while True:
+            await asyncio.sleep(settings.session_snapshot_interval)
+            try:
+                await self.snapshot()
+            except Exception as e:
+                logger.error(f"Session snapshot error: {str(e)}")
+    
+    async def snapshot(self) -> int:
+        """Write sessions changed since the last snapshot and return how many were written."""
+        if self.snapshot_store is None or not (self.dirty or self.removed):
+            return 0
+        
+        dirty, self.dirty = self.dirty, set()
+        removed, self.removed = self.removed, set()
+        for session_id in dirty:
+            session = self.sessions.get(session_id)
+            if session is not None and session.result_spilled:
+                await self.load_parse_result(session)
+        records = [self.sessions[sid].to_record() for sid in dirty if sid in self.sessions]
+        
+        start_time = time.perf_counter()
+        try:
+            await asyncio.to_thread(self.snapshot_store.write_batch, records, removed)
+        except Exception:
+            # Retry these sessions with the next snapshot
+            self.dirty |= dirty
+            self.removed |= removed
+            raise
+        elapsed = (time.perf_counter() - start_time) * 1000
+        logger.debug("Snapshot wrote %d sessions, removed %d in %.1fms", len(records), len(removed), elapsed)
+        return len(records)
+    
+    async def load_parse_result(self, session: EditorSession) -> Optional[ParseResult]:
+        """Get a session's last parse result, reloading it from disk if it was spilled."""
+        if session.result_spilled:
+            result = await asyncio.to_thread(self._reload_result, session.session_id)
+            if session.result_spilled:
+                session.last_parse_result = result
+                self._measure(session)
+        return session.last_parse_result
+    
+    def _reload_result(self, session_id: str) -> Optional[ParseResult]:
+        """Read a spilled result back and delete its file; runs in a worker thread."""
+        result = self.spill.load(session_id)
+        self.spill.discard(session_id)
+        if result is None and self.store.shared:
+            # A lost or unreadable file is not a lost result; every save put it in the store
+            record = self.store.load(session_id)
+            if record is not None and record.last_parse_result is not None:
+                logger.info(f"Recovered parse result of session {session_id[:8]}... from the session store")
+                result = ParseResult.model_validate_json(record.last_parse_result)
+        return result
+    
+    async def _spill_session(self, session_id: str) -> bool:
+        """Move a session's in-memory parse result to disk."""
+        session = self.sessions.get(session_id)
+        if session is None or session.last_parse_result is None:
+            return False
+        result = session.last_parse_result
+        written = await asyncio.to_thread(self.spill.spill, session_id, result)
+        # Skip sessions that got a new result or were removed while the file was written
+        if not written or session.last_parse_result is not result or self.sessions.get(session_id) is not session:
+            return False
+        session.spill_result()
+        self._measure(session)
+        return True
+    
+    async def spill_idle_results(self) -> int:
+        """Move parse results of sessions idle past the threshold to disk."""
+        cutoff = datetime.now().timestamp() - settings.result_spill_after
+        spilled = 0
+        for session_id in self.spill_candidates.pop_expired(cutoff):
+            if await self._spill_session(session_id):
+                spilled += 1
+        if spilled:
+            logger.info(f"Spilled parse results of {spilled} idle sessions")
+        return spilled
+    
+    async def _spill_for_budget(self):
+        """Background task spilling the results picked by memory budget enforcement."""
+        while self.budget_spill:
+            session_id = self.budget_spill.pop()
+            try:
+                await self._spill_session(session_id)
+            except Exception as e:
+                logger.error(f"Result spill error: {str(e)}")
+    
+    async def _spill_periodically(self):
+        """Background task spilling parse results as sessions pass the idle threshold."""
+        while True:
+            oldest = self.spill_candidates.peek()
+            if oldest is None:
+                delay = settings.result_spill_after
+            else:
+                delay = max(1.0, oldest[1] + settings.result_spill_after - datetime.now().timestamp())
+            await asyncio.sleep(delay)
+            try:
+                await self.spill_idle_results()
+            except Exception as e:
+                logger.error(f"Result spill error: {str(e)}")
+    
+    async def _restore_session(self, session_id: str) -> Optional[EditorSession]:
+        """Load a snapshotted session's contents."""
+        self.restorable.discard(session_id)
+        record = await asyncio.to_thread(self.snapshot_store.load, session_id)
+        if record is None:
+            return None
+        self.restored_count += 1
+        logger.info(f"Restored session {session_id[:8]}... from snapshot")
+        return self._insert_session(EditorSession.from_record(record))
+    
+    def _insert_session(self, session: EditorSession) -> EditorSession:
+        """Add a session, evicting the least recently active idle session if at capacity."""
+        existing = self.sessions.get(session.session_id)
+        if existing is not None:
+            return existing
+        
+        while len(self.sessions) >= settings.max_sessions:
+            oldest = self.idle.pop()
+            if oldest is None:
+                # Every session has connections; allow going over the limit
+                logger.warning(f"Session limit {settings.max_sessions} exceeded by connected sessions")
+                break
+            if oldest in self.sessions:
+                self._discard_session(oldest)
+                self.evicted_count += 1
+                logger.debug("Evicted idle session %.8s...", oldest)
+        
+        self.sessions[session.session_id] = session
+        self._track(session)
+        self._account(session)
+        return session
+    
+    def _measure(self, session: EditorSession):
+        """Update the memory total with a session's current usage."""
+        result = session.last_parse_result
+        shared = result is not None and get_parser().cache.holds(result)
+        usage = session.nbytes(result_shared=shared)
+        self.memory_bytes += usage - session.accounted_bytes
+        session.accounted_bytes = usage
+        self._track_result(session)
+    
+    def _track_result(self, session: EditorSession):
+        """Keep sessions with an in-memory parse result in the spill index."""
+        if session.last_parse_result is None:
+            self.spill_candidates.discard(session.session_id)
+        else:
+            self.spill_candidates.touch(session.session_id, session.last_activity.timestamp())
+    
+    def _account(self, session: EditorSession):
+        """Re-measure a session and enforce the session memory budget."""
+        self._measure(session)
+        if settings.session_memory_budget and self.memory_bytes > settings.session_memory_budget:
+            self._enforce_memory_budget(keep=session.session_id)
+        else:
+            self.over_budget = False
+    
+    def _enforce_memory_budget(self, keep: Optional[str] = None):
+        """Free idle sessions' memory until usage fits the budget.
+        
+        Parse results and editing structures of idle sessions go first,
+        least recently active first; whole idle sessions are evicted only
+        if that is not enough. ``keep`` is the session being updated.
+        
+        With spilling enabled, parse results are moved to disk by a
+        background task rather than dropped, so exports and reconnects
+        still find them. Results the parse cache also holds are kept,
+        since dropping them would free nothing.
+        """
+        budget = settings.session_memory_budget
+        parse_cache = get_parser().cache
+        # Bytes that results already on their way to disk will free
+        spilling = sum(
+            self.sessions[session_id].result_bytes()
+            for session_id in self.budget_spill if session_id in self.sessions
+        )
+        
+        # The idle index yields oldest first, so only as many sessions as
+        # needed are visited; it is not touched while walking it
+        for session_id, _ in self.idle.iter_oldest():
+            if self.memory_bytes - spilling <= budget:
+                break
+            session = self.sessions.get(session_id)
+            if session is None or session_id == keep:
+                continue
+            result = session.last_parse_result
+            shared = result is not None and parse_cache.holds(result)
+            spill = result is not None and not shared and settings.result_spill_after > 0
+            released = session.drop_heavy_parts(keep_result=shared or spill)
+            if released:
+                self.heavy_parts_released += 1
+                self._measure(session)
+            if spill and session_id not in self.budget_spill:
+                self.budget_spill.add(session_id)
+                spilling += session.result_bytes()
+        
+        for session_id, _ in self.idle.iter_oldest():
+            if self.memory_bytes - spilling <= budget:
+                break
+            if session_id in self.sessions and session_id != keep:
+                if session_id in self.budget_spill:
+                    spilling -= self.sessions[session_id].result_bytes()
+                self._discard_session(session_id)
+                self.budget_evictions += 1
+                logger.debug("Evicted idle session %.8s... to fit the memory budget", session_id)
+        
+        if self.budget_spill and (self.budget_spill_task is None or self.budget_spill_task.done()):
+            self.budget_spill_task = asyncio.create_task(self._spill_for_budget())
+        
+        over_budget = self.memory_bytes - spilling > budget
+        if over_budget and not self.over_budget:
+            logger.warning(f"Session memory {self.memory_bytes} bytes exceeds budget {budget} with no idle sessions left")
+        self.over_budget = over_budget
+    
+    def _track(self, session: EditorSession):
+        """Update a session's place in the idle index after activity."""
+        self._track_result(session)
+        if session.get_connection_count():
+            self.idle.discard(session.session_id)
+            return
+        self.idle.touch(session.session_id, session.last_activity.timestamp())
+        oldest = self.idle.peek()
+        if oldest is not None and oldest[0] == session.session_id:
+            # The next expiry moved earlier
+            self._expiry_changed.set()
+    
+    def _discard_session(self, session_id: str):
+        """Drop a session from memory and from the next snapshot."""
+        session = self.sessions.pop(session_id)
+        self.memory_bytes -= session.accounted_bytes
+        self.idle.discard(session_id)
+        self.spill_candidates.discard(session_id)
+        self.budget_spill.discard(session_id)
+        # A file can outlive the flag, e.g. when a newer result superseded it
+        self.spill.discard(session_id)
+        self.dirty.discard(session_id)
+        if self.snapshot_store is not None:
+            self.removed.add(session_id)
+        for listener in self.discard_listeners:
+            listener(session_id)
+    
     def _start_cleanup_task(self):
-        """Start the session cleanup background task."""
+        """Start the session expiry background task."""
         try:
             if self.cleanup_task is None or self.cleanup_task.done():
-                self.cleanup_task = asyncio.create_task(self._cleanup_expired_sessions())
-                logger.info("Started session cleanup background task")
+                self.cleanup_task = asyncio.create_task(self._expire_sessions())
+                logger.info("Started session expiry background task")
         except RuntimeError:
             # No event loop running (likely in tests), skip background task
             logger.debug("No event loop available, skipping cleanup task")
             self.cleanup_task = None
     
-    async def _cleanup_expired_sessions(self):
-        """Background task to clean up expired sessions."""
-        logger.info("Session cleanup task started")
-        cleanup_count = 0
+    def expire_sessions(self) -> int:
+        """Remove idle sessions whose timeout has passed and return how many."""
+        cutoff = datetime.now().timestamp() - settings.session_timeout
+        expired = 0
+        for session_id in self.idle.pop_expired(cutoff):
+            if session_id in self.sessions:
+                self._discard_session(session_id)
+                expired += 1
+        
+        # Snapshotted sessions nobody came back for expire too
+        for session_id in self.restorable.pop_expired(cutoff):
+            self.removed.add(session_id)
+            expired += 1
+        
+        if expired:
+            self.expired_count += expired
+            logger.info(f"Expired {expired} sessions (total expired: {self.expired_count})")
+        return expired
+    
+    def _next_expiry(self) -> Optional[float]:
+        """Seconds until the next idle session expires, or None if none will."""
+        deadlines = [
+            oldest[1] + settings.session_timeout
+            for oldest in (self.idle.peek(), self.restorable.peek())
+            if oldest is not None
+        ]
+        if not deadlines:
+            return None
+        return max(0.0, min(deadlines) - datetime.now().timestamp())
+    
+    async def _expire_sessions(self):
+        """Background task expiring idle sessions when their timeout passes."""
+        logger.info("Session expiry task started")
         
         while True:
             try:
-                expired_sessions = [
-                    session_id for session_id, session in self.sessions.items()
-                    if session.is_expired() and session.get_connection_count() == 0
-                ]
-                
-                for session_id in expired_sessions:
-                    del self.sessions[session_id]
-                    cleanup_count += 1
-                    logger.debug(f"Cleaned up expired session {session_id[:8]}...")
+                self.expire_sessions()
                 
-                # Also enforce max sessions limit
-                excess_count = 0
-                if len(self.sessions) > settings.max_sessions:
-                    # Remove oldest sessions without connections
-                    sessions_by_age = sorted(
-                        [(sid, s) for sid, s in self.sessions.items() if s.get_connection_count() == 0],
-                        key=lambda x: x[1].last_activity
-                    )
-                    
-                    excess_count = len(self.sessions) - settings.max_sessions
-                    for session_id, _ in sessions_by_age[:excess_count]:
-                        del self.sessions[session_id]
-                        cleanup_count += 1
-                        logger.debug(f"Cleaned up excess session {session_id[:8]}...")
+                delay = self._next_expiry()
+                if self.store.shared:
+                    # Stored sessions are expired by whichever worker sweeps first
+                    delay = min(delay, STORE_SWEEP_INTERVAL) if delay is not None else STORE_SWEEP_INTERVAL
                 
-                if len(expired_sessions) > 0 or excess_count > 0:
-                    logger.info(f"Session cleanup: {len(expired_sessions)} expired, {excess_count} excess (total cleaned: {cleanup_count})")
+                # Sleep until the next expiry, or until activity moves it earlier.
+                # asyncio.wait_for can swallow a cancellation that arrives as the
+                # event is set, so shutdown would never finish; wait does not
+                self._expiry_changed.clear()
+                changed = asyncio.ensure_future(self._expiry_changed.wait())
+                try:
+                    await asyncio.wait({changed}, timeout=delay)
+                finally:
+                    changed.cancel()
                 
-                await asyncio.sleep(300)  # Clean up every 5 minutes
+                if self.store.shared:
+                    cutoff = datetime.now().timestamp() - settings.session_timeout
+                    await asyncio.to_thread(self.store.delete_expired, cutoff)
                 
             except Exception as e:
-                logger.error(f"Session cleanup error: {str(e)}")
+                logger.error(f"Session expiry error: {str(e)}")
                 await asyncio.sleep(60)  # Retry after 1 minute on error
     
+    async def get_session(self, session_id: str) -> Optional[EditorSession]:
+        """Get an existing session, loading or refreshing it from a shared store."""
+        session = self.sessions.get(session_id)
+        if not self.store.shared:
+            if session is None and session_id in self.restorable:
+                return await self._restore_session(session_id)
+            return session
+        
+        if session is not None:
+            # Another worker may have changed the session since we last saw it
+            revision = await asyncio.to_thread(self.store.get_revision, session_id)
+            if revision is not None and revision != session.revision:
+                record = await asyncio.to_thread(self.store.load, session_id)
+                if record is not None:
+                    # Unsaved local changes were made on a copy that is now stale
+                    await self._refresh(session, record, conflict=session_id in self.pending_saves)
+            return session
+        
+        record = await asyncio.to_thread(self.store.load, session_id)
+        if record is None:
+            return None
+        logger.debug("Loaded session %.8s... from store (revision %d)", session_id, record.revision)
+        return self._insert_session(EditorSession.from_record(record))
+    
     async def get_or_create_session(self, session_id: str) -> EditorSession:
         """Get existing session or create new one."""
-        if session_id not in self.sessions:
-            logger.info(f"Creating new session {session_id[:8]}...")
-            self.sessions[session_id] = EditorSession(session_id=session_id)
+        session = await self.get_session(session_id)
+        if session is None:
+            logger.info("Creating new session %.8s...", session_id)
+            session = self._insert_session(EditorSession(session_id=session_id))
         else:
-            logger.debug(f"Retrieved existing session {session_id[:8]}...")
+            logger.debug("Retrieved existing session %.8s...", session_id)
         
-        session = self.sessions[session_id]
         session.update_activity()
+        self._track(session)
         return session
     
+    async def save_session(self, session: EditorSession) -> bool:
+        """Account for a changed session and persist it.
+        
+        The change is written through to a shared store, or marked for
+        the next snapshot. Returns False if another worker saved the
+        session first, in which case the session now holds the stored
+        state and its connections were asked to resync.
+        """
+        self._account(session)
+        if session.result_spilled and (self.store.shared or self.snapshot_store is not None):
+            # Persisted records carry the result
+            await self.load_parse_result(session)
+        if self.store.shared:
+            self.pending_saves.discard(session.session_id)
+            return await self._write(session)
+        if self.snapshot_store is not None:
+            self.dirty.add(session.session_id)
+        return True
+    
+    def mark_changed(self, session: EditorSession):
+        """Account for a changed session and persist it shortly.
+        
+        Unlike ``save_session`` this does not write to a shared store
+        right away; a burst of edits is written once, ``session_save_delay``
+        after the first of them.
+        """
+        self._account(session)
+        if self.store.shared:
+            self.pending_saves.add(session.session_id)
+            if self.save_task is None or self.save_task.done():
+                self.save_task = asyncio.create_task(self._save_pending())
+        elif self.snapshot_store is not None:
+            self.dirty.add(session.session_id)
+    
+    async def _save_pending(self):
+        """Background task writing pending changes until none are left."""
+        while self.pending_saves:
+            await asyncio.sleep(settings.session_save_delay)
+            try:
+                await self.flush_saves()
+            except Exception as e:
+                logger.error(f"Session save error: {str(e)}")
+    
+    async def flush_saves(self) -> int:
+        """Write every session with pending changes and return how many were written."""
+        pending, self.pending_saves = self.pending_saves, set()
+        written = 0
+        try:
+            for session_id in pending:
+                session = self.sessions.get(session_id)
+                if session is not None and await self.save_session(session):
+                    written += 1
+        except Exception:
+            # Retry these sessions with the next save
+            self.pending_saves |= pending
+            raise
+        return written
+    
+    async def _write(self, session: EditorSession) -> bool:
+        """Write a session on top of the revision it was loaded at."""
+        try:
+            session.revision = await asyncio.to_thread(self.store.save, session.to_record())
+            return True
+        except RevisionConflictError:
+            pass
+        
+        record = await asyncio.to_thread(self.store.load, session.session_id)
+        if record is None:
+            # Another worker expired it from the store; store it afresh
+            session.revision = 0
+            session.revision = await asyncio.to_thread(self.store.save, session.to_record())
+            return True
+        await self._refresh(session, record, conflict=True)
+        return False
+    
+    async def _refresh(self, session: EditorSession, record: SessionRecord, conflict: bool):
+        """Replace a session with its stored state.
+        
+        On a conflict this worker's unsaved changes are lost, so its
+        connections are asked to resend their documents.
+        """
+        session.apply_record(record)
+        self._track(session)
+        self._account(session)
+        if not conflict:
+            logger.debug("Refreshed session %.8s... (revision %d)", session.session_id, record.revision)
+            return
+        
+        self.pending_saves.discard(session.session_id)
+        self.save_conflicts += 1
+        logger.info(f"Session {session.session_id[:8]}... was saved by another worker; requesting resync")
+        for target, buffer in (("grammar", session.grammar_buffer), ("text", session.text_buffer)):
+            await self._deliver(session.session_id, EncodedMessage({
+                "type": "resync_required",
+                "session_id": session.session_id,
+                "timestamp": datetime.now().isoformat(),
+                "data": {"target": target, "version": buffer.version}
+            }), None)
+    
     async def update_session_content(
         self, 
         session_id: str, 
@@ -142,57 +762,85 @@ class SessionManager:
         settings: Optional[ParseSettings] = None
     ):
         """Update session content."""
-        logger.debug(f"Updating content for session {session_id[:8]}...")
+        logger.debug("Updating content for session %.8s...", session_id)
         session = await self.get_or_create_session(session_id)
         
         if grammar is not None:
             session.grammar_content = grammar
-            logger.debug(f"Updated grammar content ({len(grammar)} chars)")
+            logger.debug("Updated grammar content (%d chars)", len(grammar))
         if text is not None:
             session.text_content = text
-            logger.debug(f"Updated text content ({len(text)} chars)")
+            logger.debug("Updated text content (%d chars)", len(text))
         if settings is not None:
             session.parse_settings = settings
-            logger.debug(f"Updated parse settings")
+            logger.debug("Updated parse settings")
         
         session.update_activity()
+        await self.save_session(session)
     
-    async def add_websocket_to_session(self, session_id: str, websocket: WebSocket):
+    async def add_websocket_to_session(self, session_id: str, websocket: "ClientConnection"):
         """Add WebSocket connection to session."""
-        logger.debug(f"Adding WebSocket to session {session_id[:8]}...")
+        logger.debug("Adding WebSocket to session %.8s...", session_id)
         session = await self.get_or_create_session(session_id)
         session.add_websocket(websocket)
+        self._track(session)
     
-    async def remove_websocket_from_session(self, session_id: str, websocket: WebSocket):
+    async def remove_websocket_from_session(self, session_id: str, websocket: "ClientConnection"):
         """Remove WebSocket connection from session."""
         if session_id in self.sessions:
-            logger.debug(f"Removing WebSocket from session {session_id[:8]}...")
-            self.sessions[session_id].remove_websocket(websocket)
+            logger.debug("Removing WebSocket from session %.8s...", session_id)
+            session = self.sessions[session_id]
+            session.remove_websocket(websocket)
+            self._track(session)
+    
+    async def broadcast_to_session(self, session_id: str, message: dict, replace_key: Optional[str] = None):
+        """Broadcast message to all WebSocket connections in a session.
+        
+        The message is serialized once. Queued connections receive it
+        without waiting on each other; a pending message with the same
+        ``replace_key`` is replaced rather than delivered twice. Other
+        workers deliver it to the session's connections they hold.
+        """
+        encoded = EncodedMessage(message)
+        await self._deliver(session_id, encoded, replace_key)
+        await self.broadcaster.publish(session_id, encoded.text, replace_key)
+    
+    async def _deliver_remote(self, session_id: str, text: str, replace_key: Optional[str]):
+        """Deliver a broadcast published by another worker."""
+        await self._deliver(session_id, EncodedMessage.from_text(text), replace_key)
     
-    async def broadcast_to_session(self, session_id: str, message: dict):
-        """Broadcast message to all WebSocket connections in a session."""
+    async def _deliver(
+        self,
+        session_id: str,
+        encoded: EncodedMessage,
+        replace_key: Optional[str]
+    ):
+        """Send an encoded message to this worker's connections in a session."""
         if session_id in self.sessions:
             session = self.sessions[session_id]
             # Create a copy of connections set to avoid iteration issues
             connections = list(session.websocket_connections)
             
-            logger.debug(f"Broadcasting to session {session_id[:8]}... ({len(connections)} connections)")
+            logger.debug("Broadcasting to session %.8s... (%d connections)", session_id, len(connections))
             
-            disconnected_count = 0
-            for websocket in connections:
-                try:
-                    await websocket.send_json(message)
-                except Exception as e:
-                    # Remove disconnected WebSocket
-                    session.remove_websocket(websocket)
-                    disconnected_count += 1
-                    logger.debug(f"Removed disconnected WebSocket from session {session_id[:8]}...")
+            # Each connection queues the message for its own writer task
+            disconnected = [
+                connection for connection in connections
+                if not connection.enqueue(encoded, replace_key)
+            ]
             
-            if disconnected_count > 0:
-                logger.info(f"Removed {disconnected_count} disconnected WebSockets from session {session_id[:8]}...")
+            for connection in disconnected:
+                # Remove disconnected WebSocket
+                session.remove_websocket(connection)
+                logger.debug("Removed disconnected WebSocket from session %.8s...", session_id)
+            
+            if disconnected:
+                self._track(session)
+                logger.info(f"Removed {len(disconnected)} disconnected WebSockets from session {session_id[:8]}...")
     
-    def get_session_stats(self) -> Dict[str, int]:
+    def get_session_stats(self) -> Dict[str, Any]:
         """Get session statistics."""
+        parse_cache = get_parser().cache
         total_connections = sum(
             session.get_connection_count() 
             for session in self.sessions.values()
@@ -204,10 +852,27 @@ class SessionManager:
             "active_sessions": len([
                 s for s in self.sessions.values() 
                 if s.get_connection_count() > 0
-            ])
+            ]),
+            "restorable_sessions": len(self.restorable),
+            "restored_sessions": self.restored_count,
+            "expired_sessions": self.expired_count,
+            "evicted_sessions": self.evicted_count,
+            "save_conflicts": self.save_conflicts,
+            "memory": {
+                "total_bytes": self.memory_bytes,
+                "budget_bytes": settings.session_memory_budget,
+                "over_budget": self.over_budget,
+                "content_bytes": sum(s.content_bytes() for s in self.sessions.values()),
+                "results_shared_with_cache": sum(
+                    1 for s in self.sessions.values()
+                    if s.last_parse_result is not None and parse_cache.holds(s.last_parse_result)
+                ),
+                "heavy_parts_released": self.heavy_parts_released,
+                "budget_evictions": self.budget_evictions
+            }
         }
         
-        logger.debug(f"Session stats: {stats}")
+        logger.debug("Session stats: %s", stats)
         return stats
     
     async def shutdown(self):
@@ -219,6 +884,39 @@ class SessionManager:
                 await self.cleanup_task
             except asyncio.CancelledError:
                 pass
+        for task in (self.spill_task, self.budget_spill_task):
+            if task and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        if self.save_task and not self.save_task.done():
+            self.save_task.cancel()
+            try:
+                await self.save_task
+            except asyncio.CancelledError:
+                pass
+        if self.pending_saves:
+            try:
+                await self.flush_saves()
+            except Exception as e:
+                logger.error(f"Final session save failed: {str(e)}")
+        if self.snapshot_task and not self.snapshot_task.done():
+            self.snapshot_task.cancel()
+            try:
+                await self.snapshot_task
+            except asyncio.CancelledError:
+                pass
+        if self.snapshot_store is not None:
+            # Final snapshot so nothing since the last interval is lost
+            try:
+                await self.snapshot()
+            except Exception as e:
+                logger.error(f"Final session snapshot failed: {str(e)}")
+            self.snapshot_store.close()
+        await self.broadcaster.stop()
+        self.store.close()
         logger.info("SessionManager shutdown complete")
 
 
@@ -0,0 +1,230 @@
+"""Symbol index of Lark grammar source for completion and navigation.
+
+The grammar is cut into statements, each starting on a line that is not
+indented and does not continue an alternative with ``|``, and every
+statement is scanned on its own for definitions, references and
+``%import``s. Scans are memoized by statement text, so after an edit
+only the statements it touched are scanned again, and whole indexes are
+memoized by grammar digest. Nothing is compiled, so the index is
+available even while the grammar is invalid.
+"""
+
+import hashlib
+import re
+from bisect import bisect_right
+from typing import Dict, List, Optional, Set, Tuple
+
+from ..models.responses import GrammarImport, GrammarSymbol, SymbolIndex
+from .config import get_logger, get_settings
+
+logger = get_logger("symbols")
+
+# A statement starts on every line beginning with something other than
+# whitespace or the "|" that continues a rule's alternatives
+_STATEMENT_START = re.compile(r"^(?=[^\s|])", re.MULTILINE)
+
+_TOKEN = re.compile(r"""
+    (?P<comment>(?://|\#)[^\n]*)
+  | (?P<string>"(?:[^"\\\n]|\\.)*"i?)
+  | (?P<regexp>/(?:[^/\\\n]|\\.)+/[imslux]*)
+  | (?P<directive>%[a-z]+)
+  | (?P<name>[A-Za-z_][A-Za-z_0-9]*)
+  | (?P<arrow>->)
+  | (?P<other>\S)
+""", re.VERBOSE)
+
+# (name, offset, line, column) with offset and line relative to the statement
+_Occurrence = Tuple[str, int, int, int]
+
+
+class _StatementSymbols:
+    """Symbols found in one statement, positioned relative to its start."""
+
+    __slots__ = ("definitions", "references", "imports")
+
+    def __init__(self):
+        self.definitions: List[_Occurrence] = []
+        self.references: List[_Occurrence] = []
+        # (module, names defined by the import, line)
+        self.imports: List[Tuple[str, List[str], int]] = []
+
+
+def symbol_kind(name: str) -> str:
+    """Lark treats upper-case names as terminals and the rest as rules."""
+    return "terminal" if name.isupper() else "rule"
+
+
+def _tokens(statement: str) -> List[Tuple[str, str, int, int, int]]:
+    """Tokenize a statement into (kind, value, offset, line, column), skipping comments."""
+    newlines = [i for i, char in enumerate(statement) if char == "\n"]
+    tokens = []
+    for match in _TOKEN.finditer(statement):
+        kind = match.lastgroup
+        if kind == "comment":
+            continue
+        offset = match.start()
+        line = bisect_right(newlines, offset)
+        column = offset - (newlines[line - 1] if line else -1)
+        tokens.append((kind, match.group(), offset, line, column))
+    return tokens
+
+
+def _scan_import(tokens, symbols: _StatementSymbols):
+    """Record ``%import module.NAME [-> ALIAS]`` and ``%import module (A, B)``."""
+    path: List[str] = []
+    names: List[Tuple[str, int, int, int]] = []
+    alias = None
+    position = 1
+    while position < len(tokens) and tokens[position][1] not in ("(", "->"):
+        kind, value, offset, line, column = tokens[position]
+        if kind == "name" or value == ".":
+            path.append(value)
+        if kind == "name":
+            names = [(value, offset, line, column)]
+        position += 1
+    if position < len(tokens) and tokens[position][1] == "(":
+        # Every name in the parentheses is imported under its own name
+        names = [(value, offset, line, column) for kind, value, offset, line, column in tokens[position:] if kind == "name"]
+        module = "".join(path)
+    else:
+        module = "".join(path[:-1]).rstrip(".")
+        if position + 1 < len(tokens) and tokens[position][1] == "->" and tokens[position + 1][0] == "name":
+            _, value, offset, line, column = tokens[position + 1]
+            alias = (value, offset, line, column)
+    if alias is not None:
+        names = [alias]
+    if not names:
+        return
+    symbols.definitions.extend(names)
+    symbols.imports.append((module, [name[0] for name in names], tokens[0][3]))
+
+
+def scan_statement(statement: str) -> _StatementSymbols:
+    """Find the definitions, references and imports of one statement."""
+    symbols = _StatementSymbols()
+    tokens = _tokens(statement)
+    if not tokens:
+        return symbols
+
+    kind, value = tokens[0][0], tokens[0][1]
+    body = tokens
+    if kind == "directive":
+        if value == "%import":
+            _scan_import(tokens, symbols)
+            return symbols
+        if value == "%declare":
+            symbols.definitions.extend(token[1:] for token in tokens[1:] if token[0] == "name")
+            return symbols
+        # %ignore, %extend and %override only refer to names defined elsewhere
+        body = tokens[1:]
+    else:
+        # A definition is a name, optionally with ?/! before it and
+        # template parameters or a priority after it, followed by ":"
+        start = 1 if value in ("?", "!") else 0
+        colon = next((i for i, token in enumerate(tokens) if token[1] == ":"), None)
+        if colon is not None and start < len(tokens) and tokens[start][0] == "name":
+            head = tokens[start]
+            symbols.definitions.append(head[1:])
+            parameters = {token[1] for token in tokens[start + 1:colon] if token[0] == "name"}
+            body = [token for token in tokens[colon + 1:] if token[1] not in parameters]
+
+    previous = None
+    for kind, value, offset, line, column in body:
+        # Names after "->" label tree nodes, they are not references
+        if kind == "name" and previous != "->":
+            symbols.references.append((value, offset, line, column))
+        previous = value
+    return symbols
+
+
+class SymbolIndexer:
+    """Builds symbol indexes, reusing the scans of unchanged statements."""
+
+    def __init__(self, max_statements: int = 8192, max_indexes: int = 64):
+        self.statements: Dict[str, _StatementSymbols] = {}
+        self.indexes: Dict[str, SymbolIndex] = {}
+        self.max_statements = max_statements
+        self.max_indexes = max_indexes
+        self.statement_hits = 0
+        self.statement_scans = 0
+        self.index_hits = 0
+
+    def _statement(self, statement: str) -> _StatementSymbols:
+        symbols = self.statements.get(statement)
+        if symbols is not None:
+            self.statement_hits += 1
+            return symbols
+        self.statement_scans += 1
+        symbols = scan_statement(statement)
+        self.statements[statement] = symbols
+        while len(self.statements) > self.max_statements:
+            del self.statements[next(iter(self.statements))]
+        return symbols
+
+    def index(self, grammar: str) -> SymbolIndex:
+        """Get the symbol index of a grammar."""
+        digest = hashlib.md5(grammar.encode()).hexdigest()
+        cached = self.indexes.get(digest)
+        if cached is not None:
+            self.index_hits += 1
+            return cached
+
+        definitions: List[GrammarSymbol] = []
+        references: List[GrammarSymbol] = []
+        imports: List[GrammarImport] = []
+        starts = [match.start() for match in _STATEMENT_START.finditer(grammar)]
+        if not starts or starts[0] != 0:
+            starts.insert(0, 0)
+        line = 1
+        for position, start in enumerate(starts):
+            end = starts[position + 1] if position + 1 < len(starts) else len(grammar)
+            statement = grammar[start:end]
+            symbols = self._statement(statement)
+            for name, offset, relative_line, column in symbols.definitions:
+                definitions.append(GrammarSymbol(
+                    name=name, kind=symbol_kind(name), line=line + relative_line, column=column, start_pos=start + offset
+                ))
+            for name, offset, relative_line, column in symbols.references:
+                references.append(GrammarSymbol(
+                    name=name, kind=symbol_kind(name), line=line + relative_line, column=column, start_pos=start + offset
+                ))
+            for module, names, relative_line in symbols.imports:
+                imports.append(GrammarImport(module=module, names=names, line=line + relative_line))
+            line += statement.count("\n")
+
+        defined: Set[str] = {symbol.name for symbol in definitions}
+        undefined = sorted({symbol.name for symbol in references if symbol.name not in defined})
+        index = SymbolIndex(
+            digest=digest,
+            definitions=definitions,
+            references=references,
+            imports=imports,
+            undefined=undefined
+        )
+        self.indexes[digest] = index
+        while len(self.indexes) > self.max_indexes:
+            del self.indexes[next(iter(self.indexes))]
+        logger.debug(f"Indexed grammar {digest[:8]}... ({len(starts)} statements, {len(definitions)} definitions)")
+        return index
+
+    def get_stats(self) -> Dict[str, int]:
+        """Get memoization counts for the stats endpoint."""
+        return {
+            "indexes": len(self.indexes),
+            "index_hits": self.index_hits,
+            "statements": len(self.statements),
+            "statement_hits": self.statement_hits,
+            "statement_scans": self.statement_scans,
+        }
+
+
+# Global symbol indexer instance
+_symbol_indexer: Optional[SymbolIndexer] = None
+
+
+def get_symbol_indexer() -> SymbolIndexer:
+    """Get global symbol indexer instance."""
+    global _symbol_indexer
+    if _symbol_indexer is None:
+        _symbol_indexer = SymbolIndexer(max_indexes=get_settings().symbol_index_cache_size)
+    return _symbol_indexer
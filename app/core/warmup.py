@@ -0,0 +1,163 @@
+"""Startup warm-up of the compiled-parser cache.
+
+At startup the grammars in ``warmup_grammar_dir`` and the most used
+grammars of the previous run are compiled in the background, so the
+first users after a deploy do not wait for compilation. The most used
+grammars are saved at shutdown to ``warmup_state_path``.
+"""
+
+import asyncio
+import glob
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..models.requests import ParseSettings
+from .config import get_logger, get_settings
+from .parser import GrammarCompileError, get_parser
+from .symbols import get_symbol_indexer
+
+logger = get_logger("warmup")
+
+
+class WarmupProgress:
+    """Progress of the warm-up, reported by /api/ready."""
+
+    def __init__(self):
+        self.total = 0
+        self.compiled = 0
+        self.failed = 0
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.finished_at is not None
+
+    def to_dict(self) -> Dict[str, Any]:
+        elapsed = None
+        if self.started_at is not None:
+            elapsed = (self.finished_at or time.time()) - self.started_at
+        return {
+            "ready": self.ready,
+            "total": self.total,
+            "compiled": self.compiled,
+            "failed": self.failed,
+            "elapsed": elapsed,
+        }
+
+
+def _directory_settings(grammar: str) -> ParseSettings:
+    """Default settings, starting at ``start`` or else the first rule defined."""
+    rules = [symbol.name for symbol in get_symbol_indexer().index(grammar).definitions if symbol.kind == "rule"]
+    if not rules or "start" in rules:
+        return ParseSettings()
+    return ParseSettings(start_rule=rules[0])
+
+
+def load_warmup_grammars(grammar_dir: str, state_path: str, top_k: int) -> List[Tuple[str, ParseSettings]]:
+    """Collect the grammars to compile: the directory's, then last run's most used."""
+    settings = get_settings()
+    grammars: List[Tuple[str, ParseSettings]] = []
+    if grammar_dir:
+        for path in sorted(glob.glob(os.path.join(grammar_dir, "*.lark"))):
+            if os.path.getsize(path) > settings.max_grammar_size:
+                logger.warning(f"Skipping warm-up of {path}: larger than max_grammar_size")
+                continue
+            with open(path, encoding="utf-8") as grammar_file:
+                grammar = grammar_file.read()
+            grammars.append((grammar, _directory_settings(grammar)))
+
+    if state_path and os.path.exists(state_path):
+        try:
+            with open(state_path, encoding="utf-8") as state_file:
+                entries = json.load(state_file)["grammars"][:top_k]
+            grammars.extend(
+                (entry["grammar"], ParseSettings.model_validate(entry["settings"])) for entry in entries
+            )
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Ignoring unreadable warm-up state {state_path}: {e}")
+    return grammars
+
+
+def save_hot_grammars(state_path: str, top_k: int):
+    """Save this run's most used grammars for the next start's warm-up."""
+    if not state_path:
+        return
+    entries = [
+        {"grammar": grammar, "settings": parse_settings.model_dump(mode="json"), "uses": uses}
+        for grammar, parse_settings, uses in get_parser().usage.top(top_k)
+    ]
+    if not entries:
+        return
+    directory = os.path.dirname(state_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    # Workers stop one by one; each replaces the file whole
+    temp_path = f"{state_path}.{os.getpid()}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as state_file:
+        json.dump({"saved_at": time.time(), "grammars": entries}, state_file)
+    os.replace(temp_path, state_path)
+    logger.info(f"Saved {len(entries)} most used grammars to {state_path}")
+
+
+async def run_warmup(progress: WarmupProgress):
+    """Compile the warm-up grammars one at a time, leaving cores for live requests."""
+    settings = get_settings()
+    progress.started_at = time.time()
+    try:
+        grammars = await asyncio.get_running_loop().run_in_executor(
+            None, load_warmup_grammars, settings.warmup_grammar_dir, settings.warmup_state_path, settings.warmup_top_k
+        )
+        progress.total = len(grammars)
+        parser = get_parser()
+        for grammar, parse_settings in grammars:
+            try:
+                await parser.compile_grammar(grammar, parse_settings)
+                progress.compiled += 1
+            except GrammarCompileError as e:
+                progress.failed += 1
+                logger.warning(f"Warm-up grammar failed to compile: {e.error.message.splitlines()[0]}")
+    except Exception as e:
+        logger.error(f"Warm-up stopped early: {e}")
+    finally:
+        progress.finished_at = time.time()
+        logger.info(
+            f"Warm-up finished in {progress.finished_at - progress.started_at:.2f}s "
+            f"({progress.compiled} compiled, {progress.failed} failed)"
+        )
+
+
+# Global warm-up state
+_progress = WarmupProgress()
+_warmup_task: Optional[asyncio.Task] = None
+
+
+def get_warmup_progress() -> WarmupProgress:
+    """Get global warm-up progress."""
+    return _progress
+
+
+def start_warmup() -> asyncio.Task:
+    """Start the warm-up in the background."""
+    global _warmup_task
+    if _warmup_task is None:
+        _warmup_task = asyncio.create_task(run_warmup(_progress))
+    return _warmup_task
+
+
+async def stop_warmup():
+    """Cancel an unfinished warm-up and save the most used grammars."""
+    if _warmup_task is not None and not _warmup_task.done():
+        _warmup_task.cancel()
+        # Wait for it to stop before the pools and stores it uses are shut down
+        try:
+            await _warmup_task
+        except asyncio.CancelledError:
+            pass
+    settings = get_settings()
+    try:
+        save_hot_grammars(settings.warmup_state_path, settings.warmup_top_k)
+    except OSError as e:
+        logger.error(f"Failed to save warm-up state: {e}")
@@ -2,21 +2,16 @@
 
 from fastapi import FastAPI, Request
 from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware
 
 from .api import parsing, files, health
 from .websockets import parsing_ws
 from .core.config import get_settings, setup_logging, get_logger
 
-# Initialize settings and logging
+# Logging is set up in the startup event, so importing the app stays cheap
 settings = get_settings()
-setup_logging(settings)
 logger = get_logger("main")
 
-logger.info("Starting LarkEditor Web application...")
-logger.debug(f"Settings: host={settings.host}, port={settings.port}, debug={settings.debug}")
-
 app = FastAPI(
     title="LarkEditor Web",
     description="Web-based EBNF grammar editor for Lark parsing library",
@@ -35,15 +30,22 @@ app.add_middleware(
 )
 
 # Mount static files
-logger.info("Mounting static files...")
 app.mount("/static", StaticFiles(directory="app/static"), name="static")
 
-# Setup templates
-logger.info("Setting up templates...")
-templates = Jinja2Templates(directory="app/templates")
+# Page templates, loaded with jinja2 on the first page request
+_templates = None
+
+
+def get_templates():
+    """Get the page templates."""
+    global _templates
+    if _templates is None:
+        from fastapi.templating import Jinja2Templates
+        _templates = Jinja2Templates(directory="app/templates")
+    return _templates
+
 
 # Include routers
-logger.info("Including API routers...")
 app.include_router(parsing.router, prefix="/api", tags=["parsing"])
 app.include_router(files.router, prefix="/api", tags=["files"])
 app.include_router(health.router, prefix="/api", tags=["health"])
@@ -54,12 +56,26 @@ app.include_router(parsing_ws.router, prefix="/ws", tags=["websockets"])
 async def root(request: Request):
     """Serve the main editor interface."""
     logger.debug("Serving main editor interface")
-    return templates.TemplateResponse("index.html", {"request": request})
+    return get_templates().TemplateResponse("index.html", {"request": request})
 
 
 @app.on_event("startup")
 async def startup_event():
     """Application startup event."""
+    setup_logging(settings)
+    logger.info("Starting LarkEditor Web application...")
+    logger.debug(f"Settings: host={settings.host}, port={settings.port}, debug={settings.debug}")
+    from .core.state import get_session_manager
+    if settings.workers > 1 and settings.session_backend == "memory":
+        logger.warning("Running several workers with the memory session backend; sessions will not be shared")
+    session_manager = get_session_manager()
+    # Per-session parse state goes when its session is discarded
+    if parsing_ws.parse_manager.forget not in session_manager.discard_listeners:
+        session_manager.discard_listeners.append(parsing_ws.parse_manager.forget)
+    await session_manager.start()
+    # Compile hot grammars in the background; /api/ready reports progress
+    from .core.warmup import start_warmup
+    start_warmup()
     logger.info("LarkEditor Web application started successfully")
     logger.info(f"Available at: http://{settings.host}:{settings.port}")
     logger.info(f"API docs at: http://{settings.host}:{settings.port}/api/docs")
@@ -69,20 +85,32 @@ async def startup_event():
 async def shutdown_event():
     """Application shutdown event."""
     logger.info("Shutting down LarkEditor Web application...")
+    from .core.warmup import stop_warmup
+    await stop_warmup()
     # Cleanup session manager
     from .core.state import get_session_manager
     session_manager = get_session_manager()
     await session_manager.shutdown()
+    from .core.record_split import shutdown_record_pool
+    shutdown_record_pool()
     logger.info("Application shutdown complete")
+    # Write out queued log records before the process exits
+    from .core.logs import stop_logging
+    stop_logging()
 
 
 if __name__ == "__main__":
     import uvicorn
+    setup_logging(settings)
     logger.info("Starting application with uvicorn...")
     uvicorn.run(
         "app.main:app",
         host=settings.host,
         port=settings.port,
         reload=settings.debug,
-        log_level="debug" if settings.debug else "info"
+        # Reload mode always runs a single worker
+        workers=1 if settings.debug else settings.workers,
+        log_level="debug" if settings.debug else "info",
+        # Large messages are compressed by the application (see websockets.connection)
+        ws_per_message_deflate=False
     )
\ No newline at end of file
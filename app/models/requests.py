@@ -1,7 +1,7 @@
 """Request models for the LarkEditor API."""
 
 from typing import Optional, Dict, Any, List
-from pydantic import BaseModel, Field, validator
+from pydantic import BaseModel, Field, validator, root_validator
 from enum import Enum
 
 
@@ -17,20 +17,41 @@ class ParseSettings(BaseModel):
     parser: ParserType = ParserType.EARLEY
     start_rule: str = Field(default="start", min_length=1, max_length=100)
     debug: bool = False
+    # Record-split mode: parse records between separators in parallel
+    record_separator: Optional[str] = Field(None, min_length=1, max_length=100, description="Terminal separating independent records")
+    record_rule: Optional[str] = Field(None, min_length=1, max_length=100, description="Rule each record is parsed with")
     
     @validator('start_rule')
     def validate_start_rule(cls, v):
         if not v.replace('_', '').replace('-', '').isalnum():
             raise ValueError('Start rule must be alphanumeric with underscores and hyphens')
         return v
+    
+    @root_validator(skip_on_failure=True)
+    def validate_record_split(cls, values):
+        if values.get('record_separator') and not values.get('record_rule'):
+            raise ValueError('record_rule is required when record_separator is set')
+        return values
 
 
 class ParseRequest(BaseModel):
-    """Request to parse grammar with text input."""
-    grammar: str = Field(..., min_length=1, max_length=10*1024*1024, description="Lark grammar definition")
-    text: str = Field(..., max_length=1024*1024, description="Text to parse")
+    """Request to parse grammar with text input.
+    
+    Grammar and text are given inline or as ids of uploaded files.
+    """
+    grammar: Optional[str] = Field(None, min_length=1, max_length=10*1024*1024, description="Lark grammar definition")
+    text: Optional[str] = Field(None, max_length=1024*1024, description="Text to parse")
+    grammar_id: Optional[str] = Field(None, description="Content id of an uploaded grammar")
+    text_id: Optional[str] = Field(None, description="Content id of an uploaded text")
     settings: ParseSettings = ParseSettings()
     session_id: Optional[str] = Field(None, description="Session ID for state management")
+    
+    @root_validator(skip_on_failure=True)
+    def validate_sources(cls, values):
+        for name in ("grammar", "text"):
+            if (values.get(name) is None) == (values.get(f"{name}_id") is None):
+                raise ValueError(f"Provide exactly one of {name} and {name}_id")
+        return values
 
 
 class GrammarValidationRequest(BaseModel):
@@ -61,8 +82,11 @@ class SessionRequest(BaseModel):
     settings: ParseSettings = ParseSettings()
 
 
+EXPORT_FORMAT_PATTERN = "^(json|xml|dot|text)$"
+
+
 class ExportRequest(BaseModel):
     """Request to export AST or results."""
-    format: str = Field(..., pattern="^(json|xml|dot|png)$")
+    format: str = Field(..., pattern=EXPORT_FORMAT_PATTERN)
     session_id: str
     include_metadata: bool = False
\ No newline at end of file
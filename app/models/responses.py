@@ -56,7 +56,9 @@ class ParseResult(BaseModel):
     error: Optional[ParseError] = None
     parse_time: float = Field(..., description="Parse time in seconds")
     grammar_hash: str = Field(..., description="Hash of grammar for caching")
+    text_hash: Optional[str] = Field(None, description="Hash of the parsed text")
     timestamp: datetime = Field(default_factory=datetime.now)
+    record_errors: Optional[List[ParseError]] = Field(None, description="Failed records in record-split mode")
 
 
 class GrammarValidationResult(BaseModel):
@@ -68,6 +70,31 @@ class GrammarValidationResult(BaseModel):
     terminal_count: int
 
 
+class GrammarSymbol(BaseModel):
+    """A rule or terminal name at a position in grammar source."""
+    name: str
+    kind: str = Field(..., description="rule or terminal")
+    line: int
+    column: int
+    start_pos: int
+
+
+class GrammarImport(BaseModel):
+    """An %import statement and the names it defines."""
+    module: str
+    names: List[str]
+    line: int
+
+
+class SymbolIndex(BaseModel):
+    """Symbols of a grammar, found without compiling it."""
+    digest: str = Field(..., description="Hash of the indexed grammar")
+    definitions: List[GrammarSymbol] = []
+    references: List[GrammarSymbol] = []
+    imports: List[GrammarImport] = []
+    undefined: List[str] = Field([], description="Names referenced but never defined or imported")
+
+
 class SessionInfo(BaseModel):
     """Information about editing session."""
     session_id: str
@@ -81,9 +108,12 @@ class SessionInfo(BaseModel):
 
 class FileInfo(BaseModel):
     """Information about uploaded/downloaded files."""
+    id: Optional[str] = None  # upload id in the upload store
+    digest: Optional[str] = None  # SHA-256 of the content
     filename: str
     size: int
     content_type: str
+    file_type: Optional[str] = None
     upload_time: datetime
     session_id: Optional[str] = None
 
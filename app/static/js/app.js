@@ -11,6 +11,8 @@ class LarkEditorApp {
     constructor() {
         this.sessionId = this.generateSessionId();
         this.isConnected = false;
+        // Last document version sent to the server, per editor
+        this.sentVersions = { grammar: null, text: null };
         this.parseDebounceTimer = null;
         
         // Initialize components
@@ -110,6 +112,10 @@ class LarkEditorApp {
             this.exportResults();
         });
         
+        document.getElementById('download-standalone').addEventListener('click', () => {
+            this.downloadStandalone();
+        });
+        
         document.getElementById('help-button').addEventListener('click', () => {
             this.showOnboardingManual();
         });
@@ -175,15 +181,15 @@ class LarkEditorApp {
     
     setupEditorHandlers() {
         // Grammar editor changes
-        this.editorManager.onGrammarChange((content) => {
+        this.editorManager.onGrammarChange((content, changes, version) => {
             this.updateGrammarInfo(content);
-            this.sendContentChange('grammar', content);
+            this.sendContentChange('grammar', content, changes, version);
         });
         
         // Text editor changes
-        this.editorManager.onTextChange((content) => {
+        this.editorManager.onTextChange((content, changes, version) => {
             this.updateTextInfo(content);
-            this.sendContentChange('text', content);
+            this.sendContentChange('text', content, changes, version);
         });
     }
     
@@ -191,6 +197,8 @@ class LarkEditorApp {
         this.websocketClient.onConnect(() => {
             console.log('WebSocket connected successfully');
             this.isConnected = true;
+            // A (re)connected server may not hold our documents any more
+            this.sentVersions = { grammar: null, text: null };
             this.updateConnectionStatus(true);
             this.updateStatus('Connected', 'success');
             
@@ -234,6 +242,14 @@ class LarkEditorApp {
             this.handleSessionInfo(info);
         });
         
+        this.websocketClient.onResyncRequired((info) => {
+            this.handleResyncRequired(info);
+        });
+        
+        this.websocketClient.onSymbolIndex((index) => {
+            this.editorManager.setSymbolIndex(index);
+        });
+        
         this.websocketClient.onError((error) => {
             console.error('WebSocket error:', error);
             this.updateStatus(`Error: ${error.error}`, 'error');
@@ -303,11 +319,41 @@ class LarkEditorApp {
         });
     }
     
-    sendContentChange(type, content) {
+    sendContentChange(type, content, changes = null, version = null) {
         if (!this.isConnected) return;
         
-        const messageType = type === 'grammar' ? 'grammar_change' : 'text_change';
-        this.websocketClient.send(messageType, { content });
+        // Offsets are UTF-16 units on the client but code points on the server,
+        // so documents containing surrogate pairs are always sent whole
+        const baseVersion = this.sentVersions[type];
+        const canSendDelta = changes && baseVersion !== null && version !== null &&
+                             !/[\uD800-\uDFFF]/.test(content);
+        
+        let sent;
+        if (canSendDelta) {
+            sent = this.websocketClient.send('content_delta', {
+                target: type,
+                base_version: baseVersion,
+                version: version,
+                changes: changes
+            });
+        } else {
+            const messageType = type === 'grammar' ? 'grammar_change' : 'text_change';
+            sent = this.websocketClient.send(messageType, { content, version });
+        }
+        this.sentVersions[type] = sent ? version : null;
+    }
+    
+    handleResyncRequired(info) {
+        // Server buffer diverged; resend the full document
+        console.log(`Resyncing ${info.target} (server at version ${info.version})`);
+        this.sentVersions[info.target] = null;
+        if (info.target === 'grammar') {
+            const model = this.editorManager.grammarEditor.getModel();
+            this.sendContentChange('grammar', model.getValue(), null, model.getVersionId());
+        } else {
+            const model = this.editorManager.textEditor.getModel();
+            this.sendContentChange('text', model.getValue(), null, model.getVersionId());
+        }
     }
     
     onSettingsChange() {
@@ -430,6 +476,11 @@ class LarkEditorApp {
     handleSessionInfo(info) {
         // Update connection count or other session info if needed
         console.log('Session info:', info);
+        
+        // Coalesce keystrokes for part of the server's adaptive parse delay
+        if (typeof info.debounce_delay === 'number') {
+            this.editorManager.setChangeDebounce(info.debounce_delay * 1000 / 2);
+        }
     }
     
     updateGrammarInfo(content) {
@@ -485,21 +536,17 @@ class LarkEditorApp {
     async exportResults() {
         try {
             const format = 'json'; // Could be made configurable
-            const response = await fetch('/api/export', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                },
-                body: JSON.stringify({
-                    format: format,
-                    session_id: this.sessionId,
-                    include_metadata: true
-                })
-            });
+            // GET lets the browser revalidate repeat downloads with If-None-Match
+            const params = new URLSearchParams({ format: format, include_metadata: 'true' });
+            const response = await fetch(`/api/export/${encodeURIComponent(this.sessionId)}?${params}`);
             
             if (response.ok) {
-                const result = await response.json();
-                this.fileManager.downloadFile(result.content, result.filename, result.content_type);
+                // The export is streamed as a file download; the name comes from Content-Disposition
+                const disposition = response.headers.get('Content-Disposition') || '';
+                const match = disposition.match(/filename="([^"]+)"/);
+                const filename = match ? match[1] : `parse_result.${format}`;
+                const blob = await response.blob();
+                this.fileManager.downloadFile(blob, filename, blob.type);
                 this.updateStatus('Results exported', 'success');
             } else {
                 throw new Error('Export failed');
@@ -511,6 +558,28 @@ class LarkEditorApp {
         }
     }
     
+    async downloadStandalone() {
+        try {
+            const response = await fetch(`/api/standalone/${encodeURIComponent(this.sessionId)}`);
+            
+            if (response.ok) {
+                const disposition = response.headers.get('Content-Disposition') || '';
+                const match = disposition.match(/filename="([^"]+)"/);
+                const filename = match ? match[1] : 'lark_parser.py';
+                const blob = await response.blob();
+                this.fileManager.downloadFile(blob, filename, blob.type);
+                this.updateStatus('Standalone parser downloaded', 'success');
+            } else {
+                const error = await response.json();
+                throw new Error(error.detail || 'Standalone generation failed');
+            }
+            
+        } catch (error) {
+            console.error('Standalone parser error:', error);
+            this.updateStatus(error.message, 'error');
+        }
+    }
+    
     // Onboarding Methods
     checkAndShowOnboarding() {
         if (this.onboardingEnabled) {
@@ -9,6 +9,10 @@ export class EditorManager {
         this.grammarChangeCallback = null;
         this.textChangeCallback = null;
         this.decorationIds = [];
+        // Latest grammar symbols from the server, for completion and go-to-definition
+        this.symbolIndex = null;
+        // Client-side coalescing only; the server picks the real parse delay
+        this.changeDebounceMs = 100;
     }
     
     async init() {
@@ -199,36 +203,101 @@ export class EditorManager {
         
         // Apply theme
         monaco.editor.setTheme('lark-theme');
+        
+        this.registerSymbolProviders();
     }
     
-    setupChangeListeners() {
-        let grammarChangeTimer = null;
-        let textChangeTimer = null;
-        
-        // Grammar editor changes with debouncing
-        this.grammarEditor.onDidChangeModelContent(() => {
-            if (grammarChangeTimer) {
-                clearTimeout(grammarChangeTimer);
+    registerSymbolProviders() {
+        monaco.languages.registerCompletionItemProvider('lark', {
+            provideCompletionItems: (model, position) => {
+                if (!this.symbolIndex) {
+                    return { suggestions: [] };
+                }
+                const word = model.getWordUntilPosition(position);
+                const range = new monaco.Range(
+                    position.lineNumber, word.startColumn, position.lineNumber, word.endColumn
+                );
+                const seen = new Set();
+                const suggestions = [];
+                for (const symbol of this.symbolIndex.definitions) {
+                    if (seen.has(symbol.name)) {
+                        continue;
+                    }
+                    seen.add(symbol.name);
+                    suggestions.push({
+                        label: symbol.name,
+                        kind: symbol.kind === 'terminal'
+                            ? monaco.languages.CompletionItemKind.Constant
+                            : monaco.languages.CompletionItemKind.Function,
+                        detail: `${symbol.kind}, line ${symbol.line}`,
+                        insertText: symbol.name,
+                        range
+                    });
+                }
+                return { suggestions };
             }
-            
-            grammarChangeTimer = setTimeout(() => {
-                if (this.grammarChangeCallback) {
-                    this.grammarChangeCallback(this.grammarEditor.getValue());
+        });
+        
+        monaco.languages.registerDefinitionProvider('lark', {
+            provideDefinition: (model, position) => {
+                const word = model.getWordAtPosition(position);
+                if (!this.symbolIndex || !word) {
+                    return null;
+                }
+                const symbol = this.symbolIndex.definitions.find((definition) => definition.name === word.word);
+                if (!symbol) {
+                    return null;
                 }
-            }, 500); // 500ms debounce
+                return {
+                    uri: model.uri,
+                    range: new monaco.Range(
+                        symbol.line, symbol.column, symbol.line, symbol.column + symbol.name.length
+                    )
+                };
+            }
         });
+    }
+    
+    setSymbolIndex(index) {
+        this.symbolIndex = index;
+    }
+    
+    setupChangeListeners() {
+        this.watchEditor(this.grammarEditor, () => this.grammarChangeCallback);
+        this.watchEditor(this.textEditor, () => this.textChangeCallback);
+    }
+    
+    watchEditor(editor, getCallback) {
+        let changeTimer = null;
+        // Range edits since the last flush, or null when only a full snapshot is valid
+        let pendingChanges = [];
         
-        // Text editor changes with debouncing
-        this.textEditor.onDidChangeModelContent(() => {
-            if (textChangeTimer) {
-                clearTimeout(textChangeTimer);
+        editor.onDidChangeModelContent((event) => {
+            if (event.isFlush || pendingChanges === null) {
+                pendingChanges = null;
+            } else {
+                // Monaco orders changes so they can be applied one after another
+                for (const change of event.changes) {
+                    pendingChanges.push({
+                        range_offset: change.rangeOffset,
+                        range_length: change.rangeLength,
+                        text: change.text
+                    });
+                }
+            }
+            
+            if (changeTimer) {
+                clearTimeout(changeTimer);
             }
             
-            textChangeTimer = setTimeout(() => {
-                if (this.textChangeCallback) {
-                    this.textChangeCallback(this.textEditor.getValue());
+            changeTimer = setTimeout(() => {
+                const callback = getCallback();
+                const changes = pendingChanges;
+                pendingChanges = [];
+                if (callback) {
+                    callback(editor.getValue(), changes, editor.getModel().getVersionId());
                 }
-            }, 500); // 500ms debounce
+            }, this.changeDebounceMs);
         });
     }
     
@@ -286,6 +355,10 @@ start: expr
         return `2 + 3 * (4 - 1)`;
     }
     
+    setChangeDebounce(ms) {
+        this.changeDebounceMs = Math.min(Math.max(ms, 50), 500);
+    }
+    
     onGrammarChange(callback) {
         this.grammarChangeCallback = callback;
     }
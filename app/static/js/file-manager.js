@@ -139,9 +139,10 @@ export class FileManager {
         }
     }
     
-    async downloadFileFromServer(filename) {
+    async downloadFileFromServer(fileId, filename = fileId) {
         try {
-            const response = await fetch(`/api/download/${encodeURIComponent(filename)}`);
+            // fileId is the upload id returned by uploadFileToServer
+            const response = await fetch(`/api/download/${encodeURIComponent(fileId)}`);
             
             if (!response.ok) {
                 throw new Error(`Download failed: ${response.statusText}`);
@@ -16,6 +16,8 @@ export class WebSocketClient {
         this.onParseResultCallback = null;
         this.onParseErrorCallback = null;
         this.onSessionInfoCallback = null;
+        this.onResyncRequiredCallback = null;
+        this.onSymbolIndexCallback = null;
         this.onErrorCallback = null;
     }
     
@@ -30,8 +32,16 @@ export class WebSocketClient {
                 const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
                 const wsUrl = `${protocol}//${window.location.host}/ws/parsing`;
                 
+                // Offer compressed frames only if the browser can inflate them
+                const subprotocols = typeof DecompressionStream !== 'undefined'
+                    ? ['larkeditor.deflate', 'larkeditor.json']
+                    : ['larkeditor.json'];
+                
                 console.log(`Connecting to WebSocket: ${wsUrl}`);
-                this.socket = new WebSocket(wsUrl);
+                this.socket = new WebSocket(wsUrl, subprotocols);
+                this.socket.binaryType = 'arraybuffer';
+                // Decoding is async; chain it so messages are handled in order
+                this.receiveChain = Promise.resolve();
                 
                 this.socket.onopen = () => {
                     console.log('WebSocket connected successfully');
@@ -45,7 +55,10 @@ export class WebSocketClient {
                 };
                 
                 this.socket.onmessage = (event) => {
-                    this.handleMessage(event.data);
+                    this.receiveChain = this.receiveChain
+                        .then(() => this.decodeMessage(event.data))
+                        .then((data) => this.handleMessage(data))
+                        .catch((error) => console.error('Failed to decode WebSocket message:', error));
                 };
                 
                 this.socket.onclose = (event) => {
@@ -93,6 +106,15 @@ export class WebSocketClient {
         }, delay);
     }
     
+    async decodeMessage(data) {
+        // Large messages arrive as zlib-compressed binary frames
+        if (typeof data === 'string') {
+            return data;
+        }
+        const stream = new Blob([data]).stream().pipeThrough(new DecompressionStream('deflate'));
+        return new Response(stream).text();
+    }
+    
     handleMessage(data) {
         try {
             const message = JSON.parse(data);
@@ -116,6 +138,18 @@ export class WebSocketClient {
                     }
                     break;
                     
+                case 'resync_required':
+                    if (this.onResyncRequiredCallback) {
+                        this.onResyncRequiredCallback(message.data);
+                    }
+                    break;
+                    
+                case 'symbol_index':
+                    if (this.onSymbolIndexCallback) {
+                        this.onSymbolIndexCallback(message.data);
+                    }
+                    break;
+                    
                 case 'error':
                     if (this.onErrorCallback) {
                         this.onErrorCallback(message.data);
@@ -180,6 +214,14 @@ export class WebSocketClient {
         this.onSessionInfoCallback = callback;
     }
     
+    onResyncRequired(callback) {
+        this.onResyncRequiredCallback = callback;
+    }
+    
+    onSymbolIndex(callback) {
+        this.onSymbolIndexCallback = callback;
+    }
+    
     onError(callback) {
         this.onErrorCallback = callback;
     }
@@ -0,0 +1,234 @@
+"""Negotiated message encoding and queued delivery for WebSocket connections."""
+
+import asyncio
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, Iterable, Optional, Tuple
+
+from fastapi import WebSocket
+
+from ..core.config import get_settings, get_logger
+from ..core.serialization import EncodedMessage
+
+settings = get_settings()
+logger = get_logger("websocket.connection")
+
+# Subprotocols offered by the client, in order of preference
+DEFLATE_SUBPROTOCOL = "larkeditor.deflate"
+JSON_SUBPROTOCOL = "larkeditor.json"
+
+
+@dataclass
+class CompressionStats:
+    """Counters for outgoing WebSocket message encoding."""
+    messages: int = 0
+    compressed_messages: int = 0
+    raw_bytes: int = 0
+    sent_bytes: int = 0
+    compression_input_bytes: int = 0
+    compression_output_bytes: int = 0
+    compression_time: float = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Summarize counters, including derived ratios."""
+        ratio = (
+            self.compression_output_bytes / self.compression_input_bytes
+            if self.compression_input_bytes else None
+        )
+        return {
+            "messages": self.messages,
+            "compressed_messages": self.compressed_messages,
+            "raw_bytes": self.raw_bytes,
+            "sent_bytes": self.sent_bytes,
+            "compression_ratio": ratio,
+            "compression_time": self.compression_time,
+        }
+
+
+@dataclass
+class SendQueueStats:
+    """Counters for per-connection outbound queues."""
+    queued_messages: int = 0
+    replaced_messages: int = 0
+    dropped_connections: int = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return counters as a dict."""
+        return {
+            "queued_messages": self.queued_messages,
+            "replaced_messages": self.replaced_messages,
+            "dropped_connections": self.dropped_connections,
+        }
+
+
+compression_stats = CompressionStats()
+queue_stats = SendQueueStats()
+
+
+def negotiate_subprotocol(offered: Iterable[str]) -> Optional[str]:
+    """Pick the subprotocol to accept from those the client offered."""
+    offered = list(offered)
+    if settings.ws_compression and DEFLATE_SUBPROTOCOL in offered:
+        return DEFLATE_SUBPROTOCOL
+    if JSON_SUBPROTOCOL in offered:
+        return JSON_SUBPROTOCOL
+    return None
+
+
+class ClientConnection:
+    """WebSocket wrapper with its own bounded outbound queue and writer task.
+
+    Messages at or above ``ws_compression_threshold`` bytes are sent as
+    zlib-compressed binary frames when the client negotiated compression;
+    everything else goes out as a plain JSON text frame.
+
+    Sending never blocks the caller. A message enqueued with a
+    ``replace_key`` replaces any unsent message with the same key, so a
+    client that falls behind only receives the latest parse result. A
+    client whose queue overflows or whose sends stall past
+    ``ws_send_timeout`` is dropped and its socket closed.
+    """
+
+    def __init__(self, websocket: WebSocket, compress: bool = False):
+        self.websocket = websocket
+        self.compress = compress
+        self.queue: Deque[Tuple[Optional[str], EncodedMessage]] = deque()
+        self.closed = False
+        self._wakeup = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._writer: Optional[asyncio.Task] = None
+        # Closes the socket of a dropped consumer; kept so it is not garbage collected
+        self._close_task: Optional[asyncio.Task] = None
+
+    @property
+    def client(self):
+        return self.websocket.client
+
+    async def send_json(self, message: Dict[str, Any], replace_key: Optional[str] = None):
+        """Serialize and queue a message for this connection."""
+        self.enqueue(EncodedMessage(message), replace_key)
+
+    def enqueue(self, encoded: EncodedMessage, replace_key: Optional[str] = None) -> bool:
+        """Queue an already serialized message.
+
+        Returns False if the connection is closed or was just dropped as
+        a slow consumer.
+        """
+        if self.closed:
+            return False
+
+        if replace_key is not None:
+            for index, (key, _) in enumerate(self.queue):
+                if key == replace_key:
+                    self.queue[index] = (replace_key, encoded)
+                    queue_stats.replaced_messages += 1
+                    return True
+
+        if len(self.queue) >= settings.ws_send_queue_size:
+            self._drop(f"send queue full ({len(self.queue)} messages)")
+            return False
+
+        self.queue.append((replace_key, encoded))
+        queue_stats.queued_messages += 1
+        self._idle.clear()
+        self._wakeup.set()
+        if self._writer is None:
+            self._writer = asyncio.create_task(self._write_loop())
+        return True
+
+    async def drain(self):
+        """Wait until every queued message has been sent or discarded."""
+        await self._idle.wait()
+
+    async def close(self):
+        """Stop the writer task and discard unsent messages."""
+        self.closed = True
+        self.queue.clear()
+        self._idle.set()
+        if self._writer is not None and not self._writer.done():
+            self._writer.cancel()
+            try:
+                await self._writer
+            except asyncio.CancelledError:
+                pass
+        if self._close_task is not None:
+            await self._close_task
+
+    def _drop(self, reason: str):
+        """Disconnect a consumer that cannot keep up."""
+        logger.warning(f"Dropping slow WebSocket consumer: {reason}")
+        queue_stats.dropped_connections += 1
+        self.closed = True
+        self.queue.clear()
+        self._idle.set()
+        if self._writer is not None and self._writer is not asyncio.current_task():
+            self._writer.cancel()
+        if self._close_task is None:
+            self._close_task = asyncio.create_task(self._close_socket())
+
+    async def _close_socket(self):
+        try:
+            await self.websocket.close(code=1013)  # Try again later
+        except Exception as e:
+            logger.debug(f"Error closing dropped WebSocket: {e}")
+
+    async def _write_loop(self):
+        """Send queued messages in order until the connection closes."""
+        while not self.closed:
+            if not self.queue:
+                self._idle.set()
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            _, encoded = self.queue.popleft()
+            # asyncio.wait_for can swallow a cancellation that arrives as the
+            # send completes, leaving the writer waiting forever; wait does not
+            send = asyncio.ensure_future(self._send(encoded))
+            try:
+                done, _ = await asyncio.wait({send}, timeout=settings.ws_send_timeout)
+            except asyncio.CancelledError:
+                send.cancel()
+                raise
+            if not done:
+                send.cancel()
+                self._drop(f"send stalled for {settings.ws_send_timeout}s")
+                return
+            try:
+                send.result()
+            except Exception as e:
+                # The endpoint's receive loop notices the disconnect and cleans up
+                logger.debug(f"WebSocket send failed: {e}")
+                self.closed = True
+                self.queue.clear()
+                self._idle.set()
+                return
+
+    async def _send(self, encoded: EncodedMessage):
+        """Write one frame using the negotiated encoding."""
+        payload = encoded.payload
+        compression_stats.messages += 1
+        compression_stats.raw_bytes += len(payload)
+
+        if self.compress and len(payload) >= settings.ws_compression_threshold:
+            # A broadcast message is compressed once and reused for every connection
+            already_deflated = encoded.is_deflated
+            start_time = time.perf_counter()
+            if len(payload) >= settings.ws_compression_thread_threshold:
+                # Compressing a large tree takes long enough to stall other connections
+                compressed = await encoded.deflate_in_thread(settings.ws_compression_level)
+            else:
+                compressed = encoded.deflate(settings.ws_compression_level)
+            if not already_deflated:
+                compression_stats.compression_time += time.perf_counter() - start_time
+                compression_stats.compression_input_bytes += len(payload)
+                compression_stats.compression_output_bytes += len(compressed)
+                logger.debug("Compressed message %s -> %s bytes", len(payload), len(compressed))
+            compression_stats.compressed_messages += 1
+            compression_stats.sent_bytes += len(compressed)
+            await self.websocket.send_bytes(compressed)
+        else:
+            compression_stats.sent_bytes += len(payload)
+            await self.websocket.send_text(encoded.text)
@@ -2,16 +2,23 @@
 
 import asyncio
 import json
-from typing import Dict, Optional
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from datetime import datetime
+from dataclasses import dataclass
 
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-from pydantic import BaseModel, ValidationError
+from pydantic import BaseModel, Field, ValidationError, root_validator
 
 from ..models.requests import ParseSettings, ParserType
 from ..models.responses import WebSocketMessage, ParseResult
-from ..core.parser import get_parser
-from ..core.state import get_session_manager
+from ..core.parser import get_parser, ParseCancelledError
+from ..core.state import get_session_manager, EditorSession
+from ..core.document import VersionMismatchError
+from ..core.file_store import get_file_store
+from ..core.symbols import get_symbol_indexer
+from .connection import ClientConnection, negotiate_subprotocol, DEFLATE_SUBPROTOCOL
 from ..core.config import get_settings, get_logger
 
 router = APIRouter()
@@ -23,17 +30,61 @@ class WSMessageType:
     """WebSocket message types."""
     GRAMMAR_CHANGE = "grammar_change"
     TEXT_CHANGE = "text_change"
+    CONTENT_DELTA = "content_delta"
     SETTINGS_CHANGE = "settings_change"
     FORCE_PARSE = "force_parse"
     PARSE_RESULT = "parse_result"
     PARSE_ERROR = "parse_error"
     SESSION_INFO = "session_info"
+    RESYNC_REQUIRED = "resync_required"
+    SYMBOL_INDEX = "symbol_index"
     ERROR = "error"
 
 
 class ContentChangeData(BaseModel):
-    """Data for content change messages."""
-    content: str
+    """Data for content change messages.
+    
+    The new content is sent inline or named by ``file_id``, the content
+    id of an uploaded file.
+    """
+    content: Optional[str] = None
+    file_id: Optional[str] = None
+    version: Optional[int] = None
+    
+    @root_validator(skip_on_failure=True)
+    def validate_source(cls, values):
+        if (values.get("content") is None) == (values.get("file_id") is None):
+            raise ValueError("Provide exactly one of content and file_id")
+        return values
+
+
+class UnknownFileError(LookupError):
+    """A content change referenced a file that is not in the upload store."""
+
+
+async def _load_content(content_data: ContentChangeData) -> str:
+    """Get the new document text, reading it from the upload store if referenced."""
+    if content_data.file_id is None:
+        return content_data.content
+    content = await get_file_store().load_text(content_data.file_id)
+    if content is None:
+        raise UnknownFileError(content_data.file_id)
+    return content
+
+
+class TextEdit(BaseModel):
+    """Single range replacement, as reported by Monaco."""
+    range_offset: int = Field(..., ge=0)
+    range_length: int = Field(..., ge=0)
+    text: str
+
+
+class ContentDeltaData(BaseModel):
+    """Data for incremental content change messages."""
+    target: str = Field(..., pattern="^(grammar|text)$")
+    base_version: int
+    version: int
+    changes: List[TextEdit]
 
 
 class SettingsChangeData(BaseModel):
@@ -41,6 +92,9 @@ class SettingsChangeData(BaseModel):
     parser: Optional[ParserType] = None
     start_rule: Optional[str] = None
     debug: Optional[bool] = None
+    # An empty string turns record-split mode off
+    record_separator: Optional[str] = None
+    record_rule: Optional[str] = None
 
 
 class IncomingMessage(BaseModel):
@@ -50,72 +104,234 @@ class IncomingMessage(BaseModel):
     data: Dict
 
 
+@dataclass
+class SessionLatency:
+    """Moving averages of measured parse latency for one session."""
+    compile_avg: Optional[float] = None  # parses following a grammar change
+    parse_avg: Optional[float] = None    # parses reusing a compiled grammar
+    debounce_delay: Optional[float] = None
+    
+    def record(self, elapsed: float, grammar_changed: bool):
+        """Fold a new latency sample into the matching moving average."""
+        alpha = settings.debounce_smoothing
+        if grammar_changed:
+            self.compile_avg = elapsed if self.compile_avg is None else alpha * elapsed + (1 - alpha) * self.compile_avg
+        else:
+            self.parse_avg = elapsed if self.parse_avg is None else alpha * elapsed + (1 - alpha) * self.parse_avg
+    
+    def expected_latency(self, grammar_changed: bool) -> Optional[float]:
+        """Estimate the latency of the next parse."""
+        if grammar_changed and self.compile_avg is not None:
+            return self.compile_avg
+        return self.parse_avg if self.parse_avg is not None else self.compile_avg
+
+
 class ParseManager:
     """Manages debounced parsing operations."""
     
     def __init__(self):
         self.parse_timers: Dict[str, asyncio.Task] = {}
+        self.generations: Dict[str, int] = {}
+        self.latencies: Dict[str, SessionLatency] = {}
+        # Raised text limits for sessions whose text was loaded by file id
+        self.text_limits: Dict[str, int] = {}
+        self.active_parses = 0
         self.debounce_delay = settings.debounce_delay
         logger.info(f"Initialized ParseManager with debounce_delay={self.debounce_delay}s")
     
+    def get_debounce_delay(self, session_id: str, grammar_changed: bool = False) -> float:
+        """Compute the debounce delay for a session's next parse.
+        
+        The delay scales with the session's measured latency and with the
+        number of parses currently running, so cheap documents re-parse
+        almost immediately while expensive ones are parsed less often.
+        """
+        latency = self.latencies.get(session_id)
+        expected = latency.expected_latency(grammar_changed) if latency else None
+        if expected is None:
+            return self.debounce_delay
+        
+        load_factor = 1 + self.active_parses / (os.cpu_count() or 1)
+        delay = expected * settings.debounce_latency_factor * load_factor
+        return min(max(delay, settings.debounce_min_delay), settings.debounce_max_delay)
+    
+    def get_reported_delay(self, session_id: str) -> float:
+        """Get the delay last chosen for a session, for session_info."""
+        latency = self.latencies.get(session_id)
+        if latency is None or latency.debounce_delay is None:
+            return self.get_debounce_delay(session_id)
+        return latency.debounce_delay
+    
+    async def timed_parse(
+        self,
+        session_id: str,
+        grammar: str,
+        text: str,
+        parse_settings: ParseSettings,
+        generation: int,
+        grammar_changed: bool = False
+    ):
+        """Run a parse for a session and record its latency."""
+        parser = get_parser()
+        self.active_parses += 1
+        start_time = time.time()
+        try:
+            result = await parser.parse_async(
+                grammar, text, parse_settings,
+                should_abort=lambda: not self.is_current(session_id, generation),
+                max_text_length=self.text_limits.get(session_id)
+            )
+        finally:
+            self.active_parses -= 1
+        
+        latency = self.latencies.setdefault(session_id, SessionLatency())
+        latency.record(time.time() - start_time, grammar_changed)
+        return result
+    
+    def supersede(self, session_id: str) -> int:
+        """Invalidate pending and in-flight parses for a session.
+        
+        Returns the new generation number; only work started with this
+        generation may publish its result.
+        """
+        generation = self.generations.get(session_id, 0) + 1
+        self.generations[session_id] = generation
+        
+        # Cancel existing timer
+        if session_id in self.parse_timers:
+            self.parse_timers[session_id].cancel()
+            logger.debug("Cancelled existing parse timer for session %.8s...", session_id)
+        
+        return generation
+    
+    def is_current(self, session_id: str, generation: int) -> bool:
+        """Check whether a parse generation is still the latest for a session."""
+        return self.generations.get(session_id) == generation
+    
     async def handle_content_change(
         self, 
         session_id: str, 
         grammar: str, 
         text: str, 
-        parse_settings: ParseSettings
+        parse_settings: ParseSettings,
+        grammar_changed: bool = False,
+        versions: Optional[Tuple[int, int]] = None
     ):
-        """Handle content change with debouncing."""
-        logger.debug(f"Content change for session {session_id[:8]}... grammar({len(grammar)}), text({len(text)})")
+        """Handle content change with debouncing.
         
-        # Cancel existing timer
-        if session_id in self.parse_timers:
-            self.parse_timers[session_id].cancel()
-            logger.debug(f"Cancelled existing parse timer for session {session_id[:8]}...")
+        ``versions`` are the (grammar, text) document versions of the
+        content; the result is dropped if the session has moved past them.
+        """
+        logger.debug("Content change for session %.8s... grammar(%s), text(%s)", session_id, len(grammar), len(text))
+        self._schedule(session_id, lambda: (grammar, text, parse_settings, versions), grammar_changed)
+    
+    def handle_session_change(self, session: EditorSession, grammar_changed: bool = False):
+        """Schedule a debounced parse of a session's current documents.
+        
+        The documents are read when the debounce fires, so a burst of
+        incremental edits materializes the text only once.
+        """
+        logger.debug("Content change for session %.8s... (deferred read)", session.session_id)
+        self._schedule(
+            session.session_id,
+            lambda: (session.grammar_content, session.text_content, session.parse_settings, session.content_versions()),
+            grammar_changed
+        )
+    
+    def handle_force_parse(self, session: EditorSession):
+        """Parse a session's current documents without waiting for the debounce."""
+        self._schedule(
+            session.session_id,
+            lambda: (session.grammar_content, session.text_content, session.parse_settings, session.content_versions()),
+            grammar_changed=False,
+            delay=0.0
+        )
+    
+    def forget(self, session_id: str):
+        """Drop a discarded session's pending parse and per-session state."""
+        timer = self.parse_timers.pop(session_id, None)
+        if timer is not None:
+            timer.cancel()
+        self.generations.pop(session_id, None)
+        self.latencies.pop(session_id, None)
+        self.text_limits.pop(session_id, None)
+    
+    def _schedule(
+        self,
+        session_id: str,
+        load_inputs: Callable[[], Tuple[str, str, ParseSettings, Optional[Tuple[int, int]]]],
+        grammar_changed: bool,
+        delay: Optional[float] = None
+    ):
+        """Supersede pending work and start a new debounced parse task.
+        
+        ``delay`` overrides the session's debounce delay, e.g. 0 to parse
+        on the next loop iteration.
+        """
+        generation = self.supersede(session_id)
+        if delay is None:
+            delay = self.get_debounce_delay(session_id, grammar_changed)
+            self.latencies.setdefault(session_id, SessionLatency()).debounce_delay = delay
         
         # Create new debounced parse task
         self.parse_timers[session_id] = asyncio.create_task(
-            self._debounced_parse(session_id, grammar, text, parse_settings)
+            self._debounced_parse(session_id, generation, load_inputs, delay, grammar_changed)
         )
-        logger.debug(f"Started debounced parse task for session {session_id[:8]}...")
+        logger.debug("Started debounced parse task for session %.8s... (generation %s, delay %.3fs)", session_id, generation, delay)
     
     async def _debounced_parse(
         self, 
         session_id: str, 
-        grammar: str, 
-        text: str, 
-        parse_settings: ParseSettings
+        generation: int,
+        load_inputs: Callable[[], Tuple[str, str, ParseSettings, Optional[Tuple[int, int]]]],
+        delay: float,
+        grammar_changed: bool
     ):
         """Execute parsing after debounce delay."""
         try:
-            logger.debug(f"Debounced parse waiting {self.debounce_delay}s for session {session_id[:8]}...")
-            await asyncio.sleep(self.debounce_delay)
+            logger.debug("Debounced parse waiting %.3fs for session %.8s...", delay, session_id)
+            await asyncio.sleep(delay)
             
-            logger.info(f"Executing debounced parse for session {session_id[:8]}...")
+            logger.debug("Executing debounced parse for session %.8s...", session_id)
             
             # Perform the actual parsing
-            parser = get_parser()
-            result = await parser.parse_async(grammar, text, parse_settings)
+            grammar, text, parse_settings, versions = load_inputs()
+            result = await self.timed_parse(
+                session_id, grammar, text, parse_settings, generation, grammar_changed
+            )
+            
+            if not self.is_current(session_id, generation):
+                logger.debug("Discarding stale parse result for session %.8s... (generation %s)", session_id, generation)
+                return
             
             # Update session with result
             session_manager = get_session_manager()
             session = await session_manager.get_or_create_session(session_id)
+            if versions is not None and session.content_versions() != versions:
+                # Another worker stored newer edits; the parse of those supersedes this one
+                logger.debug("Discarding parse of outdated versions %s for session %.8s...", versions, session_id)
+                return
             session.last_parse_result = result
+            if not await session_manager.save_session(session):
+                # Another worker saved the session first and its state was reloaded
+                return
             
             # Broadcast result to all connections in session
             message = {
                 "type": WSMessageType.PARSE_RESULT,
                 "session_id": session_id,
                 "timestamp": datetime.now().isoformat(),
-                "data": result.dict()
+                "data": result
             }
             
-            logger.info(f"Broadcasting parse result to session {session_id[:8]}... (status: {result.status})")
-            await session_manager.broadcast_to_session(session_id, message)
+            logger.debug("Broadcasting parse result to session %.8s... (status: %s)", session_id, result.status)
+            await session_manager.broadcast_to_session(
+                session_id, message, replace_key=WSMessageType.PARSE_RESULT
+            )
             
-        except asyncio.CancelledError:
-            # Task was cancelled (new content change), ignore
-            logger.debug(f"Debounced parse cancelled for session {session_id[:8]}...")
+        except (asyncio.CancelledError, ParseCancelledError):
+            # Superseded by a newer content change, ignore
+            logger.debug("Debounced parse cancelled for session %.8s...", session_id)
             pass
         except Exception as e:
             # Send error message
@@ -130,30 +346,175 @@ class ParseManager:
                     "error_type": "parsing_error"
                 }
             }
-            await session_manager.broadcast_to_session(session_id, error_message)
+            await session_manager.broadcast_to_session(
+                session_id, error_message, replace_key=WSMessageType.PARSE_RESULT
+            )
         finally:
-            # Clean up timer
-            if session_id in self.parse_timers:
+            # Clean up timer, unless a newer task has already replaced it
+            if self.parse_timers.get(session_id) is asyncio.current_task():
                 del self.parse_timers[session_id]
-                logger.debug(f"Cleaned up parse timer for session {session_id[:8]}...")
+                logger.debug("Cleaned up parse timer for session %.8s...", session_id)
 
 
 # Global parse manager
 parse_manager = ParseManager()
 
 
+class SessionInfoNotifier:
+    """Sends session_info only when what it reports has changed.
+    
+    Notifications are coalesced per session over ``session_info_window``;
+    each connection then receives the info only if it differs from the
+    last one it was sent.
+    """
+    
+    # Granularity at which debounce delay changes are worth reporting
+    DELAY_STEP = 0.05
+    
+    def __init__(self):
+        self.pending: Dict[str, asyncio.Task] = {}
+        self.last_sent: Dict[ClientConnection, Dict[str, Any]] = {}
+        self.requested = 0
+        self.sent = 0
+        self.started_at = time.time()
+    
+    def snapshot(self, session: EditorSession) -> Dict[str, Any]:
+        """Build the session_info payload for a session."""
+        delay = parse_manager.get_reported_delay(session.session_id)
+        return {
+            "session_id": session.session_id,
+            "connection_count": session.get_connection_count(),
+            "has_grammar": len(session.grammar_buffer) > 0,
+            "has_text": len(session.text_buffer) > 0,
+            "settings": session.parse_settings.model_dump(mode="json"),
+            "debounce_delay": round(round(delay / self.DELAY_STEP) * self.DELAY_STEP, 3)
+        }
+    
+    def notify(self, session_id: str):
+        """Request a session_info update for every connection of a session."""
+        self.requested += 1
+        if session_id not in self.pending:
+            self.pending[session_id] = asyncio.create_task(self._flush(session_id))
+    
+    def forget(self, connection: ClientConnection):
+        """Drop state for a closed connection."""
+        self.last_sent.pop(connection, None)
+    
+    async def _flush(self, session_id: str):
+        """Send the coalesced update after the window closes."""
+        try:
+            await asyncio.sleep(settings.session_info_window)
+            session_manager = get_session_manager()
+            session = session_manager.sessions.get(session_id)
+            if session is None:
+                return
+            
+            snapshot = self.snapshot(session)
+            message = {
+                "type": WSMessageType.SESSION_INFO,
+                "session_id": session_id,
+                "timestamp": datetime.now().isoformat(),
+                "data": snapshot
+            }
+            for connection in list(session.websocket_connections):
+                if self.last_sent.get(connection) == snapshot:
+                    continue
+                try:
+                    await connection.send_json(message)
+                except Exception as e:
+                    # The connection's receive loop handles the disconnect
+                    logger.debug(f"Failed to send session info: {e}")
+                    continue
+                self.last_sent[connection] = snapshot
+                self.sent += 1
+            logger.debug("Session info flushed for session %.8s... (connections=%s)", session_id, snapshot['connection_count'])
+        finally:
+            self.pending.pop(session_id, None)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get counts and rates of requested versus sent session_info frames."""
+        elapsed = max(time.time() - self.started_at, 1e-9)
+        return {
+            "requested": self.requested,
+            "sent": self.sent,
+            "requested_per_second": self.requested / elapsed,
+            "sent_per_second": self.sent / elapsed,
+            "reduction": 1 - self.sent / self.requested if self.requested else 0.0
+        }
+
+
+session_info_notifier = SessionInfoNotifier()
+
+
+def _symbol_index_message(session: EditorSession) -> Dict[str, Any]:
+    """Build the symbol_index message for a session's current grammar."""
+    return {
+        "type": WSMessageType.SYMBOL_INDEX,
+        "session_id": session.session_id,
+        "timestamp": datetime.now().isoformat(),
+        "data": get_symbol_indexer().index(session.grammar_content)
+    }
+
+
+class SymbolIndexPublisher:
+    """Sends a session's grammar symbol index after grammar edits.
+    
+    Edits are coalesced per session over ``symbol_index_window``, so a
+    burst of keystrokes re-indexes the grammar once.
+    """
+    
+    def __init__(self):
+        self.pending: Dict[str, asyncio.Task] = {}
+    
+    def notify(self, session_id: str):
+        """Request a symbol index update for every connection of a session."""
+        if session_id not in self.pending:
+            self.pending[session_id] = asyncio.create_task(self._flush(session_id))
+    
+    async def _flush(self, session_id: str):
+        """Index the grammar and broadcast it after the window closes."""
+        try:
+            await asyncio.sleep(settings.symbol_index_window)
+            session_manager = get_session_manager()
+            session = session_manager.sessions.get(session_id)
+            if session is None:
+                return
+            await session_manager.broadcast_to_session(
+                session_id, _symbol_index_message(session), replace_key=WSMessageType.SYMBOL_INDEX
+            )
+        except Exception as e:
+            logger.error(f"Failed to publish symbol index for session {session_id[:8]}...: {e}")
+        finally:
+            self.pending.pop(session_id, None)
+
+
+symbol_index_publisher = SymbolIndexPublisher()
+
+
+async def _trigger_parse(session: EditorSession, grammar_changed: bool):
+    """Schedule a debounced parse if the session has both grammar and text."""
+    if len(session.grammar_buffer) and len(session.text_buffer):
+        parse_manager.handle_session_change(session, grammar_changed=grammar_changed)
+    else:
+        logger.debug("Missing grammar or text content, skipping parse")
+
+
 @router.websocket("/parsing")
 async def websocket_parsing_endpoint(websocket: WebSocket):
     """WebSocket endpoint for real-time parsing updates."""
     client_host = websocket.client.host if websocket.client else "unknown"
     logger.info(f"New WebSocket connection from {client_host}")
     
+    subprotocol = negotiate_subprotocol(websocket.scope.get("subprotocols", []))
     try:
-        await websocket.accept()
-        logger.info(f"WebSocket connection accepted for {client_host}")
+        await websocket.accept(subprotocol=subprotocol)
+        logger.info(f"WebSocket connection accepted for {client_host} (subprotocol: {subprotocol})")
     except Exception as e:
         logger.error(f"Failed to accept WebSocket connection: {e}")
         return
+    
+    # All outgoing messages go through the negotiated encoding
+    connection = ClientConnection(websocket, compress=subprotocol == DEFLATE_SUBPROTOCOL)
         
     session_manager = get_session_manager()
     current_session_id: Optional[str] = None
@@ -166,39 +527,57 @@ async def websocket_parsing_endpoint(websocket: WebSocket):
             data = await websocket.receive_text()
             message_count += 1
             
-            logger.debug(f"Received WebSocket message #{message_count} ({len(data)} chars)")
+            logger.debug("Received WebSocket message #%s (%s chars)", message_count, len(data))
             
             try:
                 # Parse incoming message
                 message_data = json.loads(data)
                 message = IncomingMessage(**message_data)
                 
-                logger.info(f"Processing message type '{message.type}' for session {message.session_id[:8]}...")
+                logger.debug("Processing message type '%s' for session %.8s...", message.type, message.session_id)
                 
                 # Update current session
                 if current_session_id != message.session_id:
                     # Remove from old session
                     if current_session_id:
-                        logger.debug(f"Removing WebSocket from old session {current_session_id[:8]}...")
+                        logger.debug("Removing WebSocket from old session %.8s...", current_session_id)
                         await session_manager.remove_websocket_from_session(
-                            current_session_id, websocket
+                            current_session_id, connection
                         )
+                        session_info_notifier.notify(current_session_id)
                     
                     # Add to new session
                     current_session_id = message.session_id
-                    logger.debug(f"Adding WebSocket to new session {current_session_id[:8]}...")
+                    logger.debug("Adding WebSocket to new session %.8s...", current_session_id)
                     await session_manager.add_websocket_to_session(
-                        current_session_id, websocket
+                        current_session_id, connection
                     )
+                    
+                    # A reconnecting client gets the session's last result right away
+                    joined_session = await session_manager.get_or_create_session(current_session_id)
+                    last_result = await session_manager.load_parse_result(joined_session)
+                    if last_result is not None:
+                        await connection.send_json({
+                            "type": WSMessageType.PARSE_RESULT,
+                            "session_id": current_session_id,
+                            "timestamp": datetime.now().isoformat(),
+                            "data": last_result
+                        })
+                    if len(joined_session.grammar_buffer):
+                        await connection.send_json(_symbol_index_message(joined_session))
                 
                 # Get session
                 session = await session_manager.get_or_create_session(message.session_id)
+                changed = False
                 
                 # Handle different message types
                 if message.type == WSMessageType.GRAMMAR_CHANGE:
                     content_data = ContentChangeData(**message.data)
-                    logger.debug(f"Grammar change: {len(content_data.content)} chars")
-                    session.grammar_content = content_data.content
+                    content = await _load_content(content_data)
+                    logger.debug("Grammar change: %s chars", len(content))
+                    session.grammar_buffer.set_text(content, content_data.version)
+                    changed = True
+                    symbol_index_publisher.notify(message.session_id)
                     
                     # Trigger parsing if we have both grammar and text
                     if session.text_content:
@@ -207,15 +586,23 @@ async def websocket_parsing_endpoint(websocket: WebSocket):
                             message.session_id,
                             session.grammar_content,
                             session.text_content,
-                            session.parse_settings
+                            session.parse_settings,
+                            grammar_changed=True,
+                            versions=session.content_versions()
                         )
                     else:
                         logger.debug("No text content available, skipping parse")
                 
                 elif message.type == WSMessageType.TEXT_CHANGE:
                     content_data = ContentChangeData(**message.data)
-                    logger.debug(f"Text change: {len(content_data.content)} chars")
-                    session.text_content = content_data.content
+                    content = await _load_content(content_data)
+                    logger.debug("Text change: %s chars", len(content))
+                    session.text_buffer.set_text(content, content_data.version)
+                    changed = True
+                    if content_data.file_id is not None:
+                        parse_manager.text_limits[message.session_id] = settings.max_referenced_text_length
+                    else:
+                        parse_manager.text_limits.pop(message.session_id, None)
                     
                     # Trigger parsing if we have both grammar and text
                     if session.grammar_content:
@@ -224,14 +611,42 @@ async def websocket_parsing_endpoint(websocket: WebSocket):
                             message.session_id,
                             session.grammar_content,
                             session.text_content,
-                            session.parse_settings
+                            session.parse_settings,
+                            versions=session.content_versions()
                         )
                     else:
                         logger.debug("No grammar content available, skipping parse")
                 
+                elif message.type == WSMessageType.CONTENT_DELTA:
+                    delta_data = ContentDeltaData(**message.data)
+                    buffer = session.grammar_buffer if delta_data.target == "grammar" else session.text_buffer
+                    try:
+                        buffer.apply_edits(
+                            ((edit.range_offset, edit.range_length, edit.text) for edit in delta_data.changes),
+                            delta_data.base_version,
+                            delta_data.version
+                        )
+                    except VersionMismatchError as e:
+                        logger.info(f"Requesting {delta_data.target} resync for session {message.session_id[:8]}...: {e}")
+                        await connection.send_json({
+                            "type": WSMessageType.RESYNC_REQUIRED,
+                            "session_id": message.session_id,
+                            "timestamp": datetime.now().isoformat(),
+                            "data": {
+                                "target": delta_data.target,
+                                "version": buffer.version
+                            }
+                        })
+                    else:
+                        logger.debug("Applied %s %s edits (version %s)", len(delta_data.changes), delta_data.target, buffer.version)
+                        changed = True
+                        if delta_data.target == "grammar":
+                            symbol_index_publisher.notify(message.session_id)
+                        await _trigger_parse(session, grammar_changed=delta_data.target == "grammar")
+                
                 elif message.type == WSMessageType.SETTINGS_CHANGE:
                     settings_data = SettingsChangeData(**message.data)
-                    logger.debug(f"Settings change: parser={settings_data.parser}, start_rule={settings_data.start_rule}, debug={settings_data.debug}")
+                    logger.debug("Settings change: parser=%s, start_rule=%s, debug=%s", settings_data.parser, settings_data.start_rule, settings_data.debug)
                     
                     # Update settings
                     if settings_data.parser is not None:
@@ -240,6 +655,11 @@ async def websocket_parsing_endpoint(websocket: WebSocket):
                         session.parse_settings.start_rule = settings_data.start_rule
                     if settings_data.debug is not None:
                         session.parse_settings.debug = settings_data.debug
+                    if settings_data.record_separator is not None:
+                        session.parse_settings.record_separator = settings_data.record_separator or None
+                    if settings_data.record_rule is not None:
+                        session.parse_settings.record_rule = settings_data.record_rule or None
+                    changed = True
                     
                     # Trigger parsing if we have content
                     if session.grammar_content and session.text_content:
@@ -248,52 +668,17 @@ async def websocket_parsing_endpoint(websocket: WebSocket):
                             message.session_id,
                             session.grammar_content,
                             session.text_content,
-                            session.parse_settings
+                            session.parse_settings,
+                            grammar_changed=True,
+                            versions=session.content_versions()
                         )
                 
                 elif message.type == WSMessageType.FORCE_PARSE:
-                    logger.info(f"Force parse requested for session {message.session_id[:8]}...")
-                    # Force immediate parsing
+                    logger.info("Force parse requested for session %.8s...", message.session_id)
+                    # Parse on the next loop iteration, like a debounced parse
+                    # with no delay, so the message loop keeps reading
                     if session.grammar_content and session.text_content:
-                        try:
-                            # Cancel any existing debounced parsing
-                            if message.session_id in parse_manager.parse_timers:
-                                parse_manager.parse_timers[message.session_id].cancel()
-                                logger.debug("Cancelled existing debounced parse")
-                            
-                            # Parse immediately
-                            logger.debug("Executing immediate parse...")
-                            parser = get_parser()
-                            result = await parser.parse_async(
-                                session.grammar_content,
-                                session.text_content,
-                                session.parse_settings
-                            )
-                            
-                            session.last_parse_result = result
-                            
-                            # Send result
-                            response = {
-                                "type": WSMessageType.PARSE_RESULT,
-                                "session_id": message.session_id,
-                                "timestamp": datetime.now().isoformat(),
-                                "data": result.dict()
-                            }
-                            logger.info(f"Sending immediate parse result (status: {result.status})")
-                            await websocket.send_json(response)
-                            
-                        except Exception as parse_error:
-                            logger.error(f"Force parse failed: {str(parse_error)}")
-                            error_response = {
-                                "type": WSMessageType.PARSE_ERROR,
-                                "session_id": message.session_id,
-                                "timestamp": datetime.now().isoformat(),
-                                "data": {
-                                    "error": f"Parse failed: {str(parse_error)}",
-                                    "error_type": "force_parse_error"
-                                }
-                            }
-                            await websocket.send_json(error_response)
+                        parse_manager.handle_force_parse(session)
                     else:
                         logger.warning(f"Force parse requested but missing content - grammar: {bool(session.grammar_content)}, text: {bool(session.text_content)}")
                         # Send error response for missing content
@@ -306,23 +691,15 @@ async def websocket_parsing_endpoint(websocket: WebSocket):
                                 "error_type": "missing_content"
                             }
                         }
-                        await websocket.send_json(error_response)
+                        await connection.send_json(error_response)
                 
-                # Send session info
-                session_info = {
-                    "type": WSMessageType.SESSION_INFO,
-                    "session_id": message.session_id,
-                    "timestamp": datetime.now().isoformat(),
-                    "data": {
-                        "session_id": session.session_id,
-                        "connection_count": session.get_connection_count(),
-                        "has_grammar": bool(session.grammar_content),
-                        "has_text": bool(session.text_content),
-                        "settings": session.parse_settings.dict()
-                    }
-                }
-                logger.debug(f"Sending session info: connections={session.get_connection_count()}")
-                await websocket.send_json(session_info)
+                # Other workers see the change on their next access, once a
+                # burst of edits has been written to a shared store
+                if changed:
+                    session_manager.mark_changed(session)
+                
+                # Let every connection know if the session changed
+                session_info_notifier.notify(message.session_id)
                 
             except ValidationError as e:
                 # Send validation error
@@ -336,7 +713,20 @@ async def websocket_parsing_endpoint(websocket: WebSocket):
                         "details": str(e)
                     }
                 }
-                await websocket.send_json(error_response)
+                await connection.send_json(error_response)
+            
+            except UnknownFileError as e:
+                logger.warning(f"Content change referenced unknown file {e}")
+                error_response = {
+                    "type": WSMessageType.ERROR,
+                    "session_id": current_session_id or "unknown",
+                    "timestamp": datetime.now().isoformat(),
+                    "data": {
+                        "error": "Unknown file id",
+                        "file_id": str(e)
+                    }
+                }
+                await connection.send_json(error_response)
             
             except json.JSONDecodeError as e:
                 # Send JSON error
@@ -349,7 +739,7 @@ async def websocket_parsing_endpoint(websocket: WebSocket):
                         "error": "Invalid JSON format"
                     }
                 }
-                await websocket.send_json(error_response)
+                await connection.send_json(error_response)
     
     except WebSocketDisconnect:
         logger.info(f"WebSocket disconnected for session {current_session_id[:8] if current_session_id else 'unknown'} after {message_count} messages")
@@ -357,8 +747,12 @@ async def websocket_parsing_endpoint(websocket: WebSocket):
         logger.error(f"WebSocket error for session {current_session_id[:8] if current_session_id else 'unknown'}: {str(e)}")
     finally:
         # Clean up on disconnect
+        await connection.close()
+        session_info_notifier.forget(connection)
         if current_session_id:
             logger.debug(f"Cleaning up WebSocket for session {current_session_id[:8]}...")
             await session_manager.remove_websocket_from_session(
-                current_session_id, websocket
-            )
\ No newline at end of file
+                current_session_id, connection
+            )
+            # Remaining connections see the new connection count
+            session_info_notifier.notify(current_session_id)
\ No newline at end of file
@@ -0,0 +1 @@
+"""Performance benchmarks for LarkEditor Web (run with ``python -m benchmarks.<name>``)."""
@@ -0,0 +1,62 @@
+"""Benchmark streaming AST export on large trees.
+
+For each format, reports the time to stream the whole export and the
+peak memory allocated while doing so, next to the cost of building the
+same document as one string the way the old export route did.
+
+Usage: python -m benchmarks.bench_export [node_count ...]
+"""
+
+import sys
+import time
+import tracemalloc
+
+from app.core.export import EXPORTERS, iter_export
+from app.models.responses import ASTNode
+
+from .bench_serialization import build_result
+
+
+def stream(tree: ASTNode, format: str) -> int:
+    """Consume an export chunk by chunk, as a response would."""
+    total = 0
+    for chunk in iter_export(tree, format):
+        total += len(chunk)
+    return total
+
+
+def materialize(tree: ASTNode, format: str) -> int:
+    """Build the whole export in memory before sending it."""
+    return len(b"".join(iter_export(tree, format)))
+
+
+def measure(func, *args):
+    """Return (seconds, peak traced bytes) of a call."""
+    start = time.perf_counter()
+    func(*args)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    func(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main(argv):
+    sizes = [int(arg) for arg in argv] or [10_000, 100_000, 1_000_000]
+    print(f"{'nodes':>10} {'format':>6} {'size':>10} {'stream':>10} {'peak':>10} {'whole doc peak':>15}")
+    for size in sizes:
+        tree = build_result(size).tree
+        for format in EXPORTERS:
+            output_size = stream(tree, format)
+            stream_time, stream_peak = measure(stream, tree, format)
+            _, whole_peak = measure(materialize, tree, format)
+            print(
+                f"{size:>10} {format:>6} {output_size / 2**20:>8.1f}MB {stream_time * 1000:>8.0f}ms "
+                f"{stream_peak / 2**10:>8.0f}KB {whole_peak / 2**20:>13.1f}MB"
+            )
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,92 @@
+"""Benchmark logging overhead on the per-keystroke parse path.
+
+Runs cached parses, the path every edit takes once its result is known,
+with logging off, at the INFO default, and at DEBUG written directly to
+a file, through the background queue, and queued with sampling. Also
+times a disabled debug call with an f-string message against one with
+lazy %-formatting.
+
+Usage: python -m benchmarks.bench_logging [iterations]
+"""
+
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from app.core.config import get_settings, setup_logging
+from app.core.logs import stop_logging
+from app.core.parser import AsyncLarkParser
+from app.models.requests import ParseSettings
+
+GRAMMAR = r'''
+start: item+
+item: WORD ";"
+%import common.WORD
+%import common.WS
+%ignore WS
+'''
+
+TEXT = "alpha; beta; gamma;\n" * 50
+
+# name -> settings overrides
+CONFIGURATIONS = [
+    ("off", {"log_level": "CRITICAL"}),
+    ("INFO", {"log_level": "INFO"}),
+    ("DEBUG, direct", {"log_level": "DEBUG", "log_queue": False, "log_rate_limit": 0}),
+    ("DEBUG, queued", {"log_level": "DEBUG", "log_queue": True, "log_rate_limit": 0}),
+    ("DEBUG, queued, sampled", {"log_level": "DEBUG", "log_queue": True, "log_sample_rates": {"app": 0.1}}),
+]
+
+
+async def cached_parses(parser: AsyncLarkParser, iterations: int) -> float:
+    """Time cached parses; return microseconds per parse."""
+    parse_settings = ParseSettings()
+    await parser.parse_async(GRAMMAR, TEXT, parse_settings)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        await parser.parse_async(GRAMMAR, TEXT, parse_settings)
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def disabled_calls(iterations: int):
+    """Time debug calls below the logger's level; return (f-string, lazy) in ns per call."""
+    logger = logging.getLogger("app.benchmark")
+    logger.setLevel(logging.INFO)
+    key, size = "0123456789abcdef", 4096
+    start = time.perf_counter()
+    for _ in range(iterations):
+        logger.debug(f"Cache hit for key: {key[:8]}... ({size} chars)")
+    eager = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(iterations):
+        logger.debug("Cache hit for key: %.8s... (%d chars)", key, size)
+    lazy = time.perf_counter() - start
+    return eager / iterations * 1e9, lazy / iterations * 1e9
+
+
+def main(argv):
+    iterations = int(argv[0]) if argv else 5_000
+    settings = get_settings()
+    parser = AsyncLarkParser()
+
+    with tempfile.TemporaryDirectory() as directory:
+        print(f"{'configuration':>24} {'per parse':>12}")
+        for name, overrides in CONFIGURATIONS:
+            configured = settings.model_copy(update=dict(
+                overrides, log_to_console=False, log_to_file=True, log_file=os.path.join(directory, "bench.log")
+            ))
+            setup_logging(configured)
+            times = [asyncio.run(cached_parses(parser, iterations)) for _ in range(3)]
+            stop_logging()
+            print(f"{name:>24} {statistics.median(times):>10.1f}us")
+
+    eager, lazy = disabled_calls(iterations * 20)
+    print(f"disabled debug call: f-string {eager:.0f}ns, lazy {lazy:.0f}ns")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
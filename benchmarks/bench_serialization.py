@@ -0,0 +1,103 @@
+"""Benchmark parse result serialization on large ASTs.
+
+Compares the previous conversion path (model -> dict -> stdlib json, and
+FastAPI's response_model re-validation for REST) and the iterative AST
+writer with pydantic's native encoder, which app.core.serialization
+uses for messages and responses.
+
+Usage: python -m benchmarks.bench_serialization [node_count ...]
+"""
+
+import json
+import sys
+import time
+from datetime import datetime
+
+from fastapi.encoders import jsonable_encoder
+
+import pydantic_core
+
+from app.core.serialization import _write, dump_json
+from app.models.responses import ASTNode, ParseResult, ParseStatus
+
+
+def build_result(node_count: int, fanout: int = 8) -> ParseResult:
+    """Build a ParseResult whose tree has roughly node_count nodes."""
+    tokens = [
+        ASTNode(type="token", data=str(i), start_pos=i, end_pos=i + 1, line=1, column=i + 1)
+        for i in range(node_count)
+    ]
+    level = tokens
+    while len(level) > 1:
+        level = [
+            ASTNode(type="tree", data="rule", children=level[i:i + fanout])
+            for i in range(0, len(level), fanout)
+        ]
+    return ParseResult(
+        status=ParseStatus.SUCCESS,
+        tree=level[0],
+        parse_time=0.0,
+        grammar_hash="benchmark",
+        timestamp=datetime.now()
+    )
+
+
+def best_of(func, repeat: int = 3) -> float:
+    """Return the fastest of several timed runs."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def legacy_websocket(result: ParseResult) -> bytes:
+    # result.dict() + json.dumps; default=str stands in for the datetime
+    # handling the old path lacked
+    message = {"type": "parse_result", "data": result.model_dump()}
+    return json.dumps(message, default=str).encode("utf-8")
+
+
+def legacy_rest(result: ParseResult) -> bytes:
+    # FastAPI re-validates against response_model, then jsonable_encoder + json.dumps
+    validated = ParseResult.model_validate(result.model_dump())
+    return json.dumps(jsonable_encoder(validated)).encode("utf-8")
+
+
+def ast_writer_websocket(result: ParseResult) -> bytes:
+    # The iterative writer, used for trees too deep for pydantic
+    out = []
+    _write({"type": "parse_result", "data": result}, out)
+    return "".join(out).encode("utf-8")
+
+
+def pydantic_websocket(result: ParseResult) -> bytes:
+    return pydantic_core.to_json({"type": "parse_result", "data": result})
+
+
+def check_equivalent(result: ParseResult):
+    """Make sure the fast path produces the same document as pydantic."""
+    expected = json.loads(result.model_dump_json())
+    assert json.loads(dump_json(result)) == expected
+    assert json.loads(ast_writer_websocket(result))["data"] == expected
+
+
+def main(argv):
+    sizes = [int(arg) for arg in argv] or [1_000, 10_000, 100_000]
+    check_equivalent(build_result(100))
+    print(f"{'nodes':>10} {'legacy ws':>12} {'legacy rest':>12} {'ast writer':>12} {'pydantic':>10} {'speedup ws':>11}")
+    for size in sizes:
+        result = build_result(size)
+        ws_time = best_of(lambda: legacy_websocket(result))
+        rest_time = best_of(lambda: legacy_rest(result))
+        writer_time = best_of(lambda: ast_writer_websocket(result))
+        pydantic_time = best_of(lambda: pydantic_websocket(result))
+        print(
+            f"{size:>10} {ws_time * 1000:>10.1f}ms {rest_time * 1000:>10.1f}ms {writer_time * 1000:>10.1f}ms "
+            f"{pydantic_time * 1000:>8.1f}ms {ws_time / pydantic_time:>10.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
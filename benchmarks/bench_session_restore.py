@@ -0,0 +1,62 @@
+"""Benchmark server restart: eager session loading vs. the lazy metadata index.
+
+Run with ``python -m benchmarks.bench_session_restore``.
+"""
+
+import asyncio
+import os
+import tempfile
+import time
+
+from app.core.session_store import SQLiteSessionStore
+from app.core.state import EditorSession, SessionManager
+
+GRAMMAR = "start: item+\nitem: WORD\n%import common.WORD\n%import common.WS\n%ignore WS\n"
+TEXT = "lorem ipsum dolor sit amet " * 400  # ~11KB per session
+
+
+def write_snapshot(path: str, count: int):
+    store = SQLiteSessionStore(path)
+    records = []
+    for index in range(count):
+        session = EditorSession(session_id=f"session-{index}")
+        session.grammar_content = GRAMMAR
+        session.text_content = TEXT
+        records.append(session.to_record())
+    store.write_batch(records, [])
+    store.close()
+
+
+def restore_eager(path: str) -> float:
+    start_time = time.perf_counter()
+    store = SQLiteSessionStore(path)
+    sessions = {}
+    for session_id, _ in store.list_activity():
+        sessions[session_id] = EditorSession.from_record(store.load(session_id))
+    store.close()
+    return time.perf_counter() - start_time
+
+
+async def restore_lazy(path: str) -> float:
+    start_time = time.perf_counter()
+    manager = SessionManager()
+    manager.snapshot_store = SQLiteSessionStore(path)
+    await manager.restore_index()
+    elapsed = time.perf_counter() - start_time
+    await manager.shutdown()
+    return elapsed
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        for count in (1000, 5000, 20000):
+            path = os.path.join(directory, f"snapshot-{count}.db")
+            write_snapshot(path, count)
+            size_mb = os.path.getsize(path) / 1024 / 1024
+            eager = restore_eager(path)
+            lazy = asyncio.run(restore_lazy(path))
+            print(f"{count:>6} sessions ({size_mb:6.1f} MB): eager {eager * 1000:8.1f} ms, lazy index {lazy * 1000:6.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
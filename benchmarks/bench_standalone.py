@@ -0,0 +1,87 @@
+"""Benchmark standalone LALR parser modules against compiling with lark.Lark.
+
+For each grammar, reports the time to get a ready parser by compiling
+the grammar with ``lark.Lark`` and by loading the generated standalone
+module, and the parse throughput of both on the same input.
+
+Usage: python -m benchmarks.bench_standalone [grammar.lark input.txt]
+"""
+
+import statistics
+import sys
+import time
+
+import lark
+
+from app.core.standalone import generate_standalone
+
+JSON_GRAMMAR = r'''
+?start: value
+?value: object | array | string | SIGNED_NUMBER -> number | "true" -> true | "false" -> false | "null" -> null
+array: "[" [value ("," value)*] "]"
+object: "{" [pair ("," pair)*] "}"
+pair: string ":" value
+string: ESCAPED_STRING
+%import common.ESCAPED_STRING
+%import common.SIGNED_NUMBER
+%import common.WS
+%ignore WS
+'''
+
+
+def json_input(items: int) -> str:
+    """Build a JSON document with ``items`` small objects."""
+    rows = ",\n".join(f'  {{"id": {i}, "name": "item {i}", "tags": ["a", "b"], "ok": true}}' for i in range(items))
+    return f"[\n{rows}\n]\n"
+
+
+def compile_parser(grammar: str) -> lark.Lark:
+    return lark.Lark(grammar, parser="lalr", propagate_positions=True)
+
+
+def load_standalone(code):
+    """Execute a generated module's code and build its parser.
+
+    The code is compiled beforehand, as an import would find it in
+    ``__pycache__``.
+    """
+    namespace = {"__name__": "standalone_parser"}
+    exec(code, namespace)
+    return namespace["Lark_StandAlone"]()
+
+
+def median_time(func, *args, repeat: int = 5) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def main(argv):
+    if len(argv) >= 2:
+        with open(argv[0]) as grammar_file, open(argv[1]) as input_file:
+            grammar, text = grammar_file.read(), input_file.read()
+    else:
+        grammar, text = JSON_GRAMMAR, json_input(2_000)
+
+    source = generate_standalone(compile_parser(grammar)).decode("utf-8")
+    code = compile(source, "standalone_parser.py", "exec")
+    compiled = compile_parser(grammar)
+    standalone = load_standalone(code)
+
+    compile_time = median_time(compile_parser, grammar)
+    load_time = median_time(load_standalone, code)
+    lark_parse = median_time(compiled.parse, text, repeat=3)
+    standalone_parse = median_time(standalone.parse, text, repeat=3)
+    megabytes = len(text.encode("utf-8")) / 2**20
+
+    print(f"module size: {len(source) / 2**10:.0f}KB, input: {megabytes:.2f}MB")
+    print(f"{'':>12} {'ready in':>10} {'parse':>10} {'throughput':>12}")
+    print(f"{'lark.Lark':>12} {compile_time * 1000:>8.1f}ms {lark_parse * 1000:>8.0f}ms {megabytes / lark_parse:>9.2f}MB/s")
+    print(f"{'standalone':>12} {load_time * 1000:>8.1f}ms {standalone_parse * 1000:>8.0f}ms {megabytes / standalone_parse:>9.2f}MB/s")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
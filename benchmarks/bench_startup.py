@@ -0,0 +1,120 @@
+"""Benchmark server cold start.
+
+Reports where ``import app.main`` spends its time, from ``python -X
+importtime`` in fresh interpreters, and the time from launching uvicorn
+until the first request is answered and until /api/ready reports the
+warm-up as done. Track these numbers across releases.
+
+Usage: python -m benchmarks.bench_startup [runs]
+"""
+
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+# Modules whose share of the import time is reported on their own
+GROUPS = ("app", "fastapi", "starlette", "pydantic", "pydantic_core", "pydantic_settings", "lark", "jinja2", "aiofiles")
+
+
+def import_breakdown() -> Tuple[float, Dict[str, float]]:
+    """Import app.main in a fresh interpreter; return (total, self time per group) in ms."""
+    output = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        capture_output=True, text=True, check=True
+    ).stderr
+    groups: Dict[str, float] = defaultdict(float)
+    total = 0.0
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        module = name.strip()
+        root = module.split(".")[0]
+        groups[root if root in GROUPS else "other"] += int(self_us) / 1000
+        if module == "app.main":
+            total = int(cumulative_us) / 1000
+    return total, groups
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_for(url: str, deadline: float) -> Optional[float]:
+    """Poll a URL until it answers 200, waiting out 503s; return the time it did."""
+    while time.perf_counter() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == 200:
+                    return time.perf_counter()
+        except urllib.error.HTTPError as e:
+            if e.code != 503:
+                raise
+        except (urllib.error.URLError, ConnectionError):
+            pass
+        time.sleep(0.005)
+    return None
+
+
+def time_to_first_request(timeout: float = 60.0) -> Tuple[Optional[float], Optional[float]]:
+    """Launch uvicorn; return seconds until /api/health and /api/ready answer."""
+    port = _free_port()
+    env = dict(os.environ, LOG_TO_FILE="false")
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, env=env
+    )
+    try:
+        deadline = start + timeout
+        healthy = _wait_for(f"http://127.0.0.1:{port}/api/health", deadline)
+        ready = _wait_for(f"http://127.0.0.1:{port}/api/ready", deadline)
+    finally:
+        server.terminate()
+        server.wait()
+    return (
+        healthy - start if healthy else None,
+        ready - start if ready else None,
+    )
+
+
+def main(argv):
+    runs = int(argv[0]) if argv else 5
+
+    totals: List[float] = []
+    groups: Dict[str, List[float]] = defaultdict(list)
+    for _ in range(runs):
+        total, breakdown = import_breakdown()
+        totals.append(total)
+        for group, elapsed in breakdown.items():
+            groups[group].append(elapsed)
+    print(f"import app.main: {statistics.median(totals):.0f}ms (median of {runs})")
+    for group, times in sorted(groups.items(), key=lambda item: -statistics.median(item[1])):
+        print(f"  {group:>18} {statistics.median(times):>8.1f}ms")
+
+    firsts, readies = [], []
+    for _ in range(runs):
+        first, ready = time_to_first_request()
+        if first is not None:
+            firsts.append(first)
+        if ready is not None:
+            readies.append(ready)
+    print(json.dumps({
+        "time_to_first_request_ms": round(statistics.median(firsts) * 1000) if firsts else None,
+        "time_to_ready_ms": round(statistics.median(readies) * 1000) if readies else None,
+        "runs": runs,
+    }))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -17,5 +17,6 @@ if __name__ == "__main__":
         port=8000,
         reload=True,
         log_level="info",  # Changed from debug to reduce noise
-        access_log=True
+        access_log=True,
+        ws_per_message_deflate=False  # the app compresses large messages itself
     )
\ No newline at end of file
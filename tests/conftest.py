@@ -4,6 +4,8 @@ import asyncio
 import pytest
 import pytest_asyncio
 import logging
+import json
+import zlib
 from typing import AsyncGenerator, Generator
 from fastapi.testclient import TestClient
 from httpx import AsyncClient
@@ -13,6 +15,7 @@ from app.main import app
 from app.core.config import get_settings, setup_logging
 from app.core.parser import get_parser
 from app.core.state import get_session_manager
+from app.websockets.connection import ClientConnection
 
 
 # Configure logging for tests
@@ -180,6 +183,7 @@ def cleanup_parser_cache():
     parser = get_parser()
     parser.clear_cache()
     parser.active_parsers.clear()
+    parser.validations.clear()
 
 
 class MockWebSocket:
@@ -194,7 +198,15 @@ class MockWebSocket:
         """Mock send_json method."""
         self.sent_messages.append(data)
     
-    async def close(self):
+    async def send_text(self, data):
+        """Record a text frame as the message it encodes."""
+        self.sent_messages.append(json.loads(data))
+    
+    async def send_bytes(self, data):
+        """Record a compressed frame as the message it encodes."""
+        self.sent_messages.append(json.loads(zlib.decompress(data)))
+    
+    async def close(self, code=1000):
         """Mock close method."""
         self.closed = True
 
@@ -206,7 +218,18 @@ class MockClient:
         self.host = "127.0.0.1"
 
 
+class MockConnection(ClientConnection):
+    """Queued connection over a MockWebSocket, like those the endpoint creates."""
+    
+    def __init__(self, websocket=None):
+        super().__init__(websocket or MockWebSocket())
+    
+    @property
+    def sent_messages(self):
+        return self.websocket.sent_messages
+
+
 @pytest.fixture
 def mock_websocket():
-    """Create a mock WebSocket for testing."""
-    return MockWebSocket() 
\ No newline at end of file
+    """Create a mock WebSocket connection for testing."""
+    return MockConnection()
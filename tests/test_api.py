@@ -221,6 +221,9 @@ class TestStatsAPI:
         assert "parse_count" in data
         assert "cache_size" in data
         assert "active_parsers" in data
+        assert "websocket_compression" in data
+        assert "websocket_queues" in data
+        assert "restorable_sessions" in data["sessions"]
         assert isinstance(data["parse_count"], int)
         assert isinstance(data["cache_size"], int)
         assert isinstance(data["active_parsers"], int)
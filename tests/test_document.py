@@ -0,0 +1,126 @@
+"""Tests for rope-backed session documents."""
+
+import random
+import sys
+import pytest
+
+from app.core.document import Rope, DocumentBuffer, VersionMismatchError, LEAF_SIZE
+
+
+class TestRope:
+    """Test rope editing."""
+    
+    def test_rope_roundtrip(self):
+        """Test that a rope reproduces its input."""
+        text = "abc" * LEAF_SIZE
+        rope = Rope(text)
+        assert str(rope) == text
+        assert len(rope) == len(text)
+        assert str(Rope("")) == ""
+    
+    def test_random_edits_match_string(self):
+        """Test rope edits against plain string slicing."""
+        rng = random.Random(42)
+        reference = "".join(rng.choice("ab\n") for _ in range(5000))
+        rope = Rope(reference)
+        
+        for _ in range(2000):
+            start = rng.randint(0, len(reference))
+            end = rng.randint(start, min(len(reference), start + 50))
+            insert = "".join(rng.choice("xyz\n") for _ in range(rng.randint(0, 20)))
+            rope.replace(start, end, insert)
+            reference = reference[:start] + insert + reference[end:]
+        
+        assert str(rope) == reference
+        # Rebalancing keeps the tree logarithmic
+        assert rope.depth <= rope._max_depth()
+    
+    def test_typing_merges_leaves(self):
+        """Test that sequential typing does not create a leaf per keystroke."""
+        rope = Rope()
+        for i in range(LEAF_SIZE * 4):
+            rope.replace(len(rope), len(rope), "x")
+        assert len(rope) == LEAF_SIZE * 4
+        assert rope.depth <= 3
+    
+    def test_nbytes_tracks_edits(self):
+        """Test that the incrementally kept size matches a walk of the tree."""
+        rng = random.Random(7)
+        rope = Rope("abc" * 2000)
+        for _ in range(500):
+            start = rng.randint(0, len(rope))
+            end = rng.randint(start, min(len(rope), start + 30))
+            rope.replace(start, end, "x" * rng.randint(0, 40))
+        
+        total = 0
+        stack = [rope.root]
+        while stack:
+            node = stack.pop()
+            total += sys.getsizeof(node)
+            if hasattr(node, "text"):
+                total += sys.getsizeof(node.text)
+            else:
+                stack.extend((node.left, node.right))
+        assert rope.nbytes() == total
+        assert Rope().nbytes() == 0
+    
+    def test_replace_out_of_range(self):
+        """Test that out-of-range edits are rejected."""
+        rope = Rope("abc")
+        with pytest.raises(IndexError):
+            rope.replace(2, 5, "")
+
+
+class TestDocumentBuffer:
+    """Test versioned document buffers."""
+    
+    def test_apply_edits(self):
+        """Test applying sequential range edits."""
+        buffer = DocumentBuffer("hello world", version=1)
+        buffer.apply_edits([(6, 5, "there"), (0, 0, ">> ")], base_version=1, version=3)
+        assert buffer.text == ">> hello there"
+        assert buffer.version == 3
+    
+    def test_version_mismatch(self):
+        """Test that edits against a stale version are rejected."""
+        buffer = DocumentBuffer("abc", version=2)
+        with pytest.raises(VersionMismatchError):
+            buffer.apply_edits([(0, 0, "x")], base_version=1, version=3)
+        assert buffer.text == "abc"
+    
+    def test_failed_edit_leaves_buffer_unchanged(self):
+        """Test that a partially invalid edit batch is rolled back."""
+        buffer = DocumentBuffer("abc", version=0)
+        with pytest.raises(VersionMismatchError):
+            buffer.apply_edits([(0, 1, "X"), (10, 1, "")], base_version=0, version=1)
+        assert buffer.text == "abc"
+        assert buffer.version == 0
+    
+    def test_set_text(self):
+        """Test full snapshot replacement."""
+        buffer = DocumentBuffer()
+        buffer.set_text("new")
+        assert buffer.text == "new"
+        assert buffer.version == 1
+        buffer.set_text("other", version=7)
+        assert buffer.version == 7
+
+
+class TestCompactBuffer:
+    """Test the buffer's memory representation."""
+    
+    def test_rope_built_lazily_and_compacted(self):
+        """Test that snapshots hold only text until edited, and compact drops the rope."""
+        buffer = DocumentBuffer("x" * 10000)
+        text_only = buffer.nbytes()
+    
+        buffer.apply_edits([(0, 1, "y")], base_version=0, version=1)
+        assert buffer.text.startswith("y")
+        assert buffer.nbytes() > text_only
+    
+        assert buffer.compact() > 0
+        assert buffer.nbytes() == text_only
+        assert len(buffer) == 10000
+    
+        buffer.apply_edits([(0, 1, "z")], base_version=1, version=2)
+        assert buffer.text.startswith("z")
@@ -0,0 +1,203 @@
+"""Tests for streaming exporters."""
+
+import asyncio
+import json
+import xml.etree.ElementTree as ElementTree
+
+import pytest
+
+from app.core.export import ExportCache, etag_matches, get_export_cache, iter_export
+from app.core.parser import get_parser
+from app.core.state import get_session_manager
+from app.models.responses import ASTNode
+
+
+def _tree() -> ASTNode:
+    return ASTNode(type="tree", data="start", children=[
+        ASTNode(type="token", data='a "quoted" <value> & more', start_pos=0, end_pos=3, line=1, column=1),
+        ASTNode(type="tree", data="inner", children=["bare", ASTNode(type="token", data="two\nlines")]),
+    ])
+
+
+def _export(root, format, metadata=None, chunk_size=65536) -> str:
+    return b"".join(iter_export(root, format, metadata, chunk_size)).decode("utf-8")
+
+
+def _deep_tree(depth: int) -> ASTNode:
+    node = ASTNode(type="token", data="leaf")
+    for _ in range(depth):
+        node = ASTNode(type="tree", data="nested", children=[node])
+    return node
+
+
+def _session_with_result(session_id, grammar, text):
+    manager = get_session_manager()
+
+    async def prepare():
+        session = await manager.get_or_create_session(session_id)
+        session.last_parse_result = await get_parser().parse_async(grammar, text, session.parse_settings)
+
+    asyncio.run(prepare())
+
+
+class TestExporters:
+    """Test the document produced by each exporter."""
+
+    def test_json(self):
+        """Test that JSON export matches pydantic and appends metadata."""
+        tree = _tree()
+        assert json.loads(_export(tree, "json")) == json.loads(tree.model_dump_json())
+
+        data = json.loads(_export(tree, "json", {"session_id": "s", "parse_time": 0.5}))
+        assert data["metadata"] == {"session_id": "s", "parse_time": 0.5}
+        assert data["children"][1]["data"] == "inner"
+
+    def test_xml(self):
+        """Test that XML export is well formed and escaped."""
+        root = ElementTree.fromstring(_export(_tree(), "xml", {"session_id": "s"}).encode("utf-8"))
+        assert root.tag == "ast"
+        assert root.find("metadata").get("session_id") == "s"
+        start = root.find("tree")
+        assert start.get("data") == "start"
+        assert start[0].get("data") == 'a "quoted" <value> & more'
+        assert [child.get("data") for child in start[1]] == ["bare", "two\nlines"]
+
+    def test_dot(self):
+        """Test that DOT nodes are numbered in preorder with escaped labels."""
+        lines = _export(_tree(), "dot").splitlines()
+        assert lines[0] == "digraph AST {"
+        assert lines[-1] == "}"
+        assert '  0 [label="start" shape=ellipse];' in lines
+        assert '  1 [label="a \\"quoted\\" <value> & more" shape=box];' in lines
+        assert lines.index("  2 -> 3;") < lines.index("  2 -> 4;")
+        assert '  4 [label="two\\nlines" shape=box];' in lines
+
+    def test_text(self):
+        """Test the indented outline."""
+        assert _export(_tree(), "text") == (
+            'start\n'
+            '  "a "quoted" <value> & more"\n'
+            '  inner\n'
+            '    "bare"\n'
+            '    "two\nlines"\n'
+        )
+
+    @pytest.mark.parametrize("format", ["json", "xml", "dot", "text"])
+    def test_deep_tree(self, format):
+        """Test that trees deeper than the recursion limit export."""
+        assert _export(_deep_tree(5000), format).count("nested") == 5000
+
+    def test_chunks(self):
+        """Test that large exports are split into bounded chunks."""
+        tree = ASTNode(type="tree", data="start", children=[
+            ASTNode(type="token", data=str(i)) for i in range(20000)
+        ])
+        chunks = list(iter_export(tree, "xml", chunk_size=4096))
+        assert len(chunks) > 10
+        assert max(len(chunk) for chunk in chunks[:-1]) < 4096 * 16
+
+
+class TestExportAPI:
+    """Test the streamed /api/export download."""
+
+    @pytest.mark.parametrize("format,content_type,extension", [
+        ("json", "application/json", "json"),
+        ("xml", "application/xml", "xml"),
+        ("dot", "text/vnd.graphviz; charset=utf-8", "dot"),
+        ("text", "text/plain; charset=utf-8", "txt"),
+    ])
+    def test_export_formats(self, test_client, cleanup_sessions, sample_grammars, format, content_type, extension):
+        """Test content type and filename for every format."""
+        _session_with_result("export_formats", sample_grammars["simple"], "42")
+        response = test_client.post("/api/export", json={"session_id": "export_formats", "format": format})
+        assert response.status_code == 200
+        assert response.headers["content-type"] == content_type
+        assert response.headers["content-disposition"].endswith(f'.{extension}"')
+        assert "42" in response.text
+
+    def test_export_metadata(self, test_client, cleanup_sessions, sample_grammars):
+        """Test that JSON metadata describes the parse."""
+        _session_with_result("export_metadata", sample_grammars["simple"], "42")
+        response = test_client.post(
+            "/api/export", json={"session_id": "export_metadata", "format": "json", "include_metadata": True}
+        )
+        metadata = response.json()["metadata"]
+        assert metadata["parser_status"] == "success"
+        assert metadata["text_hash"]
+        assert "session_id" not in metadata
+        # Cached bodies are served again later, so nothing in them may go stale
+        assert "export_time" not in metadata
+
+    def test_export_errors(self, test_client, cleanup_sessions):
+        """Test unknown sessions and formats."""
+        response = test_client.post("/api/export", json={"session_id": "missing", "format": "json"})
+        assert response.status_code == 404
+        response = test_client.post("/api/export", json={"session_id": "missing", "format": "png"})
+        assert response.status_code == 422
+
+
+class TestExportCache:
+    """Test memoized exports and conditional downloads."""
+
+    def test_lru_bounded_by_bytes(self):
+        """Test that least recently used exports are evicted to fit the budget."""
+        cache = ExportCache(max_bytes=10, max_entry=10)
+        cache.put(("g", "a", "json", False), b"12345")
+        cache.put(("g", "b", "json", False), b"12345")
+        assert cache.get(("g", "a", "json", False)) is not None
+        cache.put(("g", "c", "json", False), b"12345")
+        assert cache.get(("g", "b", "json", False)) is None
+        assert cache.size == 10
+        assert cache.get_stats()["entries"] == 2
+
+    def test_etag_matches(self):
+        """Test If-None-Match lists, weak validators and wildcards."""
+        assert etag_matches('"a", W/"b"', '"b"')
+        assert etag_matches("*", '"b"')
+        assert not etag_matches('"a"', '"b"')
+        assert not etag_matches(None, '"b"')
+
+    def test_repeat_download_served_from_cache(self, test_client, cleanup_sessions, sample_grammars):
+        """Test that sessions with the same parse share a cached export and revalidate."""
+        cache = get_export_cache()
+        cache.clear()
+        _session_with_result("cache_a", sample_grammars["simple"], "42")
+        _session_with_result("cache_b", sample_grammars["simple"], "42")
+        hits = cache.hits
+
+        first = test_client.get("/api/export/cache_a", params={"format": "xml"})
+        assert first.status_code == 200
+        etag = first.headers["etag"]
+        assert etag.startswith('"')
+
+        second = test_client.post("/api/export", json={"session_id": "cache_b", "format": "xml"})
+        assert second.headers["etag"] == etag
+        assert second.content == first.content
+        assert cache.hits == hits + 1
+
+        revalidated = test_client.get(
+            "/api/export/cache_b", params={"format": "xml"}, headers={"If-None-Match": etag}
+        )
+        assert revalidated.status_code == 304
+        assert revalidated.content == b""
+        assert revalidated.headers["etag"] == etag
+
+        other_format = test_client.get("/api/export/cache_b", params={"format": "dot"}, headers={"If-None-Match": etag})
+        assert other_format.status_code == 200
+        assert other_format.headers["etag"] != etag
+
+    def test_large_export_streamed_uncached(self, test_client, cleanup_sessions, sample_grammars):
+        """Test that exports over the entry limit are streamed without an ETag."""
+        cache = get_export_cache()
+        cache.clear()
+        max_entry = cache.max_entry
+        cache.max_entry = 16
+        try:
+            _session_with_result("cache_large", sample_grammars["simple"], "42")
+            response = test_client.get("/api/export/cache_large", params={"format": "text"})
+            assert response.status_code == 200
+            assert "etag" not in response.headers
+            assert "42" in response.text
+            assert cache.get_stats()["entries"] == 0
+        finally:
+            cache.max_entry = max_entry
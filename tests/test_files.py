@@ -0,0 +1,280 @@
+"""Tests for the upload store and file routes."""
+
+import hashlib
+import os
+
+import pytest
+
+import app.core.file_store as file_store_module
+from app.core.file_store import BinaryContent, FileStore, UploadTooLarge
+from app.api.files import settings
+
+
+@pytest.fixture
+def file_store(tmp_path, monkeypatch):
+    """Point the global file store at a temporary directory."""
+    store = FileStore(str(tmp_path / "uploads"))
+    monkeypatch.setattr(file_store_module, "_file_store", store)
+    yield store
+    store.close()
+
+
+async def _chunks(*parts):
+    for part in parts:
+        yield part
+
+
+class TestFileStore:
+    """Test the content-addressed store."""
+
+    @pytest.mark.asyncio
+    async def test_identical_uploads_share_a_blob(self, file_store):
+        """Test that the same content is stored once under its digest, with an entry per upload."""
+        first = await file_store.put_stream(_chunks(b"start: ", b"\"a\"\n"), "a.lark", "text/plain", "grammar", 100)
+        second = await file_store.put_stream(_chunks(b"start: \"a\"\n"), "b.lark", "text/plain", "text", 100)
+        repeated = await file_store.put_stream(_chunks(b"start: \"a\"\n"), "a.lark", "text/plain", "grammar", 100)
+
+        assert first.digest == hashlib.sha256(b"start: \"a\"\n").hexdigest()
+        assert second.digest == first.digest
+        assert second.id != first.id
+        assert (second.filename, second.file_type) == ("b.lark", "text")
+        assert repeated.id == first.id
+        assert (await file_store.lookup(first.id)).filename == "a.lark"
+        assert (await file_store.lookup(second.id)).filename == "b.lark"
+        with open(file_store.path_for(first.digest), "rb") as stored:
+            assert stored.read() == b"start: \"a\"\n"
+        stats = file_store.get_stats()
+        assert stats["files"] == 2
+        assert stats["blobs"] == 1
+        assert stats["bytes"] == len(b"start: \"a\"\n")
+        assert stats["stored"] == 1
+        assert stats["deduplicated"] == 2
+
+    @pytest.mark.asyncio
+    async def test_multibyte_character_split_across_chunks(self, file_store):
+        """Test that UTF-8 sequences spanning chunk boundaries are accepted."""
+        encoded = "héllo ✓".encode("utf-8")
+        stored = await file_store.put_stream(
+            _chunks(encoded[:2], encoded[2:9], encoded[9:]), "t.txt", "text/plain", "text", 100
+        )
+        assert stored.size == len(encoded)
+
+    @pytest.mark.asyncio
+    async def test_rejected_uploads_leave_nothing_behind(self, file_store):
+        """Test size and binary checks and temporary file cleanup."""
+        with pytest.raises(UploadTooLarge):
+            await file_store.put_stream(_chunks(b"x" * 60, b"x" * 60), "big.txt", "text/plain", "text", 100)
+        with pytest.raises(BinaryContent):
+            await file_store.put_stream(_chunks(b"ok", b"\x00"), "nul.txt", "text/plain", "text", 100)
+        with pytest.raises(BinaryContent):
+            await file_store.put_stream(_chunks(b"\xff\xfe"), "bad.txt", "text/plain", "text", 100)
+
+        assert os.listdir(file_store.temp_dir) == []
+        assert file_store.get_stats()["rejected"] == 3
+        assert file_store.get_stats()["files"] == 0
+
+
+class TestFileRoutes:
+    """Test uploading and downloading through the API."""
+
+    def test_upload_and_download(self, test_client, file_store):
+        """Test a multipart upload round trip by upload id."""
+        response = test_client.post(
+            "/api/upload",
+            files={"file": ("grammar.lark", b"start: WORD\n", "text/plain")},
+            data={"file_type": "grammar"}
+        )
+        assert response.status_code == 200
+        info = response.json()
+        assert info["size"] == 12
+        assert info["file_type"] == "grammar"
+        assert info["digest"] == hashlib.sha256(b"start: WORD\n").hexdigest()
+
+        download = test_client.get(f"/api/download/{info['id']}")
+        assert download.status_code == 200
+        assert download.content == b"start: WORD\n"
+        assert "grammar.lark" in download.headers["content-disposition"]
+
+    def test_raw_upload(self, test_client, file_store):
+        """Test that raw body uploads share blobs with multipart ones but keep their own metadata."""
+        multipart = test_client.post("/api/upload", files={"file": ("a.txt", b"same text", "text/plain")})
+        raw = test_client.put("/api/upload/b.txt", params={"file_type": "text"}, content=b"same text")
+        assert raw.status_code == 200
+        assert raw.json()["digest"] == multipart.json()["digest"]
+        assert raw.json()["id"] != multipart.json()["id"]
+        assert (raw.json()["filename"], raw.json()["file_type"]) == ("b.txt", "text")
+        assert file_store.get_stats()["blobs"] == 1
+
+        download = test_client.get(f"/api/download/{raw.json()['id']}")
+        assert "b.txt" in download.headers["content-disposition"]
+
+    def test_rejections(self, test_client, file_store, monkeypatch):
+        """Test binary, oversized, misnamed and unknown files."""
+        response = test_client.post("/api/upload", files={"file": ("a.lark", b"a\x00b", "text/plain")})
+        assert response.status_code == 400
+
+        monkeypatch.setattr(settings, "max_grammar_size", 8)
+        response = test_client.put("/api/upload/a.lark", content=b"start: \"too long\"")
+        assert response.status_code == 413
+
+        response = test_client.put("/api/upload/a.exe", content=b"text")
+        assert response.status_code == 400
+
+        assert test_client.get("/api/download/unknown").status_code == 404
+
+
+class TestDownloads:
+    """Test range, conditional and proxied downloads."""
+
+    def _upload(self, test_client, content=b"0123456789" * 10):
+        return test_client.put("/api/upload/corpus.txt", params={"file_type": "text"}, content=content).json()
+
+    def test_cache_headers(self, test_client, file_store):
+        """Test that content ids are served as immutable with a digest ETag."""
+        info = self._upload(test_client)
+        response = test_client.get(f"/api/download/{info['id']}")
+        assert response.headers["etag"] == f'"{info["digest"]}"'
+        assert "immutable" in response.headers["cache-control"]
+        assert response.headers["accept-ranges"] == "bytes"
+        assert response.headers["last-modified"]
+
+    def test_conditional_requests(self, test_client, file_store):
+        """Test 304 responses for If-None-Match and If-Modified-Since."""
+        info = self._upload(test_client)
+        first = test_client.get(f"/api/download/{info['id']}")
+
+        response = test_client.get(f"/api/download/{info['id']}", headers={"If-None-Match": first.headers["etag"]})
+        assert response.status_code == 304
+        response = test_client.get(
+            f"/api/download/{info['id']}", headers={"If-Modified-Since": first.headers["last-modified"]}
+        )
+        assert response.status_code == 304
+        response = test_client.get(f"/api/download/{info['id']}", headers={"If-None-Match": '"other"'})
+        assert response.status_code == 200
+
+    def test_range_requests(self, test_client, file_store):
+        """Test resuming a download from an offset, guarded by If-Range."""
+        info = self._upload(test_client)
+        etag = f'"{info["digest"]}"'
+
+        response = test_client.get(f"/api/download/{info['id']}", headers={"Range": "bytes=95-", "If-Range": etag})
+        assert response.status_code == 206
+        assert response.content == b"56789"
+        assert response.headers["content-range"] == "bytes 95-99/100"
+
+        response = test_client.get(f"/api/download/{info['id']}", headers={"Range": "bytes=95-", "If-Range": '"stale"'})
+        assert response.status_code == 200
+        assert len(response.content) == 100
+
+    def test_accel_redirect(self, test_client, file_store, monkeypatch):
+        """Test handing the transfer to a proxy."""
+        info = self._upload(test_client)
+        monkeypatch.setattr(settings, "download_accel_redirect", "/_stored")
+        response = test_client.get(f"/api/download/{info['id']}")
+        digest = info["digest"]
+        assert response.headers["x-accel-redirect"] == f"/_stored/{digest[:2]}/{digest[2:]}"
+        assert response.content == b""
+
+    def test_missing_blob(self, test_client, file_store):
+        """Test that an index entry without its blob is not served."""
+        info = self._upload(test_client)
+        os.unlink(file_store.path_for(info["digest"]))
+        assert test_client.get(f"/api/download/{info['id']}").status_code == 404
+
+
+class TestParseByReference:
+    """Test parsing uploaded files by content id."""
+
+    GRAMMAR = b'start: WORD+\n%import common.WORD\n%import common.WS\n%ignore WS\n'
+
+    def _upload(self, test_client, filename, content, file_type):
+        return test_client.put(f"/api/upload/{filename}", params={"file_type": file_type}, content=content).json()["id"]
+
+    def test_parse_by_ids(self, test_client, file_store, cleanup_parser_cache):
+        """Test that grammar and text ids can replace inline content."""
+        grammar_id = self._upload(test_client, "words.lark", self.GRAMMAR, "grammar")
+        text_id = self._upload(test_client, "words.txt", b"alpha beta", "text")
+
+        response = test_client.post("/api/parse", json={"grammar_id": grammar_id, "text_id": text_id})
+        assert response.status_code == 200
+        assert response.json()["status"] == "success"
+
+        response = test_client.post("/api/parse", json={"grammar_id": grammar_id, "text": "gamma"})
+        assert response.json()["status"] == "success"
+
+    def test_referenced_text_skips_inline_limit(self, test_client, file_store, cleanup_parser_cache):
+        """Test that stored text larger than the inline limit is parsed."""
+        grammar_id = self._upload(test_client, "long.lark", b"start: /a+/\n", "grammar")
+        text_id = self._upload(test_client, "long.txt", b"a" * (settings.max_text_length + 1), "text")
+
+        response = test_client.post(
+            "/api/parse", json={"grammar_id": grammar_id, "text_id": text_id, "settings": {"parser": "lalr"}}
+        )
+        assert response.json()["status"] == "success"
+
+    def test_invalid_references(self, test_client, file_store):
+        """Test conflicting and unknown references."""
+        response = test_client.post("/api/parse", json={"grammar": "start: \"a\"", "grammar_id": "x", "text": "a"})
+        assert response.status_code == 422
+        response = test_client.post("/api/parse", json={"grammar": "start: \"a\""})
+        assert response.status_code == 422
+        response = test_client.post("/api/parse", json={"grammar": "start: \"a\"", "text_id": "missing"})
+        assert response.status_code == 404
+
+    def test_websocket_text_by_id(self, test_client, file_store, cleanup_sessions):
+        """Test that a text_change can name an uploaded file."""
+        from app.core.state import get_session_manager
+        text_id = self._upload(test_client, "ws.txt", b"from the store", "text")
+
+        with test_client.websocket_connect("/ws/parsing") as websocket:
+            websocket.send_json({"type": "text_change", "session_id": "by_ref", "data": {"file_id": text_id}})
+            websocket.send_json({"type": "text_change", "session_id": "by_ref", "data": {"file_id": "missing"}})
+            while True:
+                message = websocket.receive_json()
+                if message["type"] == "error":
+                    break
+
+        assert message["data"]["file_id"] == "missing"
+        assert get_session_manager().sessions["by_ref"].text_content == "from the store"
+
+
+class TestStandalone:
+    """Test standalone LALR parser downloads."""
+    
+    GRAMMAR = 'start: WORD ("," WORD)*\n%import common.WORD\n%import common.WS\n%ignore WS\n'
+    
+    def _session(self, session_id, grammar):
+        import asyncio
+        from app.core.state import get_session_manager
+        
+        async def prepare():
+            session = await get_session_manager().get_or_create_session(session_id)
+            session.grammar_buffer.set_text(grammar)
+        
+        asyncio.run(prepare())
+    
+    def test_generated_module_parses(self, test_client, cleanup_sessions, cleanup_parser_cache):
+        """Test that the module loads without compiling and parses like the grammar."""
+        from app.core.standalone import get_standalone_cache
+        self._session("standalone", self.GRAMMAR)
+        generated = get_standalone_cache().generated
+        
+        response = test_client.get("/api/standalone/standalone")
+        assert response.status_code == 200
+        assert response.headers["content-disposition"].endswith('.py"')
+        namespace = {"__name__": "standalone_parser"}
+        exec(compile(response.text, "standalone_parser.py", "exec"), namespace)
+        tree = namespace["Lark_StandAlone"]().parse("alpha, beta")
+        assert [str(token) for token in tree.children] == ["alpha", "beta"]
+        
+        repeat = test_client.get("/api/standalone/standalone", headers={"If-None-Match": response.headers["etag"]})
+        assert repeat.status_code == 304
+        assert get_standalone_cache().generated == generated + 1
+    
+    def test_rejected_grammars(self, test_client, cleanup_sessions, cleanup_parser_cache):
+        """Test unknown sessions and grammars that are not LALR."""
+        assert test_client.get("/api/standalone/missing").status_code == 404
+        self._session("not_lalr", 'start: a | b\na: "x" "y"\nb: "x" "y"\n')
+        response = test_client.get("/api/standalone/not_lalr")
+        assert response.status_code == 400
+        assert "LALR" in response.json()["detail"]
@@ -0,0 +1,91 @@
+"""Tests for the logging pipeline."""
+
+import json
+import logging
+
+from app.core.logs import JsonFormatter, LogPipeline, RateLimitFilter, SamplingFilter
+
+
+def make_record(name: str = "app.websocket", level: int = logging.DEBUG, msg: str = "message %s", args=("x",)):
+    return logging.LogRecord(name, level, __file__, 1, msg, args, None)
+
+
+class ListHandler(logging.Handler):
+    """Collects formatted records."""
+    
+    def __init__(self):
+        super().__init__()
+        self.lines = []
+    
+    def emit(self, record):
+        self.lines.append(self.format(record))
+
+
+class TestFilters:
+    """Test sampling and rate limiting of debug records."""
+    
+    def test_sampling_keeps_share_of_debug_records(self):
+        """Test that a rate keeps evenly spaced records of the logger and its children."""
+        sampling = SamplingFilter({"app.websocket": 0.25})
+        kept = [sampling.filter(make_record("app.websocket.connection")) for _ in range(8)]
+        
+        assert kept.count(True) == 2
+        assert sampling.dropped == 6
+        assert all(sampling.filter(make_record("app.parser")) for _ in range(4))
+    
+    def test_info_records_are_never_dropped(self):
+        """Test that sampling and rate limits only thin debug records."""
+        sampling = SamplingFilter({"app": 0.0})
+        rate_limit = RateLimitFilter(per_second=1)
+        
+        for _ in range(5):
+            record = make_record(level=logging.INFO)
+            assert sampling.filter(record) and rate_limit.filter(record)
+        assert not sampling.filter(make_record())
+    
+    def test_rate_limit_per_logger(self):
+        """Test that each logger gets its own burst before records are dropped."""
+        rate_limit = RateLimitFilter(per_second=3)
+        
+        assert [rate_limit.filter(make_record("app.a")) for _ in range(5)] == [True, True, True, False, False]
+        assert rate_limit.filter(make_record("app.b"))
+        assert rate_limit.dropped == 2
+
+
+class TestPipeline:
+    """Test formatting and the background queue."""
+    
+    def test_json_formatter_includes_extra_fields(self):
+        """Test that records are one JSON object with their extra fields."""
+        record = make_record(level=logging.INFO)
+        record.session_id = "abc"
+        
+        entry = json.loads(JsonFormatter().format(record))
+        
+        assert entry["message"] == "message x"
+        assert entry["level"] == "INFO"
+        assert entry["logger"] == "app.websocket"
+        assert entry["session_id"] == "abc"
+    
+    def test_queued_records_are_written_on_stop(self):
+        """Test that records go through the listener thread with their arguments merged."""
+        output = ListHandler()
+        output.setFormatter(logging.Formatter("%(name)s %(message)s"))
+        logger = logging.getLogger("test.pipeline")
+        logger.propagate = False
+        logger.setLevel(logging.DEBUG)
+        pipeline = LogPipeline([output], use_queue=True, sample_rates={"test.pipeline": 0.5}, rate_limit=0)
+        pipeline.start(logger)
+        
+        values = ["first"]
+        for i in range(4):
+            logger.debug("record %d of %s", i, values)
+        values.append("changed")
+        pipeline.stop(logger)
+        
+        assert output.lines == [
+            "test.pipeline record 1 of ['first']",
+            "test.pipeline record 3 of ['first']",
+        ]
+        assert pipeline.get_stats()["sampled_out"] == 2
+        assert not logger.handlers
@@ -4,7 +4,7 @@ import pytest
 import asyncio
 from datetime import datetime
 
-from app.core.parser import AsyncLarkParser, ParseCache, get_parser
+from app.core.parser import AsyncLarkParser, ParseCache, ParseCancelledError, get_parser
 from app.models.requests import ParseSettings, ParserType
 from app.models.responses import ParseStatus, ErrorType
 
@@ -175,6 +175,77 @@ class TestAsyncLarkParser:
         assert result.rule_count == 0
         assert result.terminal_count == 0
     
+    @pytest.mark.asyncio
+    async def test_validation_shares_compiled_parsers(self, sample_grammars, sample_texts, sample_parse_settings, monkeypatch):
+        """Test that validate-then-parse compiles once and validations are memoized."""
+        import lark
+        parser = AsyncLarkParser()
+        compiles = []
+        real_lark = lark.Lark
+        
+        def counting_lark(*args, **kwargs):
+            compiles.append(1)
+            return real_lark(*args, **kwargs)
+        
+        monkeypatch.setattr(lark, "Lark", counting_lark)
+        settings = sample_parse_settings["default"]
+        
+        results = await asyncio.gather(*(
+            parser.validate_grammar(sample_grammars["simple"], settings) for _ in range(3)
+        ))
+        assert all(result.is_valid for result in results)
+        assert len(compiles) == 1
+        
+        result = await parser.parse_async(sample_grammars["simple"], sample_texts["simple_number"], settings)
+        assert result.status == ParseStatus.SUCCESS
+        assert len(compiles) == 1
+        
+        first = await parser.validate_grammar(sample_grammars["invalid"], settings)
+        second = await parser.validate_grammar(sample_grammars["invalid"], settings)
+        assert second is first
+        assert second.is_valid is False
+        assert len(compiles) == 2
+        assert parser.get_stats()["validation_hits"] == 1
+    
+    @pytest.mark.asyncio
+    async def test_compile_failures_cached(self, sample_grammars, sample_parse_settings, monkeypatch):
+        """Test that text edits against a broken grammar reuse its compile error."""
+        import lark
+        parser = AsyncLarkParser()
+        compiles = []
+        real_lark = lark.Lark
+        
+        def counting_lark(*args, **kwargs):
+            compiles.append(1)
+            return real_lark(*args, **kwargs)
+        
+        monkeypatch.setattr(lark, "Lark", counting_lark)
+        settings = sample_parse_settings["default"]
+        
+        first = await parser.parse_async(sample_grammars["invalid"], "a", settings)
+        second = await parser.parse_async(sample_grammars["invalid"], "ab", settings)
+        assert first.status == ParseStatus.INVALID_GRAMMAR
+        assert second.status == ParseStatus.INVALID_GRAMMAR
+        assert second.error == first.error
+        assert len(compiles) == 1
+        assert parser.get_stats()["compile_error_hits"] == 1
+        
+        # Expired failures are compiled again
+        parser.compile_errors.ttl = 0
+        await parser.parse_async(sample_grammars["invalid"], "abc", settings)
+        assert len(compiles) == 2
+    
+    def test_compile_error_cache_bounded(self):
+        """Test that the oldest failures are dropped beyond the size limit."""
+        from app.core.parser import CompileErrorCache
+        from app.models.responses import ParseError as APIParseError
+        cache = CompileErrorCache(max_size=2, ttl=60)
+        error = APIParseError(type=ErrorType.GRAMMAR_ERROR, message="bad")
+        for grammar_hash in ("a", "b", "c"):
+            cache.put(grammar_hash, ParseStatus.INVALID_GRAMMAR, error)
+        assert cache.get("a") is None
+        assert cache.get("c") == (ParseStatus.INVALID_GRAMMAR, error)
+    
     @pytest.mark.asyncio
     async def test_successful_parsing(self, sample_grammars, sample_texts, sample_parse_settings):
         """Test successful parsing."""
@@ -320,6 +391,47 @@ class TestAsyncLarkParser:
         assert result.status == ParseStatus.ERROR
         assert "too large" in result.error.message.lower()
     
+    @pytest.mark.asyncio
+    async def test_parse_aborted_before_start(self, sample_grammars, sample_texts, sample_parse_settings):
+        """Test that a superseded parse raises instead of returning a result."""
+        parser = AsyncLarkParser()
+        
+        with pytest.raises(ParseCancelledError):
+            await parser.parse_async(
+                sample_grammars["simple"],
+                sample_texts["simple_number"],
+                sample_parse_settings["default"],
+                should_abort=lambda: True
+            )
+        
+        # Cancelled parses are neither cached nor counted
+        assert len(parser.cache.cache) == 0
+        assert parser.parse_count == 0
+    
+    @pytest.mark.asyncio
+    async def test_lalr_parse_aborted_mid_parse(self):
+        """Test that LALR parsing checks the abort flag between tokens."""
+        parser = AsyncLarkParser()
+        grammar = "start: NUMBER+\n%import common.NUMBER\n%import common.WS\n%ignore WS"
+        text = " ".join(["1"] * 5000)
+        checks = []
+        
+        def should_abort():
+            checks.append(1)
+            # Let the pre-parse checks pass, then abort inside the worker
+            return len(checks) > 3
+        
+        with pytest.raises(ParseCancelledError):
+            await parser.parse_async(
+                grammar, text, ParseSettings(parser=ParserType.LALR),
+                should_abort=should_abort
+            )
+        
+        # Same input without abort still parses via the token-fed path
+        result = await parser.parse_async(grammar, text, ParseSettings(parser=ParserType.LALR))
+        assert result.status == ParseStatus.SUCCESS
+        assert len(result.tree.children) == 5000
+    
     @pytest.mark.asyncio
     async def test_parser_stats(self):
         """Test parser statistics."""
@@ -453,4 +565,101 @@ class TestParserIntegration:
         
         assert result.status == ParseStatus.SUCCESS
         assert result.parse_time < 1.0  # Should be fast for simple grammar
-        assert result.parse_time > 0   # Should take some measurable time 
\ No newline at end of file
+        assert result.parse_time > 0   # Should take some measurable time 
+
+RECORD_GRAMMAR = r'''
+start: (stmt _NL)*
+stmt: NAME "=" NUMBER
+_NL: /\n/
+%import common.CNAME -> NAME
+%import common.NUMBER
+%import common.WS_INLINE
+%ignore WS_INLINE
+'''
+
+
+class TestRecordSplit:
+    """Test record-split parsing across worker processes."""
+    
+    @pytest.fixture(autouse=True)
+    def record_pool(self, monkeypatch):
+        from app.core import record_split
+        monkeypatch.setattr(record_split.get_settings(), "record_split_workers", 2)
+        yield
+        record_split.shutdown_record_pool()
+    
+    def test_split_records(self):
+        """Test record offsets, lines and columns, skipping blank records."""
+        from app.core.record_split import split_records
+        text = "a = 1\n\nb = 2;c = 3\n"
+        assert split_records(text, r"\n") == [(0, 1, 1, "a = 1"), (7, 3, 1, "b = 2;c = 3")]
+        assert split_records(text, r"[\n;]") == [(0, 1, 1, "a = 1"), (7, 3, 1, "b = 2"), (13, 3, 7, "c = 3")]
+    
+    @pytest.mark.asyncio
+    async def test_matches_whole_input_parse(self):
+        """Test that the assembled tree matches parsing the input in one piece."""
+        parser = AsyncLarkParser()
+        text = "".join(f"x{i} = {i}\n" for i in range(50))
+        whole = await parser.parse_async(RECORD_GRAMMAR, text, ParseSettings(parser=ParserType.LALR))
+        split = await parser.parse_async(
+            RECORD_GRAMMAR, text,
+            ParseSettings(parser=ParserType.LALR, record_separator="_NL", record_rule="stmt")
+        )
+        
+        assert split.status == ParseStatus.SUCCESS
+        assert split.grammar_hash != whole.grammar_hash
+        assert split.tree.model_dump() == whole.tree.model_dump()
+    
+    @pytest.mark.asyncio
+    async def test_record_errors_do_not_abort(self):
+        """Test that failing records are reported with positions in the full input."""
+        parser = AsyncLarkParser()
+        text = "a = 1\nb = 2\nc = = 3\nd = 4\n"
+        result = await parser.parse_async(
+            RECORD_GRAMMAR, text,
+            ParseSettings(parser=ParserType.LALR, record_separator="_NL", record_rule="stmt")
+        )
+        
+        assert result.status == ParseStatus.ERROR
+        assert [child.children[0].data for child in result.tree.children] == ["a", "b", "d"]
+        assert result.tree.children[2].children[0].line == 4
+        assert result.tree.children[2].children[0].start_pos == text.index("d")
+        assert len(result.record_errors) == 1
+        assert result.record_errors[0].line == 3
+        assert result.error == result.record_errors[0]
+    
+    @pytest.mark.asyncio
+    async def test_unknown_separator(self):
+        """Test that naming a missing terminal is reported as an error."""
+        parser = AsyncLarkParser()
+        result = await parser.parse_async(
+            RECORD_GRAMMAR, "a = 1\n",
+            ParseSettings(parser=ParserType.LALR, record_separator="SEMI", record_rule="stmt")
+        )
+        assert result.status == ParseStatus.ERROR
+        assert "SEMI" in result.error.message
+    
+    def test_settings_require_record_rule(self):
+        """Test that a separator without a record rule is rejected."""
+        with pytest.raises(ValueError):
+            ParseSettings(record_separator="_NL")
+    
+    @pytest.mark.asyncio
+    async def test_superseded_parse_is_cancelled(self):
+        """Test that an abort while batches are in flight cancels the parse."""
+        parser = AsyncLarkParser()
+        text = "".join(f"x{i} = {i}\n" for i in range(2000))
+        checks = []
+        
+        def should_abort():
+            checks.append(1)
+            # Pass the check before parsing starts, then abort between batches
+            return len(checks) > 1
+        
+        with pytest.raises(ParseCancelledError):
+            await parser.parse_async(
+                RECORD_GRAMMAR, text,
+                ParseSettings(parser=ParserType.LALR, record_separator="_NL", record_rule="stmt"),
+                should_abort=should_abort
+            )
+        assert parser.parse_count == 0
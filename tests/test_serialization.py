@@ -0,0 +1,69 @@
+"""Tests for fast result serialization."""
+
+import json
+from datetime import datetime
+
+from app.core.serialization import dump_json, json_response
+from app.models.responses import ASTNode, ParseResult, ParseStatus, ParseError, ErrorType
+
+
+def _result(tree=None, error=None) -> ParseResult:
+    return ParseResult(
+        status=ParseStatus.SUCCESS if tree else ParseStatus.ERROR,
+        tree=tree,
+        error=error,
+        parse_time=0.25,
+        grammar_hash="hash",
+        timestamp=datetime(2024, 1, 2, 3, 4, 5)
+    )
+
+
+class TestSerialization:
+    """Test that the fast path matches pydantic's own encoding."""
+    
+    def test_parse_result_matches_pydantic(self):
+        """Test a tree with nested nodes, plain string children and unicode."""
+        tree = ASTNode(type="tree", data="start", children=[
+            ASTNode(type="token", data='quote " and \\\\ ünïcode ✓', start_pos=0, end_pos=3, line=1, column=1),
+            ASTNode(type="tree", data="inner", children=["bare string", ASTNode(type="token", data="x")]),
+        ])
+        result = _result(tree)
+        assert json.loads(dump_json(result)) == json.loads(result.model_dump_json())
+    
+    def test_error_result(self):
+        """Test results without a tree."""
+        error = ParseError(type=ErrorType.PARSE_ERROR, message="bad", line=2, column=3)
+        result = _result(error=error)
+        data = json.loads(dump_json(result))
+        assert data["tree"] is None
+        assert data["error"]["type"] == "parse_error"
+        assert data == json.loads(result.model_dump_json())
+    
+    def test_message_envelope(self):
+        """Test models embedded in plain message dicts."""
+        result = _result(ASTNode(type="token", data="1"))
+        message = {"type": "parse_result", "session_id": "s", "data": result, "count": 3, "flag": None}
+        data = json.loads(dump_json(message))
+        assert data["data"] == json.loads(result.model_dump_json())
+        assert data["count"] == 3
+        assert data["flag"] is None
+    
+    def test_tree_deeper_than_pydantic_limit(self):
+        """Test that trees pydantic refuses to encode still serialize."""
+        tree = ASTNode(type="token", data="leaf")
+        for _ in range(300):
+            tree = ASTNode.model_construct(type="tree", data="nested", children=[tree])
+        data = json.loads(dump_json(_result(tree)))
+        depth = 0
+        node = data["tree"]
+        while node["children"]:
+            node = node["children"][0]
+            depth += 1
+        assert depth == 300
+        assert node["data"] == "leaf"
+    
+    def test_json_response(self):
+        """Test that responses carry pre-serialized bytes."""
+        response = json_response({"a": 1})
+        assert response.media_type == "application/json"
+        assert json.loads(response.body) == {"a": 1}
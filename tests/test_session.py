@@ -158,14 +158,14 @@ class TestSessionManager:
     @pytest.mark.asyncio
     async def test_broadcast_to_session(self, cleanup_sessions):
         """Test broadcasting messages to session."""
-        from tests.conftest import MockWebSocket
+        from tests.conftest import MockConnection
         
         manager = SessionManager()
         session_id = "test_session"
         
         # Create mock WebSockets
-        ws1 = MockWebSocket()
-        ws2 = MockWebSocket()
+        ws1 = MockConnection()
+        ws2 = MockConnection()
         
         # Add WebSockets to session
         await manager.add_websocket_to_session(session_id, ws1)
@@ -174,6 +174,8 @@ class TestSessionManager:
         # Broadcast message
         message = {"type": "test", "data": "hello"}
         await manager.broadcast_to_session(session_id, message)
+        await ws1.drain()
+        await ws2.drain()
         
         # Both WebSockets should have received the message
         assert len(ws1.sent_messages) == 1
@@ -187,7 +189,7 @@ class TestSessionManager:
     @pytest.mark.asyncio
     async def test_session_stats(self, cleanup_sessions):
         """Test session statistics."""
-        from tests.conftest import MockWebSocket
+        from tests.conftest import MockConnection
         
         manager = SessionManager()
         
@@ -199,8 +201,8 @@ class TestSessionManager:
         
         # Create session with connections
         session_id = "test_session"
-        ws1 = MockWebSocket()
-        ws2 = MockWebSocket()
+        ws1 = MockConnection()
+        ws2 = MockConnection()
         
         await manager.add_websocket_to_session(session_id, ws1)
         await manager.add_websocket_to_session(session_id, ws2)
@@ -226,9 +228,9 @@ class TestSessionManager:
         expired_session.last_activity = datetime.now() - timedelta(seconds=settings.session_timeout + 1)
         
         # Create active session with connections
-        from tests.conftest import MockWebSocket
+        from tests.conftest import MockConnection
         active_session_id = "active"
-        await manager.add_websocket_to_session(active_session_id, MockWebSocket())
+        await manager.add_websocket_to_session(active_session_id, MockConnection())
         
         # Manually trigger cleanup
         expired_sessions = [
@@ -260,27 +262,65 @@ class TestSessionManager:
             for i in range(10):
                 await manager.get_or_create_session(f"session_{i}")
             
-            # Should have created all sessions initially
-            assert len(manager.sessions) == 10
-            
-            # Manually trigger cleanup logic
-            if len(manager.sessions) > settings.max_sessions:
-                sessions_by_age = sorted(
-                    [(sid, s) for sid, s in manager.sessions.items() if s.get_connection_count() == 0],
-                    key=lambda x: x[1].last_activity
-                )
-                
-                excess_count = len(manager.sessions) - settings.max_sessions
-                for session_id, _ in sessions_by_age[:excess_count]:
-                    del manager.sessions[session_id]
-            
-            # Should now be at or below limit
-            assert len(manager.sessions) <= settings.max_sessions
+            # The least recently active sessions were evicted on creation
+            assert len(manager.sessions) == settings.max_sessions
+            assert sorted(manager.sessions) == [f"session_{i}" for i in range(5, 10)]
+            assert manager.get_session_stats()["evicted_sessions"] == 5
             
         finally:
             # Restore original setting
             settings.max_sessions = original_max
     
+    @pytest.mark.asyncio
+    async def test_max_sessions_keeps_connected(self, cleanup_sessions, mock_websocket):
+        """Test that sessions with connections are never evicted."""
+        from app.core.config import get_settings
+        
+        manager = SessionManager()
+        settings = get_settings()
+        original_max = settings.max_sessions
+        settings.max_sessions = 2
+        
+        try:
+            await manager.add_websocket_to_session("connected", mock_websocket)
+            await manager.get_or_create_session("idle")
+            # Touching "connected" again must not make it evictable
+            await manager.get_or_create_session("connected")
+            await manager.get_or_create_session("new")
+            
+            assert "connected" in manager.sessions
+            assert "idle" not in manager.sessions
+            assert "new" in manager.sessions
+        finally:
+            settings.max_sessions = original_max
+    
+    @pytest.mark.asyncio
+    async def test_precise_expiry(self, cleanup_sessions, mock_websocket):
+        """Test that idle sessions expire when their timeout passes."""
+        from app.core.config import get_settings
+        
+        settings = get_settings()
+        original_timeout = settings.session_timeout
+        settings.session_timeout = 0.05
+        
+        try:
+            manager = SessionManager()
+            await manager.get_or_create_session("idle")
+            await manager.add_websocket_to_session("connected", mock_websocket)
+            
+            await asyncio.sleep(0.2)
+            assert "idle" not in manager.sessions
+            assert "connected" in manager.sessions
+            assert manager.get_session_stats()["expired_sessions"] == 1
+            
+            # Once its last connection leaves, the session expires too
+            await manager.remove_websocket_from_session("connected", mock_websocket)
+            await asyncio.sleep(0.2)
+            assert "connected" not in manager.sessions
+            await manager.shutdown()
+        finally:
+            settings.session_timeout = original_timeout
+    
     @pytest.mark.asyncio
     async def test_manager_shutdown(self):
         """Test session manager shutdown."""
@@ -339,14 +379,14 @@ class TestSessionManagerIntegration:
     @pytest.mark.asyncio
     async def test_websocket_disconnection_handling(self, cleanup_sessions):
         """Test handling of WebSocket disconnections."""
-        from tests.conftest import MockWebSocket
+        from tests.conftest import MockConnection, MockWebSocket
         
         manager = get_session_manager()
         session_id = "test_session"
         
         # Create WebSockets and add to session
-        ws_good = MockWebSocket()
-        ws_bad = MockWebSocket()
+        ws_good = MockConnection()
+        ws_bad = MockConnection()
         
         await manager.add_websocket_to_session(session_id, ws_good)
         await manager.add_websocket_to_session(session_id, ws_bad)
@@ -356,20 +396,27 @@ class TestSessionManagerIntegration:
         
         # Simulate one WebSocket failing
         class FailingMockWebSocket(MockWebSocket):
-            async def send_json(self, data):
+            async def send_text(self, data):
                 raise Exception("Connection failed")
         
         # Replace one WebSocket with failing one
         session.websocket_connections.discard(ws_bad)
-        failing_ws = FailingMockWebSocket()
+        failing_ws = MockConnection(FailingMockWebSocket())
         session.websocket_connections.add(failing_ws)
         
         # Broadcast should handle the failure gracefully
         message = {"type": "test", "data": "hello"}
         await manager.broadcast_to_session(session_id, message)
+        await ws_good.drain()
+        await failing_ws.drain()
+        assert failing_ws.closed
+        
+        # The next broadcast finds the failed connection closed
+        await manager.broadcast_to_session(session_id, message)
+        await ws_good.drain()
         
         # Good WebSocket should receive message
-        assert len(ws_good.sent_messages) == 1
+        assert len(ws_good.sent_messages) == 2
         assert ws_good.sent_messages[0] == message
         
         # Failed WebSocket should be removed from session
@@ -401,4 +448,368 @@ class TestSessionManagerIntegration:
         
         # Cleanup should work efficiently
         manager.sessions.clear()
-        assert len(manager.sessions) == 0 
\ No newline at end of file
+        assert len(manager.sessions) == 0 
+
+class TestExpiryIndex:
+    """Test the activity-ordered expiry index."""
+    
+    def test_touch_reorders(self):
+        """Test that touching a key moves it behind newer keys."""
+        from app.core.expiry import ExpiryIndex
+        index = ExpiryIndex()
+        index.touch("a", 1.0)
+        index.touch("b", 2.0)
+        index.touch("c", 3.0)
+        index.touch("a", 4.0)
+        
+        assert index.peek() == ("b", 2.0)
+        assert index.pop_expired(3.5) == ["b", "c"]
+        assert len(index) == 1
+        assert index.pop() == "a"
+        assert index.pop() is None
+    
+    def test_discard_and_compaction(self):
+        """Test that superseded entries do not accumulate."""
+        from app.core.expiry import ExpiryIndex
+        index = ExpiryIndex()
+        for step in range(10000):
+            index.touch(f"key_{step % 10}", float(step))
+        index.discard("key_9")
+        
+        assert len(index) == 9
+        assert len(index._heap) <= 2 * len(index) + 65
+        assert index.peek() == ("key_0", 9990.0)
+    
+    def test_iter_oldest(self):
+        """Test lazy oldest-first iteration over live keys."""
+        import random
+        from app.core.expiry import ExpiryIndex
+        index = ExpiryIndex()
+        rng = random.Random(3)
+        for step in range(500):
+            index.touch(f"key_{rng.randrange(100)}", rng.random())
+        index.discard("key_1")
+        
+        pairs = list(index.iter_oldest())
+        assert [activity for _, activity in pairs] == sorted(activity for _, activity in pairs)
+        assert len(pairs) == len(index)
+        assert "key_1" not in dict(pairs)
+        
+        # Keys discarded while iterating are skipped
+        oldest = index.iter_oldest()
+        next(oldest)
+        index.discard(pairs[1][0])
+        assert next(oldest)[0] == pairs[2][0]
+
+
+class TestSessionSnapshots:
+    """Test snapshot persistence and lazy restore."""
+    
+    @pytest.mark.asyncio
+    async def test_snapshot_and_lazy_restore(self, tmp_path):
+        """Test that sessions survive a restart and load on first access."""
+        from app.core.session_store import SQLiteSessionStore
+        path = str(tmp_path / "snapshot.db")
+        
+        manager = SessionManager()
+        manager.snapshot_store = SQLiteSessionStore(path)
+        await manager.update_session_content("kept", grammar="start: \"a\"", text="a")
+        session = manager.sessions["kept"]
+        session.tree_expand_state = [[0]]
+        session.parse_settings.parser = ParserType.LALR
+        await manager.save_session(session)
+        
+        assert await manager.snapshot() == 1
+        # Incremental: nothing changed since the last snapshot
+        assert await manager.snapshot() == 0
+        await manager.shutdown()
+        
+        restarted = SessionManager()
+        restarted.snapshot_store = SQLiteSessionStore(path)
+        await restarted.restore_index()
+        assert "kept" in restarted.restorable
+        assert "kept" not in restarted.sessions
+        
+        restored = await restarted.get_session("kept")
+        assert restored.grammar_content == "start: \"a\""
+        assert restored.text_content == "a"
+        assert restored.tree_expand_state == [[0]]
+        assert restored.parse_settings.parser == ParserType.LALR
+        assert restarted.get_session_stats()["restored_sessions"] == 1
+        await restarted.shutdown()
+    
+    @pytest.mark.asyncio
+    async def test_removed_sessions_leave_snapshot(self, tmp_path):
+        """Test that discarded sessions are deleted from the snapshot."""
+        from app.core.session_store import SQLiteSessionStore
+        manager = SessionManager()
+        manager.snapshot_store = SQLiteSessionStore(str(tmp_path / "snapshot.db"))
+        await manager.update_session_content("gone", text="x")
+        await manager.snapshot()
+        
+        manager._discard_session("gone")
+        await manager.snapshot()
+        assert manager.snapshot_store.load("gone") is None
+        await manager.shutdown()
+
+
+class TestSessionMemory:
+    """Test per-session memory accounting and the memory budget."""
+    
+    def test_session_is_slotted(self):
+        """Test that sessions carry no per-instance dict."""
+        session = EditorSession(session_id="slotted")
+        assert not hasattr(session, "__dict__")
+        with pytest.raises(AttributeError):
+            session.unexpected = True
+    
+    @pytest.mark.asyncio
+    async def test_accounting_follows_content(self, cleanup_sessions):
+        """Test that the total tracks content changes and removals."""
+        manager = SessionManager()
+        await manager.update_session_content("measured", grammar="g" * 10000, text="t" * 20000)
+        assert manager.memory_bytes >= 30000
+        
+        await manager.update_session_content("measured", text="t")
+        assert 10000 <= manager.memory_bytes < 20000
+        
+        manager._discard_session("measured")
+        assert manager.memory_bytes == 0
+    
+    @pytest.mark.asyncio
+    async def test_result_shared_with_parse_cache(self, cleanup_sessions, cleanup_parser_cache, sample_grammars, parser_instance):
+        """Test that a cached result is not counted against the session."""
+        manager = SessionManager()
+        session = await manager.get_or_create_session("shared")
+        text = " + ".join(["1"] * 200)
+        
+        session.last_parse_result = await parser_instance.parse_async(
+            sample_grammars["arithmetic"], text, session.parse_settings
+        )
+        await manager.save_session(session)
+        shared_bytes = manager.memory_bytes
+        assert manager.get_session_stats()["memory"]["results_shared_with_cache"] == 1
+        
+        parser_instance.clear_cache()
+        await manager.save_session(session)
+        assert manager.memory_bytes > shared_bytes + session.result_bytes() // 2
+    
+    @pytest.mark.asyncio
+    async def test_budget_releases_idle_results_first(self, cleanup_sessions, sample_grammars, parser_instance):
+        """Test that the budget drops idle parse results before evicting sessions."""
+        from app.core.config import get_settings
+        settings = get_settings()
+        original_budget = settings.session_memory_budget
+        original_spill_after = settings.result_spill_after
+        manager = SessionManager()
+        text = " + ".join(["1"] * 200)
+        
+        try:
+            # Without spilling, results are dropped
+            settings.result_spill_after = 0
+            for name in ("oldest", "newer"):
+                session = await manager.get_or_create_session(name)
+                session.grammar_content = sample_grammars["arithmetic"]
+                session.last_parse_result = await parser_instance.parse_async(
+                    sample_grammars["arithmetic"], text, session.parse_settings, use_cache=False
+                )
+                await manager.save_session(session)
+            
+            result_bytes = manager.sessions["oldest"].result_bytes()
+            settings.session_memory_budget = manager.memory_bytes - result_bytes // 2
+            await manager.update_session_content("current", text="x")
+            
+            assert manager.sessions["oldest"].last_parse_result is None
+            assert manager.sessions["newer"].last_parse_result is not None
+            assert manager.memory_bytes <= settings.session_memory_budget
+            stats = manager.get_session_stats()["memory"]
+            assert stats["heavy_parts_released"] == 1
+            assert stats["budget_evictions"] == 0
+        finally:
+            settings.session_memory_budget = original_budget
+            settings.result_spill_after = original_spill_after
+    
+    @pytest.mark.asyncio
+    async def test_budget_spills_idle_results(self, tmp_path, cleanup_sessions, sample_grammars, parser_instance):
+        """Test that the budget spills idle results to disk when spilling is enabled."""
+        from app.core.config import get_settings
+        from app.core.spill import ResultSpill
+        settings = get_settings()
+        original_budget = settings.session_memory_budget
+        manager = SessionManager()
+        manager.spill = ResultSpill(str(tmp_path / "spill"))
+        
+        try:
+            session = await manager.get_or_create_session("spilled_for_budget")
+            session.grammar_content = sample_grammars["arithmetic"]
+            original = await parser_instance.parse_async(
+                sample_grammars["arithmetic"], " + ".join(["1"] * 200), session.parse_settings, use_cache=False
+            )
+            session.last_parse_result = original
+            await manager.save_session(session)
+            
+            settings.session_memory_budget = manager.memory_bytes - session.result_bytes() // 2
+            await manager.update_session_content("current", text="x")
+            await manager.budget_spill_task
+            
+            assert session.result_spilled
+            assert manager.memory_bytes <= settings.session_memory_budget
+            assert manager.get_session_stats()["memory"]["budget_evictions"] == 0
+            reloaded = await manager.load_parse_result(session)
+            assert reloaded.model_dump() == original.model_dump()
+        finally:
+            settings.session_memory_budget = original_budget
+            await manager.shutdown()
+    
+    @pytest.mark.asyncio
+    async def test_budget_keeps_results_held_by_parse_cache(self, cleanup_sessions, cleanup_parser_cache, sample_grammars, parser_instance):
+        """Test that the budget leaves results the parse cache holds in place."""
+        from app.core.config import get_settings
+        settings = get_settings()
+        original_budget = settings.session_memory_budget
+        manager = SessionManager()
+        
+        try:
+            session = await manager.get_or_create_session("cached_result")
+            session.last_parse_result = await parser_instance.parse_async(
+                sample_grammars["arithmetic"], "1 + 2", session.parse_settings
+            )
+            await manager.save_session(session)
+            
+            settings.session_memory_budget = 1
+            await manager.update_session_content("current", text="x")
+            
+            assert session.last_parse_result is not None
+            assert not manager.budget_spill
+            assert manager.get_session_stats()["memory"]["heavy_parts_released"] == 0
+            # Only the session being updated is left, so usage stays over budget
+            assert manager.get_session_stats()["memory"]["over_budget"]
+        finally:
+            settings.session_memory_budget = original_budget
+            await manager.shutdown()
+
+
+class TestResultSpill:
+    """Test spilling idle sessions' parse results to disk."""
+    
+    async def _session_with_result(self, manager, session_id, grammar, parser_instance):
+        session = await manager.get_or_create_session(session_id)
+        session.grammar_content = grammar
+        session.text_content = " + ".join(["1"] * 100)
+        session.last_parse_result = await parser_instance.parse_async(
+            grammar, session.text_content, session.parse_settings, use_cache=False
+        )
+        await manager.save_session(session)
+        return session
+    
+    @pytest.mark.asyncio
+    async def test_spill_and_reload(self, tmp_path, cleanup_sessions, sample_grammars, parser_instance):
+        """Test that idle results move to disk and reload unchanged."""
+        from app.core.spill import ResultSpill
+        manager = SessionManager()
+        manager.spill = ResultSpill(str(tmp_path / "spill"))
+        idle = await self._session_with_result(manager, "idle", sample_grammars["arithmetic"], parser_instance)
+        active = await self._session_with_result(manager, "active", sample_grammars["arithmetic"], parser_instance)
+        original = idle.last_parse_result
+        
+        idle.last_activity = datetime.now() - timedelta(minutes=30)
+        manager._track(idle)
+        memory_before = manager.memory_bytes
+        
+        assert await manager.spill_idle_results() == 1
+        assert idle.result_spilled and idle.last_parse_result is None
+        assert active.last_parse_result is not None
+        assert manager.memory_bytes < memory_before
+        
+        reloaded = await manager.load_parse_result(idle)
+        assert reloaded.model_dump() == original.model_dump()
+        assert not idle.result_spilled
+        # The reloaded result lives in memory again; its file is gone
+        assert not list((tmp_path / "spill").iterdir())
+        stats = manager.spill.get_stats()
+        assert stats["spilled"] == 1 and stats["reloaded"] == 1
+        assert stats["compression_ratio"] < 1
+        await manager.shutdown()
+    
+    @pytest.mark.asyncio
+    async def test_new_result_supersedes_spill(self, tmp_path, cleanup_sessions, sample_grammars, parser_instance):
+        """Test that a fresh result replaces a spilled one without reloading it."""
+        from app.core.spill import ResultSpill
+        manager = SessionManager()
+        manager.spill = ResultSpill(str(tmp_path / "spill"))
+        session = await self._session_with_result(manager, "respilled", sample_grammars["arithmetic"], parser_instance)
+        session.last_activity = datetime.now() - timedelta(minutes=30)
+        manager._track(session)
+        await manager.spill_idle_results()
+        
+        fresh = await parser_instance.parse_async(sample_grammars["simple"], "7", session.parse_settings)
+        session.last_parse_result = fresh
+        assert not session.result_spilled
+        assert await manager.load_parse_result(session) is fresh
+        assert manager.spill.get_stats()["reloaded"] == 0
+        
+        # The superseded file is removed with the session
+        manager._discard_session("respilled")
+        assert not list((tmp_path / "spill").iterdir())
+        await manager.shutdown()
+    
+    def test_workers_keep_separate_spill_files(self, tmp_path, sample_grammars, parser_instance):
+        """Test that workers sharing a spill directory never touch each other's files."""
+        from app.core.spill import ResultSpill
+        directory = str(tmp_path / "spill")
+        result = asyncio.run(parser_instance.parse_async(sample_grammars["simple"], "42", ParseSettings()))
+        worker_a = ResultSpill(directory)
+        worker_b = ResultSpill(directory, owner="999999999")
+        
+        assert worker_a.spill("same_session", result) and worker_b.spill("same_session", result)
+        worker_a.discard("same_session")
+        assert worker_b.load("same_session").model_dump() == result.model_dump()
+        
+        # Files of workers that have exited are cleaned up on startup
+        worker_a.spill("same_session", result)
+        assert worker_a.remove_stale() == 1
+        assert worker_a.load("same_session") is not None
+        assert worker_b.load("same_session") is None
+    
+    @pytest.mark.asyncio
+    async def test_missing_spill_file_recovered_from_store(self, tmp_path, sample_grammars, parser_instance):
+        """Test that a lost spill file falls back to the result in a shared store."""
+        from app.core.session_store import SQLiteSessionStore
+        from app.core.spill import ResultSpill
+        manager = SessionManager(store=SQLiteSessionStore(str(tmp_path / "sessions.db")))
+        manager.spill = ResultSpill(str(tmp_path / "spill"))
+        session = await self._session_with_result(manager, "lost_file", sample_grammars["arithmetic"], parser_instance)
+        original = session.last_parse_result
+        
+        assert await manager._spill_session("lost_file")
+        for spilled in (tmp_path / "spill").iterdir():
+            spilled.unlink()
+        
+        reloaded = await manager.load_parse_result(session)
+        assert reloaded.model_dump() == original.model_dump()
+        await manager.shutdown()
+    
+    def test_export_reloads_spilled_result(self, tmp_path, test_client, cleanup_sessions, sample_grammars):
+        """Test that /api/export transparently reloads a spilled result."""
+        from app.core.spill import ResultSpill
+        from app.core.parser import get_parser
+        manager = get_session_manager()
+        manager.spill = ResultSpill(str(tmp_path / "spill"))
+        
+        async def prepare():
+            session = await manager.get_or_create_session("export_spilled")
+            session.last_parse_result = await get_parser().parse_async(
+                sample_grammars["simple"], "42", session.parse_settings
+            )
+            session.last_activity = datetime.now() - timedelta(minutes=30)
+            manager._track(session)
+            await manager.spill_idle_results()
+            return session
+        
+        session = asyncio.run(prepare())
+        assert session.result_spilled
+        
+        response = test_client.post("/api/export", json={"session_id": "export_spilled", "format": "json"})
+        assert response.status_code == 200
+        assert "42" in response.text
+        assert not session.result_spilled
@@ -0,0 +1,221 @@
+"""Tests for shared session state across workers."""
+
+import asyncio
+import json
+import pytest
+
+from app.core.pubsub import UnixSocketBroadcaster
+from app.core.session_store import RevisionConflictError, SessionRecord, SQLiteSessionStore
+from app.core.state import SessionManager
+from app.models.requests import ParserType
+
+
+class TestSQLiteSessionStore:
+    """Test the SQLite session backend."""
+
+    @pytest.mark.asyncio
+    async def test_save_and_load(self, tmp_path):
+        """Test that a saved session round-trips through the store."""
+        store = SQLiteSessionStore(str(tmp_path / "sessions.db"))
+        manager = SessionManager(store=store)
+
+        session = await manager.get_or_create_session("stored_session")
+        session.grammar_buffer.set_text("start: \"a\"", 3)
+        session.text_buffer.set_text("a", 5)
+        session.parse_settings.parser = ParserType.LALR
+        session.tree_expand_state = [[0, 1]]
+        await manager.save_session(session)
+        assert session.revision == 1
+
+        record = store.load("stored_session")
+        assert record.grammar == "start: \"a\""
+        assert record.grammar_version == 3
+        assert record.text_version == 5
+        assert json.loads(record.tree_expand_state) == [[0, 1]]
+
+        await manager.save_session(session)
+        assert store.get_revision("stored_session") == 2
+        await manager.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_delete_expired(self, tmp_path):
+        """Test that only inactive sessions are removed."""
+        store = SQLiteSessionStore(str(tmp_path / "sessions.db"))
+        manager = SessionManager(store=store)
+        await manager.update_session_content("old_session", grammar="a")
+        await manager.update_session_content("new_session", grammar="b")
+
+        old = store.load("old_session")
+        old.last_activity = 0
+        store.save(old)
+
+        assert store.delete_expired(1.0) == ["old_session"]
+        assert store.load("old_session") is None
+        assert store.load("new_session") is not None
+        await manager.shutdown()
+
+    def test_save_requires_current_revision(self, tmp_path):
+        """Test that a save on top of an outdated revision is rejected."""
+        store = SQLiteSessionStore(str(tmp_path / "sessions.db"))
+        record = SessionRecord(session_id="raced_session", created_at=0, last_activity=0, text="a")
+        assert store.save(record) == 1
+        with pytest.raises(RevisionConflictError):
+            store.save(record)
+
+        record.revision = 1
+        record.text = "b"
+        assert store.save(record) == 2
+        with pytest.raises(RevisionConflictError):
+            store.save(record)
+        assert store.load("raced_session").text == "b"
+        store.close()
+
+
+class TestMultiWorker:
+    """Test two session managers sharing state like separate workers."""
+
+    @pytest.mark.asyncio
+    async def test_changes_visible_to_other_worker(self, tmp_path, sample_grammars, parser_instance):
+        """Test that a session edited on one worker is current on another."""
+        path = str(tmp_path / "sessions.db")
+        worker_a = SessionManager(store=SQLiteSessionStore(path))
+        worker_b = SessionManager(store=SQLiteSessionStore(path))
+
+        assert await worker_b.get_session("shared_session") is None
+
+        await worker_a.update_session_content(
+            "shared_session", grammar=sample_grammars["simple"], text="42"
+        )
+        session_a = await worker_a.get_session("shared_session")
+        session_a.last_parse_result = await parser_instance.parse_async(
+            sample_grammars["simple"], "42", session_a.parse_settings
+        )
+        await worker_a.save_session(session_a)
+
+        session_b = await worker_b.get_session("shared_session")
+        assert session_b.text_content == "42"
+        assert session_b.last_parse_result.tree is not None
+        assert session_b.last_parse_result.grammar_hash == session_a.last_parse_result.grammar_hash
+
+        # A later edit refreshes worker B's cached copy in place
+        await worker_a.update_session_content("shared_session", text="43")
+        assert (await worker_b.get_session("shared_session")) is session_b
+        assert session_b.text_content == "43"
+
+        await worker_a.shutdown()
+        await worker_b.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_conflicting_save_requests_resync(self, tmp_path, mock_websocket):
+        """Test that the second of two racing saves reloads instead of overwriting."""
+        path = str(tmp_path / "sessions.db")
+        worker_a = SessionManager(store=SQLiteSessionStore(path))
+        worker_b = SessionManager(store=SQLiteSessionStore(path))
+        await worker_a.update_session_content("raced_session", text="base")
+        await worker_b.add_websocket_to_session("raced_session", mock_websocket)
+
+        session_a = await worker_a.get_session("raced_session")
+        session_b = await worker_b.get_session("raced_session")
+        session_a.text_content = "edit from a"
+        session_b.text_content = "edit from b"
+        assert await worker_a.save_session(session_a)
+        assert not await worker_b.save_session(session_b)
+
+        assert session_b.text_content == "edit from a"
+        assert session_b.revision == session_a.revision
+        await mock_websocket.drain()
+        assert [(m["type"], m["data"]["target"]) for m in mock_websocket.sent_messages] == [
+            ("resync_required", "grammar"), ("resync_required", "text")
+        ]
+        assert worker_b.get_session_stats()["save_conflicts"] == 1
+
+        await worker_a.shutdown()
+        await worker_b.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_edits_written_once_per_burst(self, tmp_path):
+        """Test that changed sessions are written together after the save delay."""
+        store = SQLiteSessionStore(str(tmp_path / "sessions.db"))
+        manager = SessionManager(store=store)
+        session = await manager.get_or_create_session("typing_session")
+
+        for index in range(10):
+            session.text_content = "x" * index
+            manager.mark_changed(session)
+        assert store.get_revision("typing_session") is None
+
+        assert await manager.flush_saves() == 1
+        assert store.get_revision("typing_session") == 1
+        assert store.load("typing_session").text == "x" * 9
+        await manager.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_broadcast_reaches_other_worker(self, tmp_path, mock_websocket):
+        """Test that broadcasts are delivered to connections on peer workers."""
+        directory = str(tmp_path / "workers")
+        path = str(tmp_path / "sessions.db")
+        worker_a = SessionManager(
+            store=SQLiteSessionStore(path),
+            broadcaster=UnixSocketBroadcaster(directory, name="worker-a.sock")
+        )
+        worker_b = SessionManager(
+            store=SQLiteSessionStore(path),
+            broadcaster=UnixSocketBroadcaster(directory, name="worker-b.sock")
+        )
+        await worker_a.start()
+        await worker_b.start()
+
+        try:
+            await worker_b.add_websocket_to_session("broadcast_session", mock_websocket)
+            await worker_a.broadcast_to_session(
+                "broadcast_session", {"type": "parse_result", "data": {"status": "success"}}
+            )
+
+            for _ in range(100):
+                if mock_websocket.sent_messages:
+                    break
+                await asyncio.sleep(0.01)
+            assert mock_websocket.sent_messages == [{"type": "parse_result", "data": {"status": "success"}}]
+        finally:
+            await worker_a.shutdown()
+            await worker_b.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_stuck_worker_does_not_block_publish(self, tmp_path, monkeypatch):
+        """Test that a peer that stops reading is dropped without delaying publishers."""
+        from app.core import pubsub
+        monkeypatch.setattr(pubsub, "PEER_QUEUE_SIZE", 8)
+        directory = tmp_path / "workers"
+        directory.mkdir()
+        # A worker that accepts connections but never reads from them
+        stuck = await asyncio.start_unix_server(
+            lambda reader, writer: None, path=str(directory / "worker-stuck.sock")
+        )
+        received = []
+
+        async def handler(session_id, text, replace_key):
+            received.append(text)
+
+        publisher = UnixSocketBroadcaster(str(directory), name="worker-a.sock")
+        listener = UnixSocketBroadcaster(str(directory), name="worker-b.sock")
+        await publisher.start(handler)
+        await listener.start(handler)
+
+        try:
+            payload = json.dumps({"data": "x" * 1024 * 1024})
+            for _ in range(12):
+                await asyncio.wait_for(publisher.publish("session", payload), timeout=1)
+                # Give the responsive worker's writer a chance to keep up
+                await asyncio.sleep(0.02)
+
+            for _ in range(200):
+                if len(received) == 12:
+                    break
+                await asyncio.sleep(0.01)
+            assert len(received) == 12
+            assert publisher.dropped_peers >= 1
+            assert "worker-stuck.sock" not in publisher.peers
+        finally:
+            await publisher.stop()
+            await listener.stop()
+            stuck.close()
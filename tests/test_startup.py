@@ -0,0 +1,42 @@
+"""Tests for the cost of importing the application."""
+
+import json
+import os
+import subprocess
+import sys
+
+# Loaded on first use, never by importing the app
+LAZY_MODULES = [
+    "lark",
+    "jinja2",
+    "multiprocessing",
+    "concurrent.futures.process",
+    "app.core.export",
+    "app.core.record_split",
+    "app.core.standalone",
+]
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class TestStartup:
+    """Test that importing the app stays cheap."""
+    
+    def test_import_leaves_heavy_modules_unloaded(self):
+        """Test that import app.main loads none of the lazily imported modules."""
+        code = (
+            "import json, sys; import app.main; "
+            f"print(json.dumps([name for name in {LAZY_MODULES!r} if name in sys.modules]))"
+        )
+        output = subprocess.run(
+            [sys.executable, "-c", code], capture_output=True, text=True, check=True, cwd=PROJECT_ROOT
+        ).stdout
+        
+        assert json.loads(output.splitlines()[-1]) == []
+    
+    def test_routes_are_registered_at_import(self):
+        """Test that lazy imports do not defer route registration."""
+        from app.main import app
+        
+        paths = set(app.openapi()["paths"])
+        assert {"/api/parse", "/api/export", "/api/standalone/{session_id}", "/api/ready"} <= paths
@@ -0,0 +1,82 @@
+"""Tests for the grammar symbol index."""
+
+from app.core.symbols import SymbolIndexer, scan_statement
+
+
+GRAMMAR = '''// Numbers and words
+?start: _sep{item, ","} -> top
+_sep{x, sep}: x (sep x)*
+item.2: WORD
+    | NUMBER "x"i /[#]+/  # trailing comment names NOTHING
+%import common.WORD
+%import common (NUMBER, WS)
+%import .lib.NAME -> LABEL
+%ignore WS
+'''
+
+
+def _names(symbols):
+    return [(symbol.name, symbol.line, symbol.column) for symbol in symbols]
+
+
+class TestScanner:
+    """Test symbols found in single statements."""
+    
+    def test_definitions_and_references(self):
+        """Test rules, templates, modifiers, priorities and aliases."""
+        index = SymbolIndexer().index(GRAMMAR)
+        definitions = {symbol.name: symbol for symbol in index.definitions}
+        assert set(definitions) == {"start", "_sep", "item", "WORD", "NUMBER", "WS", "LABEL"}
+        assert definitions["start"].kind == "rule"
+        assert (definitions["start"].line, definitions["start"].column) == (2, 2)
+        assert definitions["item"].start_pos == GRAMMAR.index("item.2")
+        assert definitions["WORD"].kind == "terminal"
+        
+        # Template parameters and "->" aliases are not references
+        assert _names(index.references) == [
+            ("_sep", 2, 9), ("item", 2, 14), ("WORD", 4, 9), ("NUMBER", 5, 7), ("WS", 9, 9)
+        ]
+        assert index.undefined == []
+    
+    def test_imports(self):
+        """Test dotted, grouped and aliased imports."""
+        index = SymbolIndexer().index(GRAMMAR)
+        assert [(i.module, i.names, i.line) for i in index.imports] == [
+            ("common", ["WORD"], 6), ("common", ["NUMBER", "WS"], 7), (".lib", ["LABEL"], 8)
+        ]
+    
+    def test_invalid_grammar_still_indexed(self):
+        """Test that broken statements do not hide the rest of the grammar."""
+        index = SymbolIndexer().index('start: a b\na: "x" (\nb: MISSING\n')
+        assert [symbol.name for symbol in index.definitions] == ["start", "a", "b"]
+        assert index.undefined == ["MISSING"]
+    
+    def test_declare(self):
+        """Test that %declare defines terminals."""
+        assert [name for name, *_ in scan_statement("%declare _INDENT _DEDENT\n").definitions] == ["_INDENT", "_DEDENT"]
+
+
+class TestIndexer:
+    """Test memoization across edits."""
+    
+    def test_edit_rescans_only_changed_statements(self):
+        """Test that unchanged statements reuse their scans after an edit."""
+        indexer = SymbolIndexer()
+        indexer.index(GRAMMAR)
+        scans = indexer.statement_scans
+        
+        edited = GRAMMAR.replace("item.2: WORD", "item.2: WORD | other")
+        index = indexer.index(edited)
+        assert indexer.statement_scans == scans + 1
+        assert index.undefined == ["other"]
+        # Positions after the edit are still absolute
+        assert _names([s for s in index.references if s.name == "WS"]) == [("WS", 9, 9)]
+    
+    def test_index_memoized_by_digest(self):
+        """Test that an unchanged grammar returns the same index."""
+        indexer = SymbolIndexer(max_indexes=1)
+        first = indexer.index(GRAMMAR)
+        assert indexer.index(GRAMMAR) is first
+        indexer.index("start: \"a\"\n")
+        assert indexer.index(GRAMMAR) is not first
+        assert indexer.get_stats()["index_hits"] == 1
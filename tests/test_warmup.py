@@ -0,0 +1,88 @@
+"""Tests for the startup warm-up."""
+
+import asyncio
+
+import pytest
+
+import app.core.warmup as warmup_module
+from app.core.parser import GrammarUsage, get_parser
+from app.core.warmup import WarmupProgress, load_warmup_grammars, run_warmup, save_hot_grammars
+from app.models.requests import ParseSettings, ParserType
+
+
+class TestGrammarUsage:
+    """Test counting of grammar use."""
+    
+    def test_top_grammars(self):
+        """Test that the most used grammars come first and sources are bounded."""
+        usage = GrammarUsage(keep=1)
+        for _ in range(3):
+            usage.record("hot", "start: \"a\"", ParseSettings())
+        for name in ("a", "b", "c", "d"):
+            usage.record(name, f"start: \"{name}\"", ParseSettings())
+        
+        assert usage.top(1) == [("start: \"a\"", ParseSettings(), 3)]
+        assert len(usage.sources) <= 4
+
+
+class TestWarmup:
+    """Test compiling grammars at startup."""
+    
+    @pytest.fixture
+    def warmup_settings(self, tmp_path, monkeypatch):
+        grammar_dir = tmp_path / "grammars"
+        grammar_dir.mkdir()
+        (grammar_dir / "words.lark").write_text('document: WORD+\n%import common.WORD\n%import common.WS\n%ignore WS\n')
+        (grammar_dir / "broken.lark").write_text('start: missing_rule\n')
+        settings = warmup_module.get_settings()
+        monkeypatch.setattr(settings, "warmup_grammar_dir", str(grammar_dir))
+        monkeypatch.setattr(settings, "warmup_state_path", str(tmp_path / "state" / "warmup.json"))
+        return settings
+    
+    def test_hot_grammars_round_trip(self, warmup_settings, cleanup_parser_cache, monkeypatch):
+        """Test that saved grammars are loaded after the directory's."""
+        usage = GrammarUsage(keep=2)
+        usage.record("h", "start: \"x\"", ParseSettings(parser=ParserType.LALR))
+        monkeypatch.setattr(get_parser(), "usage", usage)
+        save_hot_grammars(warmup_settings.warmup_state_path, 2)
+        
+        grammars = load_warmup_grammars(
+            warmup_settings.warmup_grammar_dir, warmup_settings.warmup_state_path, 2
+        )
+        assert [settings.start_rule for _, settings in grammars] == ["start", "document", "start"]
+        assert grammars[-1] == ("start: \"x\"", ParseSettings(parser=ParserType.LALR))
+    
+    @pytest.mark.asyncio
+    async def test_run_warmup(self, warmup_settings, cleanup_parser_cache):
+        """Test that warm-up fills the parser cache and tolerates broken grammars."""
+        progress = WarmupProgress()
+        await run_warmup(progress)
+        
+        assert progress.ready
+        assert (progress.total, progress.compiled, progress.failed) == (2, 1, 1)
+        assert len(get_parser().active_parsers) == 1
+    
+    @pytest.mark.asyncio
+    async def test_stop_waits_for_warmup(self, warmup_settings, monkeypatch):
+        """Test that shutdown does not continue while the warm-up is still running."""
+        task = asyncio.create_task(asyncio.sleep(3600))
+        monkeypatch.setattr(warmup_module, "_warmup_task", task)
+        await warmup_module.stop_warmup()
+        assert task.cancelled()
+    
+    def test_ready_endpoint(self, test_client, monkeypatch):
+        """Test that readiness is reported only once warm-up has finished."""
+        progress = WarmupProgress()
+        monkeypatch.setattr(warmup_module, "_progress", progress)
+        progress.started_at = 0.0
+        progress.total = 2
+        
+        response = test_client.get("/api/ready")
+        assert response.status_code == 503
+        assert response.json()["ready"] is False
+        
+        progress.compiled = 2
+        progress.finished_at = 1.0
+        response = test_client.get("/api/ready")
+        assert response.status_code == 200
+        assert response.json()["compiled"] == 2
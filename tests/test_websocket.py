@@ -0,0 +1,470 @@
+"""Tests for WebSocket parse management."""
+
+import asyncio
+import json
+import zlib
+import pytest
+from fastapi.testclient import TestClient
+
+from app.websockets.parsing_ws import ParseManager, SessionLatency, SessionInfoNotifier
+from app.websockets.connection import (
+    ClientConnection, compression_stats, queue_stats, negotiate_subprotocol,
+    DEFLATE_SUBPROTOCOL, JSON_SUBPROTOCOL
+)
+from app.core.config import get_settings
+from app.core.serialization import EncodedMessage
+from app.core.state import get_session_manager
+from app.models.requests import ParseSettings
+
+
+class TestParseManager:
+    """Test debounced parse scheduling."""
+    
+    @pytest.mark.asyncio
+    async def test_supersede_bumps_generation(self):
+        """Test that each supersede invalidates the previous generation."""
+        manager = ParseManager()
+        
+        first = manager.supersede("session")
+        assert manager.is_current("session", first)
+        
+        second = manager.supersede("session")
+        assert second == first + 1
+        assert not manager.is_current("session", first)
+        assert manager.is_current("session", second)
+        
+        # Generations are tracked per session
+        assert manager.supersede("other") == 1
+        assert manager.is_current("session", second)
+    
+    @pytest.mark.asyncio
+    async def test_stale_result_not_published(self, cleanup_sessions, mock_websocket):
+        """Test that a superseded parse never reaches the session."""
+        manager = ParseManager()
+        manager.debounce_delay = 0
+        session_manager = get_session_manager()
+        await session_manager.add_websocket_to_session("stale_session", mock_websocket)
+        
+        grammar = "start: NUMBER\n%import common.NUMBER"
+        await manager.handle_content_change("stale_session", grammar, "1", ParseSettings())
+        first_task = manager.parse_timers["stale_session"]
+        await manager.handle_content_change("stale_session", grammar, "2", ParseSettings())
+        latest_task = manager.parse_timers["stale_session"]
+        
+        await asyncio.gather(first_task, latest_task, return_exceptions=True)
+        
+        session = session_manager.sessions["stale_session"]
+        assert session.last_parse_result.tree.children[0].data == "2"
+        results = [m for m in mock_websocket.sent_messages if m["type"] == "parse_result"]
+        assert len(results) == 1
+        assert "stale_session" not in manager.parse_timers
+    
+    @pytest.mark.asyncio
+    async def test_outdated_versions_not_published(self, cleanup_sessions, mock_websocket):
+        """Test that a parse of versions the session has moved past is dropped."""
+        manager = ParseManager()
+        manager.debounce_delay = 0
+        session_manager = get_session_manager()
+        await session_manager.add_websocket_to_session("versioned_session", mock_websocket)
+        session = session_manager.sessions["versioned_session"]
+        session.grammar_buffer.set_text("start: NUMBER\n%import common.NUMBER", 1)
+        # Another worker's newer text edit was loaded while the parse ran
+        session.text_buffer.set_text("2", 5)
+        
+        await manager.handle_content_change(
+            "versioned_session", session.grammar_content, "1", ParseSettings(), versions=(1, 4)
+        )
+        await manager.parse_timers["versioned_session"]
+        
+        assert session.last_parse_result is None
+        await mock_websocket.drain()
+        assert not [m for m in mock_websocket.sent_messages if m["type"] == "parse_result"]
+    
+    @pytest.mark.asyncio
+    async def test_adaptive_debounce_delay(self):
+        """Test that the debounce delay follows measured latency and load."""
+        settings = get_settings()
+        manager = ParseManager()
+        
+        # Unmeasured sessions use the configured default
+        assert manager.get_debounce_delay("new_session") == settings.debounce_delay
+        
+        latency = manager.latencies.setdefault("fast", SessionLatency())
+        latency.record(0.001, grammar_changed=False)
+        assert manager.get_debounce_delay("fast") == settings.debounce_min_delay
+        
+        latency = manager.latencies.setdefault("slow", SessionLatency())
+        latency.record(0.2, grammar_changed=False)
+        latency.record(10.0, grammar_changed=True)
+        text_delay = manager.get_debounce_delay("slow")
+        assert text_delay == pytest.approx(0.2 * settings.debounce_latency_factor)
+        assert manager.get_debounce_delay("slow", grammar_changed=True) == settings.debounce_max_delay
+        
+        # Running parses stretch the delay
+        manager.active_parses = 4
+        assert manager.get_debounce_delay("slow") > text_delay
+    
+    @pytest.mark.asyncio
+    async def test_force_parse_is_scheduled_without_delay(self, cleanup_sessions, mock_websocket):
+        """Test that a forced parse runs as a task and keeps the session's debounce delay."""
+        manager = ParseManager()
+        session_manager = get_session_manager()
+        await session_manager.add_websocket_to_session("forced_session", mock_websocket)
+        session = session_manager.sessions["forced_session"]
+        session.grammar_content = "start: NUMBER\n%import common.NUMBER"
+        session.text_content = "7"
+        manager.latencies.setdefault("forced_session", SessionLatency()).debounce_delay = 2.0
+        
+        manager.handle_force_parse(session)
+        await manager.parse_timers["forced_session"]
+        await mock_websocket.drain()
+        
+        assert session.last_parse_result.tree.children[0].data == "7"
+        assert [m["type"] for m in mock_websocket.sent_messages].count("parse_result") == 1
+        assert manager.get_reported_delay("forced_session") == 2.0
+    
+    @pytest.mark.asyncio
+    async def test_discarded_session_is_forgotten(self, cleanup_sessions, mock_websocket):
+        """Test that discarding a session drops its parse state."""
+        manager = ParseManager()
+        session_manager = get_session_manager()
+        session_manager.discard_listeners.append(manager.forget)
+        try:
+            await session_manager.get_or_create_session("forgotten_session")
+            manager.supersede("forgotten_session")
+            manager.latencies["forgotten_session"] = SessionLatency()
+            manager.text_limits["forgotten_session"] = 1
+        
+            session_manager._discard_session("forgotten_session")
+        finally:
+            session_manager.discard_listeners.remove(manager.forget)
+        
+        assert "forgotten_session" not in manager.generations
+        assert "forgotten_session" not in manager.latencies
+        assert "forgotten_session" not in manager.text_limits
+
+
+class TestSessionLatency:
+    """Test latency moving averages."""
+    
+    def test_moving_average(self):
+        """Test that samples are smoothed per change kind."""
+        settings = get_settings()
+        latency = SessionLatency()
+        assert latency.expected_latency(False) is None
+        
+        latency.record(1.0, grammar_changed=True)
+        # Compile latency is the only estimate so far
+        assert latency.expected_latency(False) == 1.0
+        
+        latency.record(0.1, grammar_changed=False)
+        latency.record(0.2, grammar_changed=False)
+        alpha = settings.debounce_smoothing
+        assert latency.parse_avg == pytest.approx(alpha * 0.2 + (1 - alpha) * 0.1)
+        assert latency.expected_latency(True) == 1.0
+
+
+class TestContentDelta:
+    """Test the incremental edit protocol."""
+    
+    def _receive_until(self, websocket, message_type):
+        while True:
+            message = websocket.receive_json()
+            if message["type"] == message_type:
+                return message
+    
+    def test_delta_applied_to_session(self, test_client: TestClient, cleanup_sessions):
+        """Test that range edits update the session document."""
+        with test_client.websocket_connect("/ws/parsing") as websocket:
+            websocket.send_json({
+                "type": "text_change",
+                "session_id": "delta_session",
+                "data": {"content": "hello world", "version": 1}
+            })
+            self._receive_until(websocket, "session_info")
+            
+            websocket.send_json({
+                "type": "content_delta",
+                "session_id": "delta_session",
+                "data": {
+                    "target": "text",
+                    "base_version": 1,
+                    "version": 2,
+                    "changes": [{"range_offset": 6, "range_length": 5, "text": "there"}]
+                }
+            })
+            # Unchanged session info is not resent; a settings change forces one
+            websocket.send_json({
+                "type": "settings_change",
+                "session_id": "delta_session",
+                "data": {"debug": True}
+            })
+            info = self._receive_until(websocket, "session_info")
+            assert info["data"]["settings"]["debug"] is True
+        
+        session = get_session_manager().sessions["delta_session"]
+        assert session.text_content == "hello there"
+        assert session.text_buffer.version == 2
+    
+    def test_delta_version_mismatch_requests_resync(self, test_client: TestClient, cleanup_sessions):
+        """Test that a stale delta triggers a resync request."""
+        with test_client.websocket_connect("/ws/parsing") as websocket:
+            websocket.send_json({
+                "type": "content_delta",
+                "session_id": "resync_session",
+                "data": {
+                    "target": "grammar",
+                    "base_version": 5,
+                    "version": 6,
+                    "changes": [{"range_offset": 0, "range_length": 0, "text": "x"}]
+                }
+            })
+            message = self._receive_until(websocket, "resync_required")
+        
+        assert message["data"] == {"target": "grammar", "version": 0}
+        assert get_session_manager().sessions["resync_session"].grammar_content == ""
+    
+    
+    def test_grammar_delta_publishes_symbol_index(self, test_client: TestClient, cleanup_sessions):
+        """Test that grammar edits are followed by the grammar's symbol index."""
+        with test_client.websocket_connect("/ws/parsing") as websocket:
+            websocket.send_json({
+                "type": "grammar_change",
+                "session_id": "symbols_session",
+                "data": {"content": "start: item\n", "version": 1}
+            })
+            first = self._receive_until(websocket, "symbol_index")
+            assert first["data"]["undefined"] == ["item"]
+            
+            websocket.send_json({
+                "type": "content_delta",
+                "session_id": "symbols_session",
+                "data": {
+                    "target": "grammar",
+                    "base_version": 1,
+                    "version": 2,
+                    "changes": [{"range_offset": 12, "range_length": 0, "text": "item: WORD\n"}]
+                }
+            })
+            second = self._receive_until(websocket, "symbol_index")
+        
+        assert [symbol["name"] for symbol in second["data"]["definitions"]] == ["start", "item"]
+        assert second["data"]["undefined"] == ["WORD"]
+        assert second["data"]["digest"] != first["data"]["digest"]
+
+
+class RecordingWebSocket:
+    """Fake WebSocket that records raw frames."""
+    
+    def __init__(self):
+        self.frames = []
+        self.client = None
+    
+    async def send_text(self, data):
+        self.frames.append(data)
+    
+    async def send_bytes(self, data):
+        self.frames.append(data)
+    
+    async def close(self, code=1000):
+        self.close_code = code
+
+
+class StalledWebSocket(RecordingWebSocket):
+    """Fake WebSocket whose sends never complete."""
+    
+    async def send_text(self, data):
+        await asyncio.Event().wait()
+
+
+class TestReconnect:
+    """Test that joining a session delivers its last result."""
+    
+    def test_reconnect_receives_last_result(self, test_client: TestClient, cleanup_sessions, sample_grammars):
+        """Test that a second connection gets the stored parse result on join."""
+        with test_client.websocket_connect("/ws/parsing") as websocket:
+            websocket.send_json({"type": "grammar_change", "session_id": "rejoin_session",
+                                 "data": {"content": sample_grammars["simple"]}})
+            websocket.send_json({"type": "text_change", "session_id": "rejoin_session",
+                                 "data": {"content": "42"}})
+            websocket.send_json({"type": "force_parse", "session_id": "rejoin_session", "data": {}})
+            while websocket.receive_json()["type"] != "parse_result":
+                pass
+        
+        with test_client.websocket_connect("/ws/parsing") as websocket:
+            websocket.send_json({"type": "settings_change", "session_id": "rejoin_session",
+                                 "data": {"debug": False}})
+            message = websocket.receive_json()
+            assert message["type"] == "parse_result"
+            assert message["data"]["status"] == "success"
+
+
+class TestClientConnection:
+    """Test negotiated message encoding."""
+    
+    def test_negotiate_subprotocol(self):
+        """Test subprotocol selection."""
+        assert negotiate_subprotocol([DEFLATE_SUBPROTOCOL, JSON_SUBPROTOCOL]) == DEFLATE_SUBPROTOCOL
+        assert negotiate_subprotocol([JSON_SUBPROTOCOL]) == JSON_SUBPROTOCOL
+        assert negotiate_subprotocol([]) is None
+    
+    @pytest.mark.asyncio
+    async def test_size_aware_compression(self):
+        """Test that only large messages are compressed."""
+        settings = get_settings()
+        raw = RecordingWebSocket()
+        connection = ClientConnection(raw, compress=True)
+        compressed_before = compression_stats.compressed_messages
+        
+        small = {"type": "session_info", "data": {}}
+        await connection.send_json(small)
+        await connection.drain()
+        assert isinstance(raw.frames[-1], str)
+        assert json.loads(raw.frames[-1]) == small
+        
+        large = {"type": "parse_result", "data": {"tree": ["token"] * settings.ws_compression_threshold}}
+        await connection.send_json(large)
+        await connection.drain()
+        assert isinstance(raw.frames[-1], bytes)
+        assert json.loads(zlib.decompress(raw.frames[-1])) == large
+        assert compression_stats.compressed_messages == compressed_before + 1
+        assert compression_stats.to_dict()["compression_ratio"] < 1
+    
+    @pytest.mark.asyncio
+    async def test_large_broadcast_compressed_once_in_thread(self, monkeypatch):
+        """Test that large messages are compressed off the loop, once for all connections."""
+        settings = get_settings()
+        monkeypatch.setattr(settings, "ws_compression_thread_threshold", 4096)
+        calls = []
+        real_to_thread = asyncio.to_thread
+        
+        async def counting_to_thread(func, *args):
+            calls.append(func)
+            return await real_to_thread(func, *args)
+        
+        monkeypatch.setattr(asyncio, "to_thread", counting_to_thread)
+        raws = [RecordingWebSocket() for _ in range(3)]
+        connections = [ClientConnection(raw, compress=True) for raw in raws]
+        encoded = EncodedMessage({"type": "parse_result", "data": "x" * 8192})
+        
+        for connection in connections:
+            connection.enqueue(encoded)
+        await asyncio.gather(*(connection.drain() for connection in connections))
+        
+        assert calls == [zlib.compress]
+        assert all(zlib.decompress(raw.frames[-1]) == encoded.payload for raw in raws)
+    
+    @pytest.mark.asyncio
+    async def test_uncompressed_connection(self):
+        """Test that connections without compression always send text."""
+        raw = RecordingWebSocket()
+        connection = ClientConnection(raw, compress=False)
+        await connection.send_json({"data": "x" * 100000})
+        await connection.drain()
+        assert isinstance(raw.frames[-1], str)
+
+
+class TestSendQueue:
+    """Test queued, concurrent delivery to session connections."""
+    
+    @pytest.mark.asyncio
+    async def test_parse_results_latest_wins(self):
+        """Test that a queued parse result is replaced by a newer one."""
+        raw = StalledWebSocket()
+        connection = ClientConnection(raw)
+        await connection.send_json({"type": "first"})
+        await asyncio.sleep(0)  # Writer picks up the first message and stalls
+        
+        for version in range(5):
+            await connection.send_json({"type": "parse_result", "version": version}, replace_key="parse_result")
+        assert len(connection.queue) == 1
+        assert json.loads(connection.queue[0][1].text)["version"] == 4
+        await connection.close()
+    
+    @pytest.mark.asyncio
+    async def test_slow_consumer_dropped(self, monkeypatch):
+        """Test that overflowing a connection's queue drops it."""
+        from app.websockets import connection as connection_module
+        monkeypatch.setattr(connection_module.settings, "ws_send_queue_size", 3)
+        raw = StalledWebSocket()
+        connection = ClientConnection(raw)
+        dropped_before = queue_stats.dropped_connections
+        
+        results = [connection.enqueue(EncodedMessage({"n": n})) for n in range(5)]
+        assert results == [True, True, True, False, False]
+        assert connection.closed
+        assert queue_stats.dropped_connections == dropped_before + 1
+        # The close task is held by the connection and awaited by close()
+        await connection.close()
+        assert connection._close_task.done()
+        assert raw.close_code == 1013
+    
+    @pytest.mark.asyncio
+    async def test_broadcast_serializes_once(self, cleanup_sessions, monkeypatch):
+        """Test that a slow connection does not delay others and encoding happens once."""
+        from app.core import state
+        session_manager = get_session_manager()
+        fast, slow = RecordingWebSocket(), StalledWebSocket()
+        fast_connection, slow_connection = ClientConnection(fast), ClientConnection(slow)
+        await session_manager.add_websocket_to_session("fanout_session", fast_connection)
+        await session_manager.add_websocket_to_session("fanout_session", slow_connection)
+        
+        encoded = []
+        original = state.EncodedMessage
+        monkeypatch.setattr(state, "EncodedMessage", lambda message: encoded.append(message) or original(message))
+        
+        await asyncio.wait_for(
+            session_manager.broadcast_to_session("fanout_session", {"type": "parse_result"}),
+            timeout=1.0
+        )
+        await fast_connection.drain()
+        assert len(encoded) == 1
+        assert json.loads(fast.frames[-1]) == {"type": "parse_result"}
+        await slow_connection.close()
+    
+    def test_endpoint_negotiates_compression(self, test_client: TestClient, cleanup_sessions):
+        """Test that the endpoint accepts the deflate subprotocol."""
+        with test_client.websocket_connect(
+            "/ws/parsing", subprotocols=[DEFLATE_SUBPROTOCOL, JSON_SUBPROTOCOL]
+        ) as websocket:
+            assert websocket.accepted_subprotocol == DEFLATE_SUBPROTOCOL
+            websocket.send_json({"type": "force_parse", "session_id": "compress_session", "data": {}})
+            message = websocket.receive_json()
+            assert message["type"] == "parse_error"
+
+
+class TestSessionInfoNotifier:
+    """Test change-driven session_info updates."""
+    
+    @pytest.mark.asyncio
+    async def test_updates_coalesced_and_deduplicated(self, cleanup_sessions, mock_websocket):
+        """Test that bursts collapse and unchanged info is not resent."""
+        notifier = SessionInfoNotifier()
+        session_manager = get_session_manager()
+        await session_manager.add_websocket_to_session("info_session", mock_websocket)
+        
+        for _ in range(10):
+            notifier.notify("info_session")
+        await notifier.pending["info_session"]
+        await mock_websocket.drain()
+        assert len(mock_websocket.sent_messages) == 1
+        assert mock_websocket.sent_messages[0]["data"]["connection_count"] == 1
+        
+        # Nothing changed: no new frame
+        notifier.notify("info_session")
+        await notifier.pending["info_session"]
+        await mock_websocket.drain()
+        assert len(mock_websocket.sent_messages) == 1
+        
+        # Content presence changed: one new frame
+        await session_manager.update_session_content("info_session", grammar="start: \"a\"")
+        notifier.notify("info_session")
+        await notifier.pending["info_session"]
+        await mock_websocket.drain()
+        assert len(mock_websocket.sent_messages) == 2
+        assert mock_websocket.sent_messages[1]["data"]["has_grammar"] is True
+        
+        stats = notifier.get_stats()
+        assert stats["requested"] == 12
+        assert stats["sent"] == 2
+        assert stats["reduction"] == pytest.approx(1 - 2 / 12)